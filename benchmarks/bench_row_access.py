@@ -0,0 +1,76 @@
+# benchmarks/bench_row_access.py
+"""
+Microbenchmark: rows returned as-is (Row record_class) vs. copied into dicts.
+
+Simulates a list-heavy screen (books on loan, catalogue pages, request lists):
+fetches N rows and reads a few fields from each. Uses the test database from
+.env.test, no tables are required.
+
+    python -m benchmarks.bench_row_access --rows 5000 --repeat 20
+"""
+import argparse
+import asyncio
+import os
+import time
+import tracemalloc
+
+import asyncpg
+from dotenv import load_dotenv
+
+from src.core.db.utils import Row
+
+QUERY = """
+    SELECT g AS borrow_id, g AS book_id, 'Book ' || g AS book_name, 'Author ' || g AS author_name,
+           now() AS borrow_date, now() + interval '14 days' AS due_date
+    FROM generate_series(1, $1) AS g
+"""
+
+
+def read_fields(rows) -> int:
+    total = 0
+    for r in rows:
+        total += r['borrow_id'] + len(r['book_name'])
+    return total
+
+
+async def measure(conn: asyncpg.Connection, rows: int, repeat: int, copy: bool) -> tuple[float, int]:
+    """Returns (mean latency in ms, peak traced allocation in bytes)."""
+    elapsed = 0.0
+    peak = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        started = time.perf_counter()
+        records = await conn.fetch(QUERY, rows)
+        result = [dict(r) for r in records] if copy else records
+        read_fields(result)
+        elapsed += time.perf_counter() - started
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return elapsed / repeat * 1000, peak
+
+
+async def main(rows: int, repeat: int) -> None:
+    load_dotenv(dotenv_path='.env.test')
+    conn = await asyncpg.connect(
+        database=os.getenv("DB_NAME"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT"),
+        record_class=Row
+    )
+    try:
+        await measure(conn, rows, 2, copy=False)  # warm-up: prepared statement cache, codecs
+        for label, copy in (("dict copy", True), ("Row as-is", False)):
+            latency, peak = await measure(conn, rows, repeat, copy)
+            print(f"{label:<10} rows={rows:<7} latency={latency:8.2f} ms  peak alloc={peak / 1024:10.1f} KiB")
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.repeat))
@@ -12,7 +12,8 @@ $DOCKER_COMPOSE = "docker-compose"
 $BOTS_SERVICE = "bots"
 $DB_SERVICE = "db"
 $REDIS_SERVICE = "redis"
-$CELERY_WORKER = "celery_worker"
+$CELERY_WORKER = "celery_worker_interactive"
+$CELERY_WORKERS = @("celery_worker_interactive", "celery_worker_admin", "celery_worker_bulk", "celery_worker_maintenance")
 $CELERY_BEAT = "celery_beat"
 
 function Write-Success { Write-Host $args -ForegroundColor Green }
@@ -117,13 +118,13 @@ function Invoke-Status {
 # --- Управление Celery ---
 function Invoke-CeleryRestart {
     Write-Info ">>> Перезапуск Celery (worker + beat)..."
-    & $DOCKER_COMPOSE restart $CELERY_WORKER $CELERY_BEAT
+    & $DOCKER_COMPOSE restart $CELERY_WORKERS $CELERY_BEAT
     Write-Success "✓ Celery перезапущен!"
 }
 
 function Invoke-CeleryLogs {
     Write-Info ">>> Логи Celery (worker + beat)..."
-    & $DOCKER_COMPOSE logs -f $CELERY_WORKER $CELERY_BEAT
+    & $DOCKER_COMPOSE logs -f $CELERY_WORKERS $CELERY_BEAT
 }
 
 function Invoke-CeleryStatus {
@@ -1,3 +1,6 @@
+-- Расширение для нечеткого поиска пользователей (триграммы)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- Таблица авторов
 CREATE TABLE IF NOT EXISTS authors (
     id SERIAL PRIMARY KEY,
@@ -30,7 +33,8 @@ CREATE TABLE IF NOT EXISTS users (
     registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     registration_code VARCHAR(36) UNIQUE,
     is_banned BOOLEAN DEFAULT FALSE,
-    force_logout BOOLEAN DEFAULT FALSE
+    force_logout BOOLEAN DEFAULT FALSE,
+    bot_blocked BOOLEAN DEFAULT FALSE
 );
 
 -- Таблица заимствованных книг
@@ -76,14 +80,22 @@ CREATE TABLE IF NOT EXISTS ratings (
     UNIQUE(user_id, book_id)
 );
 
--- Таблица уведомлений
+-- Таблица уведомлений (одновременно журнал доставки)
 CREATE TABLE IF NOT EXISTS notifications (
     id SERIAL PRIMARY KEY,
     user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
     text TEXT NOT NULL,
     category VARCHAR(50) NOT NULL,
     is_read BOOLEAN DEFAULT FALSE,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    idempotency_key VARCHAR(100) UNIQUE,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'sent', 'blocked', 'timed_out', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0 CHECK (attempts >= 0),
+    telegram_message_id BIGINT,
+    sent_at TIMESTAMP,
+    last_error TEXT,
+    claimed_at TIMESTAMP
 );
 
 -- Таблица логов активности
@@ -105,6 +117,447 @@ CREATE TABLE IF NOT EXISTS book_copies (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Экземпляр, выданный по записи (поэкземплярный учет)
+ALTER TABLE borrowed_books ADD COLUMN IF NOT EXISTS copy_id INTEGER REFERENCES book_copies(id) ON DELETE SET NULL;
+
+-- Отложенный для брони экземпляр и срок, до которого его держат (очередь броней)
+ALTER TABLE reservations
+    ADD COLUMN IF NOT EXISTS copy_id INTEGER REFERENCES book_copies(id) ON DELETE SET NULL,
+    ADD COLUMN IF NOT EXISTS hold_expires_at TIMESTAMP;
+
+-- Счетчики пользователя: открытые выдачи и непрочитанные уведомления
+ALTER TABLE users
+    ADD COLUMN IF NOT EXISTS active_loans INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS unread_notifications INTEGER NOT NULL DEFAULT 0;
+
+-- Время захвата записи журнала доставки отправителем (аренда на время попытки)
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP;
+
+-- Поисковый вектор книги для полнотекстового поиска (поддерживается триггерами)
+ALTER TABLE books ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+-- Статистика авторов: книги, свободные книги, сумма и число оценок (поддерживаются триггерами)
+ALTER TABLE authors
+    ADD COLUMN IF NOT EXISTS book_count INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS available_books INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS rating_sum INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS rating_count INTEGER NOT NULL DEFAULT 0;
+
+-- Справочник жанров: каноническое название и счетчики книг (поддерживаются триггерами)
+CREATE TABLE IF NOT EXISTS genres (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    book_count INTEGER NOT NULL DEFAULT 0,
+    available_books INTEGER NOT NULL DEFAULT 0
+);
+
+ALTER TABLE books ADD COLUMN IF NOT EXISTS genre_id INTEGER REFERENCES genres(id) ON DELETE SET NULL;
+
+-- Книга, к которой относится запись журнала (из details вида 'Book ID: N'), для фильтра по книге
+ALTER TABLE activity_log
+    ADD COLUMN IF NOT EXISTS book_id INTEGER
+    GENERATED ALWAYS AS ((substring(details FROM 'Book ID: ([0-9]+)'))::integer) STORED;
+
+-- Нормализованные идентификаторы входа (логин, контакт, Telegram username) — поддерживаются
+-- триггером trg_users_identifiers, вход ищет пользователя одной пробой индекса
+CREATE TABLE IF NOT EXISTS user_identifiers (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    kind VARCHAR(20) NOT NULL CHECK (kind IN ('username', 'contact', 'telegram')),
+    identifier VARCHAR(255) NOT NULL,
+    PRIMARY KEY (user_id, kind)
+);
+
+-- Outbox уведомлений: пишется в одной транзакции с бизнес-изменением,
+-- ретранслятор (src/core/outbox.py) переносит записи в очередь Celery
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    task_name VARCHAR(100) NOT NULL,
+    payload JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION notify_outbox() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('notification_outbox', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER trg_notification_outbox_notify
+    AFTER INSERT ON notification_outbox
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_outbox();
+
+-- Сброс кэша chat_id при изменении привязки Telegram или удалении пользователя
+CREATE OR REPLACE FUNCTION notify_user_chat_changed() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('user_chat_changed', OLD.id::text);
+    ELSIF OLD.telegram_id IS DISTINCT FROM NEW.telegram_id OR OLD.bot_blocked IS DISTINCT FROM NEW.bot_blocked THEN
+        PERFORM pg_notify('user_chat_changed', NEW.id::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER trg_users_chat_changed
+    AFTER UPDATE OF telegram_id, bot_blocked OR DELETE ON users
+    FOR EACH ROW EXECUTE FUNCTION notify_user_chat_changed();
+
+-- Поэкземплярный учет: books.total_quantity/available_quantity — производные счетчики
+-- по book_copies. Триггер отложенный (срабатывает при COMMIT), поэтому строка книги
+-- блокируется только на время коммита, а не на всю транзакцию выдачи.
+CREATE OR REPLACE FUNCTION sync_book_quantities() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE books
+        SET total_quantity = total_quantity - 1,
+            available_quantity = available_quantity - (CASE WHEN OLD.is_available THEN 1 ELSE 0 END)
+        WHERE id = OLD.book_id;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'INSERT') THEN
+        UPDATE books
+        SET total_quantity = total_quantity + 1,
+            available_quantity = available_quantity + (CASE WHEN NEW.is_available THEN 1 ELSE 0 END)
+        WHERE id = NEW.book_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'trg_book_copies_quantities') THEN
+        CREATE CONSTRAINT TRIGGER trg_book_copies_quantities
+            AFTER INSERT OR UPDATE OF is_available, book_id OR DELETE ON book_copies
+            DEFERRABLE INITIALLY DEFERRED
+            FOR EACH ROW EXECUTE FUNCTION sync_book_quantities();
+    END IF;
+END $$;
+
+-- Создает экземпляры для книг, у которых их еще нет (миграция и начальные данные)
+CREATE OR REPLACE FUNCTION backfill_book_copies() RETURNS integer AS $$
+DECLARE
+    b RECORD;
+    backfilled integer := 0;
+BEGIN
+    FOR b IN
+        SELECT bk.id, bk.total_quantity FROM books bk
+        WHERE bk.total_quantity > 0 AND NOT EXISTS (SELECT 1 FROM book_copies c WHERE c.book_id = bk.id)
+        FOR UPDATE
+    LOOP
+        -- Счетчики заново наберет триггер trg_book_copies_quantities по созданным экземплярам
+        UPDATE books SET total_quantity = 0, available_quantity = 0 WHERE id = b.id;
+        INSERT INTO book_copies (book_id, serial_number)
+        SELECT b.id, 'B' || b.id || '-' || n FROM generate_series(1, b.total_quantity) AS n;
+        -- Открытым выдачам достаются экземпляры по порядку, эти экземпляры заняты
+        WITH loans AS (
+            SELECT borrow_id, row_number() OVER (ORDER BY borrow_id) AS n
+            FROM borrowed_books WHERE book_id = b.id AND return_date IS NULL
+        ),
+        copies AS (
+            SELECT id, row_number() OVER (ORDER BY id) AS n FROM book_copies WHERE book_id = b.id
+        ),
+        assigned AS (
+            UPDATE borrowed_books bb SET copy_id = copies.id
+            FROM loans JOIN copies USING (n)
+            WHERE bb.borrow_id = loans.borrow_id
+            RETURNING bb.copy_id
+        )
+        UPDATE book_copies SET is_available = FALSE WHERE id IN (SELECT copy_id FROM assigned);
+        backfilled := backfilled + 1;
+    END LOOP;
+    RETURN backfilled;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Счетчики пользователя (active_loans, unread_notifications) поддерживаются триггерами
+-- в той же транзакции, что и выдача или уведомление; reconcile_user_counters()
+-- исправляет расхождения (периодическая задача reconcile_user_counters).
+CREATE OR REPLACE FUNCTION sync_user_active_loans() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.return_date IS NULL THEN
+        UPDATE users SET active_loans = active_loans - 1 WHERE id = OLD.user_id;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'INSERT') AND NEW.return_date IS NULL THEN
+        UPDATE users SET active_loans = active_loans + 1 WHERE id = NEW.user_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER trg_borrowed_books_active_loans
+    AFTER INSERT OR UPDATE OF return_date, user_id OR DELETE ON borrowed_books
+    FOR EACH ROW EXECUTE FUNCTION sync_user_active_loans();
+
+CREATE OR REPLACE FUNCTION sync_user_unread_notifications() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.is_read IS NOT TRUE THEN
+        UPDATE users SET unread_notifications = unread_notifications - 1 WHERE id = OLD.user_id;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'INSERT') AND NEW.is_read IS NOT TRUE THEN
+        UPDATE users SET unread_notifications = unread_notifications + 1 WHERE id = NEW.user_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER trg_notifications_unread
+    AFTER INSERT OR UPDATE OF is_read, user_id OR DELETE ON notifications
+    FOR EACH ROW EXECUTE FUNCTION sync_user_unread_notifications();
+
+CREATE OR REPLACE FUNCTION reconcile_user_counters() RETURNS integer AS $$
+DECLARE
+    uid integer;
+    changed integer;
+    repaired integer := 0;
+BEGIN
+    FOR uid IN
+        SELECT u.id FROM users u
+        LEFT JOIN (SELECT user_id, COUNT(*) AS n FROM borrowed_books WHERE return_date IS NULL GROUP BY user_id) loans
+            ON loans.user_id = u.id
+        LEFT JOIN (SELECT user_id, COUNT(*) AS n FROM notifications WHERE is_read IS NOT TRUE GROUP BY user_id) unread
+            ON unread.user_id = u.id
+        WHERE u.active_loans <> COALESCE(loans.n, 0) OR u.unread_notifications <> COALESCE(unread.n, 0)
+    LOOP
+        -- Под блокировкой строки пользователя счетчики не меняются, пересчет видит все коммиты
+        PERFORM 1 FROM users WHERE id = uid FOR UPDATE;
+        UPDATE users u
+        SET active_loans = actual.loans, unread_notifications = actual.unread
+        FROM (
+            SELECT (SELECT COUNT(*) FROM borrowed_books WHERE user_id = uid AND return_date IS NULL) AS loans,
+                   (SELECT COUNT(*) FROM notifications WHERE user_id = uid AND is_read IS NOT TRUE) AS unread
+        ) AS actual
+        WHERE u.id = uid
+          AND (u.active_loans, u.unread_notifications) IS DISTINCT FROM (actual.loans, actual.unread);
+        GET DIAGNOSTICS changed = ROW_COUNT;
+        repaired := repaired + changed;
+    END LOOP;
+    RETURN repaired;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Нормализация идентификатора входа: регистр, пробелы, ведущий '@' и формат телефона
+-- (+7 для российских номеров, как normalize_phone_number в боте)
+CREATE OR REPLACE FUNCTION normalize_login(value text) RETURNS text AS $$
+    SELECT CASE
+        WHEN v ~ '^[+]?[0-9 ()-]+$' AND length(digits) BETWEEN 10 AND 15 THEN
+            CASE WHEN digits ~ '^[78][0-9]{10}$' THEN '+7' || substr(digits, 2) ELSE '+' || digits END
+        ELSE v
+    END
+    FROM (SELECT ltrim(lower(btrim(value)), '@') AS v) AS trimmed
+    CROSS JOIN LATERAL (SELECT regexp_replace(v, '[^0-9]', '', 'g') AS digits) AS phone
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION sync_user_identifiers() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM user_identifiers WHERE user_id = NEW.id;
+    INSERT INTO user_identifiers (user_id, kind, identifier)
+    SELECT NEW.id, ids.kind, normalize_login(ids.value)
+    FROM (VALUES ('username', NEW.username), ('contact', NEW.contact_info), ('telegram', NEW.telegram_username)) AS ids(kind, value)
+    WHERE normalize_login(ids.value) <> '';
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER trg_users_identifiers
+    AFTER INSERT OR UPDATE OF username, contact_info, telegram_username ON users
+    FOR EACH ROW EXECUTE FUNCTION sync_user_identifiers();
+
+-- Жанр книги: books.genre_id по названию жанра (без учета регистра и лишних пробелов),
+-- новый жанр заводится автоматически
+CREATE UNIQUE INDEX IF NOT EXISTS idx_genres_name_lower ON genres(lower(name));
+
+CREATE OR REPLACE FUNCTION assign_book_genre() RETURNS trigger AS $$
+DECLARE
+    canonical text := NULLIF(regexp_replace(btrim(NEW.genre), '[[:space:]]+', ' ', 'g'), '');
+BEGIN
+    IF canonical IS NULL THEN
+        NEW.genre_id := NULL;
+        RETURN NEW;
+    END IF;
+    INSERT INTO genres (name) VALUES (canonical) ON CONFLICT ((lower(name))) DO NOTHING;
+    SELECT id, name INTO NEW.genre_id, NEW.genre FROM genres WHERE lower(name) = lower(canonical);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER trg_books_genre
+    BEFORE INSERT OR UPDATE OF genre ON books
+    FOR EACH ROW EXECUTE FUNCTION assign_book_genre();
+
+CREATE OR REPLACE FUNCTION sync_genre_counts() RETURNS trigger AS $$
+BEGIN
+    -- Выдачи меняют available_quantity постоянно, а счетчик жанра — только при переходе через ноль
+    IF TG_OP = 'UPDATE' AND NEW.genre_id IS NOT DISTINCT FROM OLD.genre_id
+       AND (COALESCE(NEW.available_quantity, 0) > 0) = (COALESCE(OLD.available_quantity, 0) > 0) THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.genre_id IS NOT NULL THEN
+        UPDATE genres
+        SET book_count = book_count - 1,
+            available_books = available_books - (COALESCE(OLD.available_quantity, 0) > 0)::int
+        WHERE id = OLD.genre_id;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'INSERT') AND NEW.genre_id IS NOT NULL THEN
+        UPDATE genres
+        SET book_count = book_count + 1,
+            available_books = available_books + (COALESCE(NEW.available_quantity, 0) > 0)::int
+        WHERE id = NEW.genre_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- genre_id меняет только BEFORE-триггер, а UPDATE OF срабатывает по столбцам из SET,
+-- поэтому в списке нужен и genre
+CREATE OR REPLACE TRIGGER trg_books_genre_counts
+    AFTER INSERT OR UPDATE OF genre, genre_id, available_quantity OR DELETE ON books
+    FOR EACH ROW EXECUTE FUNCTION sync_genre_counts();
+
+-- Полный пересчет счетчиков жанров (миграция)
+CREATE OR REPLACE FUNCTION refresh_genre_counts() RETURNS integer AS $$
+DECLARE
+    repaired integer;
+BEGIN
+    UPDATE genres g
+    SET book_count = actual.book_count, available_books = actual.available_books
+    FROM (
+        SELECT g2.id,
+               (SELECT COUNT(*) FROM books b WHERE b.genre_id = g2.id) AS book_count,
+               (SELECT COUNT(*) FROM books b WHERE b.genre_id = g2.id AND b.available_quantity > 0) AS available_books
+        FROM genres g2
+    ) AS actual
+    WHERE g.id = actual.id
+      AND (g.book_count, g.available_books) IS DISTINCT FROM (actual.book_count, actual.available_books);
+    GET DIAGNOSTICS repaired = ROW_COUNT;
+    RETURN repaired;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Статистика авторов обновляется вместе с каталогом, выдачами (переход available_quantity
+-- через ноль) и оценками; refresh_author_stats() пересчитывает ее целиком (миграция).
+CREATE OR REPLACE FUNCTION sync_author_book_stats() RETURNS trigger AS $$
+DECLARE
+    target_book integer := CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END;
+    book_ratings record;
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW.author_id IS NOT DISTINCT FROM OLD.author_id
+       AND (COALESCE(NEW.available_quantity, 0) > 0) = (COALESCE(OLD.available_quantity, 0) > 0) THEN
+        RETURN NULL;
+    END IF;
+    -- Оценки книги переходят к автору вместе с книгой (при удалении книги их снимает
+    -- BEFORE-триггер, пока каскад еще не удалил оценки)
+    SELECT COALESCE(SUM(rating), 0) AS total, COUNT(rating) AS n INTO book_ratings
+    FROM ratings WHERE book_id = target_book
+      AND (TG_OP <> 'UPDATE' OR NEW.author_id IS DISTINCT FROM OLD.author_id);
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.author_id IS NOT NULL THEN
+        UPDATE authors
+        SET book_count = book_count - 1,
+            available_books = available_books - (COALESCE(OLD.available_quantity, 0) > 0)::int,
+            rating_sum = rating_sum - book_ratings.total,
+            rating_count = rating_count - book_ratings.n
+        WHERE id = OLD.author_id;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'INSERT') AND NEW.author_id IS NOT NULL THEN
+        UPDATE authors
+        SET book_count = book_count + 1,
+            available_books = available_books + (COALESCE(NEW.available_quantity, 0) > 0)::int,
+            rating_sum = rating_sum + book_ratings.total,
+            rating_count = rating_count + book_ratings.n
+        WHERE id = NEW.author_id;
+    END IF;
+    IF TG_OP = 'DELETE' THEN
+        RETURN OLD;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER trg_books_author_stats
+    AFTER INSERT OR UPDATE OF author_id, available_quantity ON books
+    FOR EACH ROW EXECUTE FUNCTION sync_author_book_stats();
+
+CREATE OR REPLACE TRIGGER trg_books_author_stats_delete
+    BEFORE DELETE ON books
+    FOR EACH ROW EXECUTE FUNCTION sync_author_book_stats();
+
+CREATE OR REPLACE FUNCTION sync_author_ratings() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.rating IS NOT NULL THEN
+        UPDATE authors a SET rating_sum = rating_sum - OLD.rating, rating_count = rating_count - 1
+        FROM books b WHERE b.id = OLD.book_id AND a.id = b.author_id;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'INSERT') AND NEW.rating IS NOT NULL THEN
+        UPDATE authors a SET rating_sum = rating_sum + NEW.rating, rating_count = rating_count + 1
+        FROM books b WHERE b.id = NEW.book_id AND a.id = b.author_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER trg_ratings_author_stats
+    AFTER INSERT OR UPDATE OF rating, book_id OR DELETE ON ratings
+    FOR EACH ROW EXECUTE FUNCTION sync_author_ratings();
+
+CREATE OR REPLACE FUNCTION refresh_author_stats() RETURNS integer AS $$
+DECLARE
+    repaired integer;
+BEGIN
+    UPDATE authors a
+    SET book_count = actual.book_count, available_books = actual.available_books,
+        rating_sum = actual.rating_sum, rating_count = actual.rating_count
+    FROM (
+        SELECT a2.id,
+               (SELECT COUNT(*) FROM books b WHERE b.author_id = a2.id) AS book_count,
+               (SELECT COUNT(*) FROM books b WHERE b.author_id = a2.id AND b.available_quantity > 0) AS available_books,
+               (SELECT COALESCE(SUM(r.rating), 0) FROM ratings r JOIN books b ON b.id = r.book_id WHERE b.author_id = a2.id) AS rating_sum,
+               (SELECT COUNT(r.rating) FROM ratings r JOIN books b ON b.id = r.book_id WHERE b.author_id = a2.id) AS rating_count
+        FROM authors a2
+    ) AS actual
+    WHERE a.id = actual.id
+      AND (a.book_count, a.available_books, a.rating_sum, a.rating_count)
+          IS DISTINCT FROM (actual.book_count, actual.available_books, actual.rating_sum, actual.rating_count);
+    GET DIAGNOSTICS repaired = ROW_COUNT;
+    RETURN repaired;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Полнотекстовый поиск: русская морфология, вес A — название, B — автор, C — жанр,
+-- D — описание. Вектор пересчитывается при записи книги и при переименовании автора.
+CREATE OR REPLACE FUNCTION book_search_vector(name text, author text, genre text, description text)
+RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('russian', COALESCE(name, '')), 'A')
+        || setweight(to_tsvector('russian', COALESCE(author, '')), 'B')
+        || setweight(to_tsvector('russian', COALESCE(genre, '')), 'C')
+        || setweight(to_tsvector('russian', COALESCE(description, '')), 'D')
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION sync_book_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := book_search_vector(
+        NEW.name, (SELECT name FROM authors WHERE id = NEW.author_id), NEW.genre, NEW.description
+    );
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER trg_books_search_vector
+    BEFORE INSERT OR UPDATE OF name, author_id, genre, description ON books
+    FOR EACH ROW EXECUTE FUNCTION sync_book_search_vector();
+
+CREATE OR REPLACE FUNCTION sync_author_search_vectors() RETURNS trigger AS $$
+BEGIN
+    UPDATE books
+    SET search_vector = book_search_vector(name, NEW.name, genre, description)
+    WHERE author_id = NEW.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER trg_authors_search_vector
+    AFTER UPDATE OF name ON authors
+    FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name) EXECUTE FUNCTION sync_author_search_vectors();
+
 -- ==============================================================================
 -- СОЗДАНИЕ ИНДЕКСОВ
 -- ==============================================================================
@@ -117,7 +570,21 @@ CREATE INDEX IF NOT EXISTS idx_ratings_user ON ratings(user_id);
 CREATE INDEX IF NOT EXISTS idx_ratings_book ON ratings(book_id);
 CREATE INDEX IF NOT EXISTS idx_users_telegram ON users(telegram_id);
 CREATE INDEX IF NOT EXISTS idx_notifications_user ON notifications(user_id);
-CREATE INDEX IF NOT EXISTS idx_activity_log_user ON activity_log(user_id);
+CREATE INDEX IF NOT EXISTS idx_notifications_undelivered ON notifications(status) WHERE status IN ('pending', 'timed_out');
+CREATE INDEX IF NOT EXISTS idx_activity_log_time ON activity_log(timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_activity_log_user_time ON activity_log(user_id, timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_activity_log_action_time ON activity_log(action, timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_activity_log_book_time ON activity_log(book_id, timestamp DESC, id DESC) WHERE book_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_book_copies_available ON book_copies(book_id) WHERE is_available;
+CREATE INDEX IF NOT EXISTS idx_reservations_queue ON reservations(book_id, reservation_date, reservation_id) WHERE NOT notified;
+CREATE INDEX IF NOT EXISTS idx_reservations_holds ON reservations(hold_expires_at) WHERE notified;
+CREATE INDEX IF NOT EXISTS idx_user_identifiers_lookup ON user_identifiers(identifier, kind, user_id);
+CREATE INDEX IF NOT EXISTS idx_users_full_name_trgm ON users USING gin (lower(full_name) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_user_identifiers_trgm ON user_identifiers USING gin (identifier gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_genres_menu ON genres(name) INCLUDE (id, book_count, available_books);
+CREATE INDEX IF NOT EXISTS idx_authors_listing ON authors(name) INCLUDE (id, book_count, available_books, rating_sum, rating_count) WHERE book_count > 0;
+CREATE INDEX IF NOT EXISTS idx_books_search_vector ON books USING gin (search_vector);
+CREATE INDEX IF NOT EXISTS idx_books_genre_available ON books(genre_id, name) WHERE available_quantity > 0;
 
 -- ==============================================================================
 -- НАЧАЛЬНЫЕ ДАННЫЕ (seed data)
@@ -191,6 +658,57 @@ INSERT INTO books (name, author_id, genre, description, total_quantity, availabl
     ('Ведьмак: Последнее желание', (SELECT id FROM authors WHERE name='Анджей Сапковский'), 'Фэнтези', 'Сборник рассказов о ведьмаке Геральте из Ривии.', 4, 4)
 ON CONFLICT (name) DO NOTHING;
 
+-- Экземпляры для добавленных книг
+SELECT backfill_book_copies();
+
+-- Счетчики пользователей по уже существующим данным
+SELECT reconcile_user_counters();
+
+-- Идентификаторы входа для пользователей, созданных до таблицы user_identifiers
+INSERT INTO user_identifiers (user_id, kind, identifier)
+SELECT u.id, ids.kind, normalize_login(ids.value)
+FROM users u
+CROSS JOIN LATERAL (VALUES ('username', u.username), ('contact', u.contact_info), ('telegram', u.telegram_username)) AS ids(kind, value)
+WHERE normalize_login(ids.value) <> ''
+ON CONFLICT (user_id, kind) DO NOTHING;
+
+-- Логин и контакт уникальны без учета регистра и формата; совпадения, оставшиеся от прежних
+-- регистраций, перечисляются в ошибке и разрешаются вручную
+DO $$
+DECLARE
+    collisions text;
+BEGIN
+    SELECT string_agg(format('%s "%s": id %s', kind, identifier, user_ids), '; ')
+    INTO collisions
+    FROM (
+        SELECT kind, identifier, string_agg(user_id::text, ', ' ORDER BY user_id) AS user_ids
+        FROM user_identifiers
+        WHERE kind IN ('username', 'contact')
+        GROUP BY kind, identifier
+        HAVING COUNT(*) > 1
+    ) AS duplicates;
+    IF collisions IS NOT NULL THEN
+        RAISE EXCEPTION 'Логины или контакты совпадают после нормализации: %', collisions
+            USING HINT = 'Переименуйте пользователей (вход по таким логинам неоднозначен) и повторите инициализацию.';
+    END IF;
+END $$;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_user_identifiers_unique_login ON user_identifiers(kind, identifier)
+    WHERE kind IN ('username', 'contact');
+
+-- Жанры для книг, заведенных до справочника genres
+UPDATE books SET genre = genre WHERE genre_id IS NULL AND genre IS NOT NULL;
+SELECT refresh_genre_counts();
+
+-- Статистика авторов по уже существующим книгам и оценкам
+SELECT refresh_author_stats();
+
+-- Поисковые векторы для книг, заведенных до полнотекстового поиска
+UPDATE books b
+SET search_vector = book_search_vector(b.name, a.name, b.genre, b.description)
+FROM authors a
+WHERE a.id = b.author_id AND b.search_vector IS NULL;
+
 -- Вывод информации
 DO $$
 BEGIN
@@ -0,0 +1,214 @@
+import csv
+import io
+import logging
+import tempfile
+from contextlib import aclosing
+from datetime import datetime, timedelta
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from src.core import config
+from src.core.db import data_access as db_data
+from src.core.db.utils import get_db_connection
+from src.admin_bot import keyboards
+
+logger = logging.getLogger(__name__)
+
+USAGE = (
+    "📜 Журнал активности\n\n"
+    "Использование: /activity [фильтры]\n"
+    "• action=<действие>\n"
+    "• user=<ID или логин>\n"
+    "• book=<ID книги>\n"
+    "• days=<N> — за последние N дней\n"
+    "• from=ДД.ММ.ГГГГ to=ДД.ММ.ГГГГ — период (включительно)\n\n"
+    "Например: /activity action=return_book days=7"
+)
+
+EXPORT_COLUMNS = ('id', 'timestamp', 'user_id', 'username', 'action', 'book_id', 'details')
+
+
+def _parse_date(value: str) -> datetime:
+    try:
+        return datetime.strptime(value, '%d.%m.%Y')
+    except ValueError:
+        raise ValueError(f"Дата «{value}» должна быть в формате ДД.ММ.ГГГГ.")
+
+
+def parse_activity_filters(args: list[str], now: datetime | None = None) -> dict:
+    """
+    Разбирает фильтры вида `action=login user=42 book=5 days=7 from=01.10.2026 to=15.10.2026`.
+    Логин в user= возвращается как 'user_login' и разрешается в ID при запросе.
+
+    Raises:
+        ValueError: с текстом для администратора, если фильтр не распознан.
+    """
+    now = now or datetime.now()
+    filters = {}
+    for arg in args:
+        key, sep, value = arg.partition('=')
+        key, value = key.lower(), value.strip()
+        if not sep or not value:
+            raise ValueError(f"Фильтр «{arg}» должен иметь вид ключ=значение.")
+        if key == 'action':
+            filters['action'] = value
+        elif key == 'user':
+            filters['user_id' if value.isdigit() else 'user_login'] = int(value) if value.isdigit() else value
+        elif key == 'book':
+            if not value.isdigit():
+                raise ValueError("book= ожидает числовой ID книги.")
+            filters['book_id'] = int(value)
+        elif key == 'days':
+            if not value.isdigit() or int(value) == 0:
+                raise ValueError("days= ожидает положительное число дней.")
+            filters['since'] = now - timedelta(days=int(value))
+        elif key == 'from':
+            filters['since'] = _parse_date(value)
+        elif key == 'to':
+            filters['until'] = _parse_date(value) + timedelta(days=1)
+        else:
+            raise ValueError(f"Неизвестный фильтр «{key}».")
+    if filters.get('since') and filters.get('until') and filters['since'] >= filters['until']:
+        raise ValueError("Начало периода должно быть раньше конца.")
+    return filters
+
+
+def _describe_filters(filters: dict) -> str:
+    parts = []
+    if filters.get('action'):
+        parts.append(f"действие {filters['action']}")
+    if filters.get('user_id'):
+        parts.append(f"пользователь #{filters['user_id']}")
+    if filters.get('book_id'):
+        parts.append(f"книга #{filters['book_id']}")
+    if filters.get('since'):
+        parts.append(f"с {filters['since'].strftime('%d.%m.%Y %H:%M')}")
+    if filters.get('until'):
+        parts.append(f"до {filters['until'].strftime('%d.%m.%Y %H:%M')}")
+    return ", ".join(parts) or "все записи"
+
+
+async def _show_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Показывает страницу журнала, начиная с курсора на вершине стека."""
+    state = context.user_data['activity']
+    page_size = config.ACTIVITY_PAGE_SIZE
+    async with get_db_connection() as conn:
+        # Одна лишняя строка показывает, есть ли следующая страница, без COUNT
+        rows = await db_data.get_activity_page(conn, state['filters'], before=state['cursors'][-1], limit=page_size + 1)
+
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    state['next_cursor'] = (rows[-1]['timestamp'], rows[-1]['id']) if has_next else None
+
+    lines = [f"📜 Журнал активности ({_describe_filters(state['filters'])}), стр. {len(state['cursors'])}\n"]
+    for row in rows:
+        who = row['username'] or (f"#{row['user_id']}" if row['user_id'] else "—")
+        details = f" ({row['details']})" if row['details'] else ""
+        lines.append(f"{row['timestamp'].strftime('%d.%m.%Y %H:%M')} · {who} · {row['action']}{details}")
+    if not rows:
+        lines.append("Нет записей.")
+
+    reply_markup = keyboards.get_activity_keyboard(
+        has_prev=len(state['cursors']) > 1, has_next=has_next, user_id=state.get('back_user_id')
+    )
+    # Детали пишут пользователи, поэтому без Markdown
+    if update.callback_query:
+        await update.callback_query.edit_message_text("\n".join(lines), reply_markup=reply_markup)
+    else:
+        await update.message.reply_text("\n".join(lines), reply_markup=reply_markup)
+
+
+async def show_activity(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Открывает журнал активности по фильтрам из команды /activity."""
+    try:
+        filters = parse_activity_filters(context.args or [])
+    except ValueError as e:
+        await update.message.reply_text(f"⚠️ {e}\n\n{USAGE}")
+        return
+
+    try:
+        if login := filters.pop('user_login', None):
+            async with get_db_connection() as conn:
+                filters['user_id'] = (await db_data.get_user_by_login(conn, login))['id']
+        context.user_data['activity'] = {'filters': filters, 'cursors': [None]}
+        await _show_page(update, context)
+    except db_data.NotFoundError:
+        await update.message.reply_text(f"⚠️ Пользователь «{login}» не найден.")
+    except Exception as e:
+        logger.error(f"Ошибка при получении журнала активности: {e}", exc_info=True)
+        await update.message.reply_text(f"❌ Ошибка: {e}")
+
+
+async def show_user_activity(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Открывает журнал активности одного пользователя из его карточки."""
+    query = update.callback_query
+    await query.answer()
+    user_id = int(query.data.split('_')[2])
+    context.user_data['activity'] = {'filters': {'user_id': user_id}, 'cursors': [None], 'back_user_id': user_id}
+    try:
+        await _show_page(update, context)
+    except Exception as e:
+        logger.error(f"Ошибка при получении логов: {e}", exc_info=True)
+        await query.edit_message_text(f"❌ Ошибка: {e}")
+
+
+async def turn_activity_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Листает журнал вперед или назад по стеку курсоров."""
+    query = update.callback_query
+    state = context.user_data.get('activity')
+    if not state:
+        await query.answer("Журнал устарел, откройте его заново через /activity.", show_alert=True)
+        return
+    await query.answer()
+
+    if query.data == 'activity_next' and state.get('next_cursor'):
+        state['cursors'].append(state['next_cursor'])
+    elif query.data == 'activity_prev' and len(state['cursors']) > 1:
+        state['cursors'].pop()
+    try:
+        await _show_page(update, context)
+    except Exception as e:
+        logger.error(f"Ошибка при получении журнала активности: {e}", exc_info=True)
+        await query.edit_message_text(f"❌ Ошибка: {e}")
+
+
+async def export_activity(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Выгружает записи журнала по текущим фильтрам в CSV, читая их через серверный курсор."""
+    query = update.callback_query
+    state = context.user_data.get('activity')
+    if not state:
+        await query.answer("Журнал устарел, откройте его заново через /activity.", show_alert=True)
+        return
+    await query.answer("⏳ Готовлю выгрузку...")
+
+    limit = config.ACTIVITY_EXPORT_MAX_ROWS
+    exported = 0
+    try:
+        # Строки пишутся во временный файл по мере чтения и в памяти не накапливаются
+        with tempfile.TemporaryFile() as buffer:
+            text = io.TextIOWrapper(buffer, encoding='utf-8-sig', newline='')
+            writer = csv.writer(text)
+            writer.writerow(EXPORT_COLUMNS)
+            async with get_db_connection() as conn:
+                async with aclosing(db_data.iter_activity(conn, state['filters'])) as records:
+                    async for record in records:
+                        writer.writerow([record[column] for column in EXPORT_COLUMNS])
+                        exported += 1
+                        if exported >= limit:
+                            break
+            text.flush()
+            text.detach()
+            buffer.seek(0)
+
+            caption = f"📜 Журнал активности: {_describe_filters(state['filters'])}\nСтрок: {exported}"
+            if exported >= limit:
+                caption += f" (выгрузка ограничена {limit} строками, сузьте фильтры)"
+            await context.bot.send_document(
+                chat_id=query.message.chat_id,
+                document=buffer,
+                filename=f"activity_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
+                caption=caption,
+            )
+    except Exception as e:
+        logger.error(f"Ошибка при выгрузке журнала активности: {e}", exc_info=True)
+        await query.message.reply_text(f"❌ Ошибка выгрузки: {e}")
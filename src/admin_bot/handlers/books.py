@@ -10,10 +10,10 @@ from telegram.ext import (
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from src.core.db import data_access as db_data
 from src.core.db.utils import get_db_connection
-from src.core import tasks
 from src.admin_bot import keyboards
 from src.admin_bot.states import AdminState
 from src.core.utils import rate_limit
+from src.core.message_renderer import render_screen
 
 logger = logging.getLogger(__name__)
 
@@ -64,7 +64,8 @@ async def show_books_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
     reply_markup = keyboards.get_books_list_keyboard(books, total_books, page, books_per_page)
 
     if query:
-        await query.edit_message_text(message_text, reply_markup=reply_markup, parse_mode='Markdown')
+        # Назад к списку возвращаются и из карточки с обложкой
+        await render_screen(update, context, message_text, reply_markup=reply_markup, parse_mode='Markdown')
     else:
         await update.message.reply_text(message_text, reply_markup=reply_markup, parse_mode='Markdown')
 
@@ -79,23 +80,16 @@ async def show_book_details(update: Update, context: ContextTypes.DEFAULT_TYPE):
         async with get_db_connection() as conn:
             content = await _build_book_details_content(conn, book_id, current_page)
 
-        if query.message.photo and not content.get('cover_id'):
-            await query.message.delete()
-        elif query.message.text and content.get('cover_id'):
-            await query.message.delete()
-
-        if content.get('cover_id'):
-            if query.message.photo:
-                await query.edit_message_caption(caption=content['text'], reply_markup=content['reply_markup'], parse_mode='Markdown')
-            else:
-                await context.bot.send_photo(chat_id=query.message.chat_id, photo=content['cover_id'], caption=content['text'], reply_markup=content['reply_markup'], parse_mode='Markdown')
-        else:
-            await query.edit_message_text(text=content['text'], reply_markup=content['reply_markup'], parse_mode='Markdown')
+        # Фото меняется на месте вместе с подписью; пересылка — только при смене вида сообщения
+        await render_screen(
+            update, context, content['text'], reply_markup=content['reply_markup'],
+            photo=content['cover_id'], parse_mode='Markdown'
+        )
     except db_data.NotFoundError:
-        await query.edit_message_text("❌ Книга не найдена.")
+        await render_screen(update, context, "❌ Книга не найдена.")
     except Exception as e:
         logger.error(f"Ошибка в show_book_details: {e}", exc_info=True)
-        await query.edit_message_text(f"❌ Ошибка: {e}")
+        await render_screen(update, context, f"❌ Ошибка: {e}")
 
     return ConversationHandler.END
 
@@ -156,14 +150,15 @@ async def add_book_save(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     should_notify = "_notify" in query.data
     book_data = context.user_data.pop('new_book')
 
-    async with get_db_connection() as conn:
+    async with get_db_connection() as conn, conn.transaction():
         new_book_id = await db_data.add_new_book(conn, book_data)
+        await db_data.enqueue_admin_notification(conn, text=f"➕ Админ добавил книгу «{book_data['name']}».")
+        await db_data.enqueue_catalog_index_rebuild(conn)
+        if should_notify:
+            await db_data.enqueue_outbox_task(conn, db_data.OUTBOX_BROADCAST_NEW_BOOK, {'book_id': new_book_id})
 
-    tasks.notify_admin.delay(text=f"➕ Админ добавил книгу «{book_data['name']}».")
-    if should_notify:
-        tasks.broadcast_new_book.delay(book_id=new_book_id)
-
-    await query.edit_message_text("✅ Книга успешно добавлена!", reply_markup=None)
+    # Подтверждение могло быть фото с обложкой
+    await render_screen(update, context, "✅ Книга успешно добавлена!")
     await show_books_list(update, context)
     return ConversationHandler.END
 
@@ -171,7 +166,7 @@ async def add_book_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     query = update.callback_query
     await query.answer()
     context.user_data.pop('new_book', None)
-    await query.edit_message_text("👌 Добавление книги отменено.", reply_markup=None)
+    await render_screen(update, context, "👌 Добавление книги отменено.")
     await show_books_list(update, context)
     return ConversationHandler.END
 
@@ -261,6 +256,14 @@ async def process_bulk_add_csv(update: Update, context: ContextTypes.DEFAULT_TYP
                 except Exception as e:
                     skipped_count += 1
                     errors.append(f"'{book_data['name']}': {str(e)[:50]}")
+
+            await db_data.enqueue_admin_notification(
+                conn,
+                text=f"📚 Массовый импорт: добавлено {added_count} книг, пропущено {skipped_count}.",
+                category='admin_action'
+            )
+            if added_count:
+                await db_data.enqueue_catalog_index_rebuild(conn)
         
         # Формируем отчет
         report_parts = [
@@ -276,11 +279,6 @@ async def process_bulk_add_csv(update: Update, context: ContextTypes.DEFAULT_TYP
             if len(errors) > 5:
                 report_parts.append(f"_...и еще {len(errors) - 5}_")
         
-        tasks.notify_admin.delay(
-            text=f"📚 Массовый импорт: добавлено {added_count} книг, пропущено {skipped_count}.",
-            category='admin_action'
-        )
-        
         await update.message.reply_text(
             "\n".join(report_parts),
             parse_mode='Markdown'
@@ -303,7 +301,7 @@ async def start_book_edit(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     await query.answer()
     context.user_data['book_to_edit'] = int(query.data.split('_')[3])
     reply_markup = keyboards.get_book_edit_keyboard()
-    await query.edit_message_text("✏️ Какое поле вы хотите отредактировать?", reply_markup=reply_markup)
+    await render_screen(update, context, "✏️ Какое поле вы хотите отредактировать?", reply_markup=reply_markup)
     return AdminState.SELECTING_BOOK_FIELD
 
 async def prompt_for_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> AdminState:
@@ -317,10 +315,11 @@ async def prompt_for_update(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def process_book_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     book_id = context.user_data['book_to_edit']
     field = context.user_data['field_to_edit']
-    async with get_db_connection() as conn:
+    async with get_db_connection() as conn, conn.transaction():
         await db_data.update_book_field(conn, book_id, field, update.message.text)
+        await db_data.enqueue_admin_notification(conn, text=f"✏️ Админ отредактировал поле `{field}` для книги ID {book_id}.")
+        await db_data.enqueue_catalog_index_rebuild(conn)
 
-    tasks.notify_admin.delay(text=f"✏️ Админ отредактировал поле `{field}` для книги ID {book_id}.")
     await update.message.reply_text("✅ Информация о книге успешно обновлена!")
 
     from telegram import CallbackQuery
@@ -342,18 +341,19 @@ async def ask_for_book_delete_confirmation(update: Update, context: ContextTypes
     await query.answer()
     book_id = int(query.data.split('_')[3])
     reply_markup = keyboards.get_book_delete_confirmation_keyboard(book_id)
-    await query.edit_message_text("**⚠️ Вы уверены, что хотите удалить эту книгу?**", reply_markup=reply_markup, parse_mode='Markdown')
+    await render_screen(update, context, "**⚠️ Вы уверены, что хотите удалить эту книгу?**", reply_markup=reply_markup, parse_mode='Markdown')
 
 async def process_book_delete(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     book_id = int(query.data.split('_')[4])
 
-    async with get_db_connection() as conn:
+    async with get_db_connection() as conn, conn.transaction():
         book_to_delete = await db_data.get_book_details(conn, book_id)
         await db_data.delete_book(conn, book_id)
+        await db_data.enqueue_admin_notification(conn, text=f"🗑️ Админ удалил книгу «{book_to_delete.get('name', 'ID: ' + str(book_id))}».")
+        await db_data.enqueue_catalog_index_rebuild(conn)
 
-    tasks.notify_admin.delay(text=f"🗑️ Админ удалил книгу «{book_to_delete.get('name', 'ID: ' + str(book_id))}».")
     await query.edit_message_text("✅ Книга успешно удалена.")
     await show_books_list(update, context)
 
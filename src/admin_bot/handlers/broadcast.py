@@ -11,12 +11,13 @@ from telegram.ext import (
 
 from src.core.db import data_access as db_data
 from src.core.db.utils import get_db_connection
-from src.core import tasks
 from src.admin_bot.states import AdminState
 from src.admin_bot import keyboards
 
 logger = logging.getLogger(__name__)
 
+USERS_PER_PAGE = 5
+
 
 async def start_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) -> AdminState:
     """Начинает диалог рассылки, спрашивая тип."""
@@ -37,25 +38,40 @@ async def ask_broadcast_message(update: Update, context: ContextTypes.DEFAULT_TY
     return AdminState.BROADCAST_MESSAGE
 
 
+def _selection_view(broadcast_data: dict):
+    """Собирает текст и клавиатуру выбора из закешированной страницы (без запроса к БД)."""
+    selected_users = broadcast_data['selected_users']
+    search_query = broadcast_data.get('search_query')
+    if search_query:
+        text = f"🔍 Найдено по «{search_query}»: {broadcast_data['total_users']}"
+        page, per_page = 0, max(broadcast_data['total_users'], 1)
+    else:
+        page, per_page = broadcast_data['current_page'], USERS_PER_PAGE
+        text = f"👥 **Выберите получателей** (Страница {page + 1})"
+    text += "\nОтправьте имя, логин или контакт, чтобы найти получателя."
+    reply_markup = keyboards.get_user_selection_keyboard_for_broadcast(
+        broadcast_data['page_users'], selected_users, broadcast_data['total_users'], page, per_page
+    )
+    return text, reply_markup
+
+
 async def show_user_selection_for_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) -> AdminState:
     """Показывает постраничный список пользователей для выбора."""
     query = update.callback_query
     page = int(query.data.split('_')[-1]) if query and "broadcast_users_page" in query.data else 0
     await query.answer()
 
-    users_per_page = 5
-    context.user_data['broadcast']['current_page'] = page
-    offset = page * users_per_page
+    broadcast_data = context.user_data['broadcast']
+    offset = page * USERS_PER_PAGE
 
     try:
         async with get_db_connection() as conn:
-            users, total_users = await db_data.get_all_users(conn, limit=users_per_page, offset=offset)
+            users, total_users = await db_data.get_all_users(conn, limit=USERS_PER_PAGE, offset=offset)
 
-        selected_users = context.user_data['broadcast']['selected_users']
-        reply_markup = keyboards.get_user_selection_keyboard_for_broadcast(
-            users, selected_users, total_users, page, users_per_page
-        )
-        await query.edit_message_text(f"👥 **Выберите получателей** (Страница {page + 1})", reply_markup=reply_markup)
+        # Страница кешируется: переключение отметок перерисовывает ее без повторного запроса
+        broadcast_data.update(current_page=page, page_users=users, total_users=total_users, search_query=None)
+        text, reply_markup = _selection_view(broadcast_data)
+        await query.edit_message_text(text, reply_markup=reply_markup)
         return AdminState.BROADCAST_SELECT_USERS
     except Exception as e:
         logger.error(f"Ошибка при получении списка пользователей для рассылки: {e}")
@@ -76,10 +92,28 @@ async def toggle_user_for_broadcast(update: Update, context: ContextTypes.DEFAUL
 
     await query.answer(f"Пользователь {'удален' if user_id not in selected_users else 'добавлен'}")
 
-    # Обновляем клавиатуру, не меняя страницу
-    current_page = context.user_data['broadcast']['current_page']
-    query.data = f"broadcast_users_page_{current_page}"
-    return await show_user_selection_for_broadcast(update, context)
+    # Обновляем только клавиатуру по закешированной странице
+    text, reply_markup = _selection_view(context.user_data['broadcast'])
+    await query.edit_message_text(text, reply_markup=reply_markup)
+    return AdminState.BROADCAST_SELECT_USERS
+
+
+async def search_users_for_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) -> AdminState:
+    """Ищет получателей по тексту и показывает найденных для выбора."""
+    search_query = update.message.text.strip()
+    broadcast_data = context.user_data['broadcast']
+    try:
+        async with get_db_connection() as conn:
+            users = await db_data.search_users(conn, search_query)
+    except Exception as e:
+        logger.error(f"Ошибка при поиске пользователей для рассылки: {e}")
+        await update.message.reply_text(f"❌ Ошибка поиска: {e}")
+        return AdminState.BROADCAST_SELECT_USERS
+
+    broadcast_data.update(page_users=users, total_users=len(users), search_query=search_query)
+    text, reply_markup = _selection_view(broadcast_data)
+    await update.message.reply_text(text, reply_markup=reply_markup)
+    return AdminState.BROADCAST_SELECT_USERS
 
 
 async def confirm_broadcast_selection(update: Update, context: ContextTypes.DEFAULT_TYPE) -> AdminState:
@@ -103,17 +137,15 @@ async def process_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     await update.message.reply_text("⏳ Начинаю рассылку...")
     try:
-        if selected_users is None:  # Рассылка всем
-            async with get_db_connection() as conn:
-                user_db_ids = await db_data.get_all_user_ids(conn)
-        else:  # Рассылка выбранным
-            user_db_ids = list(selected_users)
-
-        for user_id in user_db_ids:
-            tasks.notify_user.delay(user_id=user_id, text=message_text, category='broadcast')
-
-        await update.message.reply_text(f"✅ Рассылка успешно запущена для {len(user_db_ids)} пользователей.")
-        tasks.notify_admin.delay(text=f"📢 Админ запустил рассылку для {len(user_db_ids)} пользователей.", category='admin_action')
+        async with get_db_connection() as conn, conn.transaction():
+            # Вся рассылка ставится в outbox одним запросом
+            if selected_users is None:  # Рассылка всем
+                recipients_count = await db_data.enqueue_broadcast_to_all_users(conn, message_text, category='broadcast')
+            else:  # Рассылка выбранным
+                recipients_count = await db_data.enqueue_bulk_user_notifications(conn, list(selected_users), message_text, category='broadcast')
+            await db_data.enqueue_admin_notification(conn, text=f"📢 Админ запустил рассылку для {recipients_count} пользователей.", category='admin_action')
+
+        await update.message.reply_text(f"✅ Рассылка успешно запущена для {recipients_count} пользователей.")
     except Exception as e:
         await update.message.reply_text(f"❌ Ошибка при запуске рассылки: {e}")
 
@@ -143,6 +175,7 @@ broadcast_handler = ConversationHandler(
             CallbackQueryHandler(toggle_user_for_broadcast, pattern="^broadcast_toggle_user_"),
             CallbackQueryHandler(show_user_selection_for_broadcast, pattern="^broadcast_users_page_"),
             CallbackQueryHandler(confirm_broadcast_selection, pattern="^broadcast_confirm_selection$"),
+            MessageHandler(filters.TEXT & ~filters.COMMAND, search_users_for_broadcast),
         ],
         AdminState.BROADCAST_MESSAGE: [MessageHandler(filters.TEXT & ~filters.COMMAND, process_broadcast)],
     },
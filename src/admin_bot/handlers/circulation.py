@@ -0,0 +1,252 @@
+import logging
+import re
+from collections import defaultdict
+from telegram import Update
+from telegram.ext import (
+    ContextTypes,
+    ConversationHandler,
+    MessageHandler,
+    filters,
+    CommandHandler,
+)
+
+from src.core import config
+from src.core.db import data_access as db_data
+from src.core.db.utils import DbSession
+from src.admin_bot.states import AdminState
+
+logger = logging.getLogger(__name__)
+
+# Разделители в списке: пробелы, переводы строк, запятые и точки с запятой (подходит и для CSV)
+_TOKEN_SEPARATORS = re.compile(r"[\s,;]+")
+
+INPUT_HINT = (
+    "Пришлите номера выдач и/или серийные номера экземпляров (например, `B12-3`) "
+    "через пробел, запятую или с новой строки — или файл .txt/.csv с ними.\n"
+    f"До {config.BULK_CIRCULATION_MAX_ITEMS} позиций за раз. Для отмены введите /cancel."
+)
+
+
+def parse_batch(text: str) -> tuple[list[int], list[str]]:
+    """
+    Разбирает список позиций: числа считаются номерами выдач, остальное — серийными номерами.
+    Заголовки CSV (borrow_id, serial, serial_number) и повторы отбрасываются, порядок сохраняется.
+    """
+    borrow_ids, serials = {}, {}
+    for token in _TOKEN_SEPARATORS.split(text):
+        token = token.strip().strip('"\'')
+        if not token or token.lower() in ('borrow_id', 'serial', 'serial_number'):
+            continue
+        if token.isdigit():
+            borrow_ids[int(token)] = None
+        else:
+            serials[token] = None
+    return list(borrow_ids), list(serials)
+
+
+async def _read_batch(update: Update, context: ContextTypes.DEFAULT_TYPE) -> str:
+    """Возвращает текст сообщения или содержимое присланного файла."""
+    document = update.message.document
+    if not document:
+        return update.message.text or ''
+    file = await context.bot.get_file(document.file_id)
+    content = await file.download_as_bytearray()
+    return content.decode('utf-8-sig')
+
+
+def _checkin_notifications(result: dict) -> list[dict]:
+    """Одно сводное уведомление каждому читателю и по одному — каждому дождавшемуся брони."""
+    returned_by_user = defaultdict(list)
+    for row in result['returned']:
+        returned_by_user[row['user_id']].append(row['book_name'])
+
+    notifications = [
+        {
+            'user_id': user_id,
+            'text': "✅ Приняты в библиотеку:\n" + "\n".join(f"• «{name}»" for name in book_names),
+            'category': 'batch_confirmation',
+        }
+        for user_id, book_names in returned_by_user.items()
+    ]
+    notifications.extend(
+        {
+            'user_id': row['user_id'],
+            'text': f"🎉 Книга «{row['book_name']}», которую вы ждали, снова в наличии!\n\n"
+                    f"Экземпляр отложен для вас до **{row['hold_expires_at'].strftime('%d.%m.%Y %H:%M')}**.",
+            'category': 'reservation',
+            'button_text': "📥 Взять книгу",
+            'button_callback': f"borrow_book_{row['book_id']}",
+        }
+        for row in result['reservations']
+    )
+    return notifications
+
+
+def _format_missing(items: list, limit: int = 10) -> str:
+    shown = ", ".join(f"`{item}`" for item in items[:limit])
+    return shown + (f" _и еще {len(items) - limit}_" if len(items) > limit else "")
+
+
+# --- Пакетный возврат ---
+
+async def start_bulk_checkin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> AdminState:
+    """Начинает пакетный возврат."""
+    await update.message.reply_text(f"📥 **Пакетный возврат**\n\n{INPUT_HINT}", parse_mode='Markdown')
+    return AdminState.CIRCULATION_CHECKIN_INPUT
+
+
+async def process_bulk_checkin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Возвращает все позиции одним запросом и ставит уведомления в outbox одной вставкой."""
+    borrow_ids, serials = parse_batch(await _read_batch(update, context))
+    total = len(borrow_ids) + len(serials)
+    if not total:
+        await update.message.reply_text("❌ Не найдено ни одной позиции. Попробуйте снова или введите /cancel.")
+        return AdminState.CIRCULATION_CHECKIN_INPUT
+    if total > config.BULK_CIRCULATION_MAX_ITEMS:
+        await update.message.reply_text(f"❌ Слишком много позиций ({total}). Разбейте список на части.")
+        return AdminState.CIRCULATION_CHECKIN_INPUT
+
+    try:
+        async with DbSession() as session:
+            conn = await session.connection()
+            result = await db_data.bulk_checkin(conn, borrow_ids, serials)
+            await db_data.enqueue_user_notifications(conn, _checkin_notifications(result))
+            await db_data.enqueue_admin_notification(
+                conn, text=f"📥 Пакетный возврат: принято {len(result['returned'])} из {total}.", category='admin_action'
+            )
+    except Exception as e:
+        logger.error(f"Ошибка при пакетном возврате: {e}", exc_info=True)
+        await update.message.reply_text(f"❌ Ошибка пакетного возврата: `{e}`", parse_mode='Markdown')
+        return ConversationHandler.END
+
+    returned_ids = {row['borrow_id'] for row in result['returned']}
+    returned_serials = {row['serial_number'] for row in result['returned']}
+    missing = [i for i in borrow_ids if i not in returned_ids] + [s for s in serials if s not in returned_serials]
+
+    report = [
+        "✅ **Пакетный возврат завершен**\n",
+        f"📥 Принято: {len(result['returned'])} из {total}",
+        f"🔔 Уведомлено по броням: {len(result['reservations'])}",
+    ]
+    if missing:
+        report.append(f"⚠️ Не найдены или уже возвращены: {_format_missing(missing)}")
+    await update.message.reply_text("\n".join(report), parse_mode='Markdown')
+    return ConversationHandler.END
+
+
+# --- Пакетная выдача ---
+
+async def start_bulk_checkout(update: Update, context: ContextTypes.DEFAULT_TYPE) -> AdminState:
+    """Начинает пакетную выдачу: сначала спрашивает читателя."""
+    await update.message.reply_text(
+        "📤 **Пакетная выдача**\n\nКому выдать книги? Пришлите логин, контакт или Telegram username читателя.\n"
+        "Для отмены введите /cancel.",
+        parse_mode='Markdown'
+    )
+    return AdminState.CIRCULATION_CHECKOUT_USER
+
+
+async def select_checkout_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> AdminState:
+    """Находит читателя и запрашивает список экземпляров."""
+    login = update.message.text.strip().lstrip('@')
+    try:
+        async with DbSession() as session:
+            conn = await session.connection()
+            user = await db_data.get_user_by_login(conn, login)
+    except db_data.NotFoundError as e:
+        await update.message.reply_text(f"❌ {e} Попробуйте снова или введите /cancel.")
+        return AdminState.CIRCULATION_CHECKOUT_USER
+
+    context.user_data['bulk_checkout_user'] = {'id': user['id'], 'full_name': user['full_name']}
+    await update.message.reply_text(
+        f"👤 Читатель: **{user['full_name']}**\n\n"
+        "Пришлите серийные номера экземпляров через пробел, запятую или с новой строки — или файл .txt/.csv.\n"
+        f"До {config.BULK_CIRCULATION_MAX_ITEMS} позиций за раз. Для отмены введите /cancel.",
+        parse_mode='Markdown'
+    )
+    return AdminState.CIRCULATION_CHECKOUT_INPUT
+
+
+async def process_bulk_checkout(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Выдает все экземпляры одним запросом и отправляет читателю одно сводное уведомление."""
+    user = context.user_data.get('bulk_checkout_user')
+    if not user:
+        await update.message.reply_text("❌ Сессия выдачи устарела. Начните заново: /checkout")
+        return ConversationHandler.END
+
+    _, serials = parse_batch(await _read_batch(update, context))
+    if not serials:
+        await update.message.reply_text("❌ Не найдено ни одного серийного номера. Попробуйте снова или введите /cancel.")
+        return AdminState.CIRCULATION_CHECKOUT_INPUT
+    if len(serials) > config.BULK_CIRCULATION_MAX_ITEMS:
+        await update.message.reply_text(f"❌ Слишком много позиций ({len(serials)}). Разбейте список на части.")
+        return AdminState.CIRCULATION_CHECKOUT_INPUT
+
+    try:
+        async with DbSession() as session:
+            conn = await session.connection()
+            loans = await db_data.bulk_checkout(conn, user['id'], serials)
+            if loans:
+                due_date_str = loans[0]['due_date'].strftime('%d.%m.%Y')
+                await db_data.enqueue_user_notification(
+                    conn,
+                    user['id'],
+                    "📚 Вам выданы книги:\n" + "\n".join(f"• «{loan['book_name']}» ({loan['serial_number']})" for loan in loans)
+                    + f"\n\nПожалуйста, верните их до **{due_date_str}**.",
+                    category='batch_confirmation'
+                )
+            await db_data.enqueue_admin_notification(
+                conn, text=f"📤 Пакетная выдача для {user['full_name']}: выдано {len(loans)} из {len(serials)}.",
+                category='admin_action'
+            )
+    except Exception as e:
+        logger.error(f"Ошибка при пакетной выдаче: {e}", exc_info=True)
+        await update.message.reply_text(f"❌ Ошибка пакетной выдачи: `{e}`", parse_mode='Markdown')
+        context.user_data.pop('bulk_checkout_user', None)
+        return ConversationHandler.END
+
+    issued = {loan['serial_number'] for loan in loans}
+    missing = [s for s in serials if s not in issued]
+    report = [
+        "✅ **Пакетная выдача завершена**\n",
+        f"👤 Читатель: {user['full_name']}",
+        f"📤 Выдано: {len(loans)} из {len(serials)}",
+    ]
+    if missing:
+        report.append(f"⚠️ Не найдены или уже выданы: {_format_missing(missing)}")
+    await update.message.reply_text("\n".join(report), parse_mode='Markdown')
+
+    context.user_data.pop('bulk_checkout_user', None)
+    return ConversationHandler.END
+
+
+async def cancel_circulation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Отменяет пакетную операцию."""
+    context.user_data.pop('bulk_checkout_user', None)
+    await update.message.reply_text("👌 Операция отменена.")
+    return ConversationHandler.END
+
+
+_admin_only = filters.User(user_id=config.ADMIN_TELEGRAM_ID)
+_batch_input = filters.TEXT & ~filters.COMMAND | filters.Document.FileExtension('txt') | filters.Document.FileExtension('csv')
+
+bulk_checkin_handler = ConversationHandler(
+    entry_points=[CommandHandler("checkin", start_bulk_checkin, filters=_admin_only)],
+    states={
+        AdminState.CIRCULATION_CHECKIN_INPUT: [MessageHandler(_batch_input, process_bulk_checkin)],
+    },
+    fallbacks=[CommandHandler("cancel", cancel_circulation)],
+    per_user=True,
+    per_chat=True
+)
+
+bulk_checkout_handler = ConversationHandler(
+    entry_points=[CommandHandler("checkout", start_bulk_checkout, filters=_admin_only)],
+    states={
+        AdminState.CIRCULATION_CHECKOUT_USER: [MessageHandler(filters.TEXT & ~filters.COMMAND, select_checkout_user)],
+        AdminState.CIRCULATION_CHECKOUT_INPUT: [MessageHandler(_batch_input, process_bulk_checkout)],
+    },
+    fallbacks=[CommandHandler("cancel", cancel_circulation)],
+    per_user=True,
+    per_chat=True
+)
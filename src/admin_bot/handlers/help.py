@@ -10,9 +10,13 @@ async def show_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
 /stats - Общая статистика системы
 • Количество пользователей, книг, займов
 • Список всех пользователей
+/find <запрос> - Поиск пользователя по имени, логину, контакту или Telegram ID (с опечатками)
 • Просмотр профилей и истории
 • Удаление пользователей
 • Журнал активности
+/activity [фильтры] - Журнал действий всех пользователей
+• Фильтры: action=, user=, book=, days=, from=/to= (ДД.ММ.ГГГГ)
+• Листание без пересчета всех записей и выгрузка в CSV
 
 **📚 Управление книгами**
 /books - Каталог книг
@@ -28,6 +32,14 @@ async def show_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • Одобрение и автоматическое добавление
 • Отклонение с уведомлением пользователя
 
+**🔁 Стойка выдачи**
+/checkin - Пакетный возврат
+• Номера выдач или серийные номера экземпляров
+• Список в сообщении или файл .txt/.csv
+• Читатели и очередь броней уведомляются автоматически
+/checkout - Пакетная выдача
+• Несколько экземпляров одному читателю за раз
+
 **📢 Рассылка**
 /broadcast - Массовая рассылка
 • Отправка сообщения всем пользователям
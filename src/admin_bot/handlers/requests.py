@@ -1,13 +1,16 @@
 import logging
+from contextlib import aclosing
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 from src.core.db import data_access as db_data
 from src.core.db.utils import get_db_connection
-from src.core import tasks
 
 logger = logging.getLogger(__name__)
 
+# Сколько запросов показывается кнопками на одном экране (ограничение клавиатуры Telegram).
+REQUESTS_SCREEN_LIMIT = 50
+
 
 async def show_book_requests(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает список всех запросов на книги."""
@@ -16,25 +19,30 @@ async def show_book_requests(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await query.answer()
     
     try:
-        async with get_db_connection() as conn:
-            requests = await db_data.get_pending_book_requests(conn)
-        
-        if not requests:
+        keyboard = []
+        async with get_db_connection() as conn, conn.transaction():
+            total = await db_data.count_pending_book_requests(conn)
+            # Кнопки строятся по мере чтения курсора; остальные запросы не загружаются
+            async with aclosing(db_data.iter_pending_book_requests(conn, prefetch=REQUESTS_SCREEN_LIMIT)) as requests:
+                async for req in requests:
+                    created = req['created_at'].strftime('%d.%m %H:%M')
+                    button_text = f"📖 {req['book_name'][:30]} — {req['username']} ({created})"
+                    keyboard.append([
+                        InlineKeyboardButton(button_text, callback_data=f"view_request_{req['id']}")
+                    ])
+                    if len(keyboard) >= REQUESTS_SCREEN_LIMIT:
+                        break
+        
+        if not keyboard:
             message_text = (
                 "📚 **Запросы на книги**\n\n"
                 "Нет ожидающих запросов."
             )
             keyboard = [[InlineKeyboardButton("⬅️ Назад", callback_data="back_to_stats_panel")]]
         else:
-            message_text = f"📚 **Запросы на книги** (Всего: {len(requests)})\n"
-            keyboard = []
-            
-            for req in requests:
-                created = req['created_at'].strftime('%d.%m %H:%M')
-                button_text = f"📖 {req['book_name'][:30]} — {req['username']} ({created})"
-                keyboard.append([
-                    InlineKeyboardButton(button_text, callback_data=f"view_request_{req['id']}")
-                ])
+            message_text = f"📚 **Запросы на книги** (Всего: {total})\n"
+            if total > len(keyboard):
+                message_text += f"_Показаны {len(keyboard)} последних._\n"
             
             keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data="back_to_stats_panel")])
         
@@ -65,7 +73,8 @@ async def view_book_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
         async with get_db_connection() as conn:
             request_data = await conn.fetchrow(
                 """
-                SELECT br.*, u.username, u.full_name, u.telegram_id
+                SELECT br.id, br.user_id, br.book_name, br.author_name, br.genre, br.description, br.status, br.created_at,
+                       u.username, u.full_name, u.telegram_id
                 FROM book_requests br
                 JOIN users u ON br.user_id = u.id
                 WHERE br.id = $1
@@ -116,7 +125,7 @@ async def approve_request_and_add_book(update: Update, context: ContextTypes.DEF
     request_id = int(query.data.split('_')[2])
     
     try:
-        async with get_db_connection() as conn:
+        async with get_db_connection() as conn, conn.transaction():
             # Получаем данные запроса
             request_data = await db_data.approve_book_request(conn, request_id)
             
@@ -131,23 +140,26 @@ async def approve_request_and_add_book(update: Update, context: ContextTypes.DEF
             
             book_id = await db_data.add_new_book(conn, book_data)
         
-        # Уведомляем пользователя
-        tasks.notify_user.delay(
-            user_id=request_data['user_id'],
-            text=(
-                f"🎉 **Отличные новости!**\n\n"
-                f"Ваш запрос на книгу «{request_data['book_name']}» одобрен!\n"
-                f"Книга добавлена в библиотеку и доступна для взятия."
-            ),
-            category='book_request_approved',
-            button_text="📖 Посмотреть книгу",
-            button_callback=f"view_book_{book_id}"
-        )
-        
-        tasks.notify_admin.delay(
-            text=f"✅ Запрос #{request_id} одобрен. Книга «{request_data['book_name']}» добавлена в каталог.",
-            category='admin_action'
-        )
+            # Уведомляем пользователя
+            await db_data.enqueue_user_notification(
+                conn,
+                user_id=request_data['user_id'],
+                text=(
+                    f"🎉 **Отличные новости!**\n\n"
+                    f"Ваш запрос на книгу «{request_data['book_name']}» одобрен!\n"
+                    f"Книга добавлена в библиотеку и доступна для взятия."
+                ),
+                category='book_request_approved',
+                button_text="📖 Посмотреть книгу",
+                button_callback=f"view_book_{book_id}"
+            )
+            
+            await db_data.enqueue_admin_notification(
+                conn,
+                text=f"✅ Запрос #{request_id} одобрен. Книга «{request_data['book_name']}» добавлена в каталог.",
+                category='admin_action'
+            )
+            await db_data.enqueue_catalog_index_rebuild(conn)
         
         await query.edit_message_text(
             f"✅ **Запрос одобрен!**\n\n"
@@ -171,7 +183,7 @@ async def reject_book_request(update: Update, context: ContextTypes.DEFAULT_TYPE
     request_id = int(query.data.split('_')[2])
     
     try:
-        async with get_db_connection() as conn:
+        async with get_db_connection() as conn, conn.transaction():
             request_data = await conn.fetchrow(
                 "SELECT user_id, book_name FROM book_requests WHERE id = $1",
                 request_id
@@ -182,15 +194,16 @@ async def reject_book_request(update: Update, context: ContextTypes.DEFAULT_TYPE
                 reason="Книга не соответствует профилю библиотеки"
             )
         
-        # Уведомляем пользователя
-        tasks.notify_user.delay(
-            user_id=request_data['user_id'],
-            text=(
-                f"😔 К сожалению, ваш запрос на книгу «{request_data['book_name']}» был отклонен.\n\n"
-                f"Причина: Книга не соответствует профилю нашей библиотеки."
-            ),
-            category='book_request_rejected'
-        )
+            # Уведомляем пользователя
+            await db_data.enqueue_user_notification(
+                conn,
+                user_id=request_data['user_id'],
+                text=(
+                    f"😔 К сожалению, ваш запрос на книгу «{request_data['book_name']}» был отклонен.\n\n"
+                    f"Причина: Книга не соответствует профилю нашей библиотеки."
+                ),
+                category='book_request_rejected'
+            )
         
         await query.edit_message_text(
             f"✅ Запрос #{request_id} отклонен.\nПользователь получил уведомление.",
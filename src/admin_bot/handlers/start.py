@@ -7,8 +7,12 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "👋 **Панель администратора**\n\n"
         "Доступные команды:\n"
         "📊 /stats - Статистика и управление пользователями\n"
+        "🔍 /find - Поиск пользователя\n"
+        "📜 /activity - Журнал активности\n"
         "📚 /books - Управление каталогом книг\n"
         "📝 /requests - Запросы пользователей на книги\n"
+        "📥 /checkin - Пакетный возврат книг\n"
+        "📤 /checkout - Пакетная выдача книг\n"
         "📢 /broadcast - Массовая рассылка\n"
         "❓ /help - Справка по командам",
         parse_mode='Markdown'
@@ -4,7 +4,6 @@ from telegram.ext import ContextTypes
 
 from src.core.db import data_access as db_data
 from src.core.db.utils import get_db_connection
-from src.core import tasks
 from src.admin_bot import keyboards
 
 logger = logging.getLogger(__name__)
@@ -65,12 +64,16 @@ async def show_users_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
 
     context.user_data['current_stats_page'] = page
+    context.user_data.pop('user_search_query', None)
     offset = page * users_per_page
     try:
         async with get_db_connection() as conn:
             users, total_users = await db_data.get_all_users(conn, limit=users_per_page, offset=offset)
 
-        message_text = f"👥 **Список пользователей** (Всего: {total_users})\n\nСтраница {page + 1}:"
+        message_text = (
+            f"👥 **Список пользователей** (Всего: {total_users})\n\nСтраница {page + 1}:\n"
+            f"_Поиск: /find <имя, логин, контакт или Telegram ID>_"
+        )
         reply_markup = keyboards.get_users_list_keyboard(users, total_users, page, users_per_page)
         await query.edit_message_text(message_text, reply_markup=reply_markup, parse_mode='Markdown')
 
@@ -78,6 +81,56 @@ async def show_users_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Ошибка при получении списка пользователей: {e}", exc_info=True)
         await query.edit_message_text(f"❌ Ошибка: {e}")
 
+USER_SEARCH_LIMIT = 10
+
+async def _reply_with_user_search(update: Update, context: ContextTypes.DEFAULT_TYPE, search_query: str):
+    """Выполняет поиск одним запросом и показывает результаты (новым сообщением или правкой)."""
+    async with get_db_connection() as conn:
+        users = await db_data.search_users(conn, search_query, limit=USER_SEARCH_LIMIT)
+
+    context.user_data['user_search_query'] = search_query
+    if users:
+        message_text = f"🔍 Результаты поиска «{search_query}» ({len(users)}):"
+    else:
+        message_text = f"🔍 По запросу «{search_query}» никого не найдено."
+    reply_markup = keyboards.get_user_search_results_keyboard(users)
+
+    # Запрос вводит админ, поэтому без Markdown
+    if update.callback_query:
+        await update.callback_query.edit_message_text(message_text, reply_markup=reply_markup)
+    else:
+        await update.message.reply_text(message_text, reply_markup=reply_markup)
+
+async def search_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Ищет пользователей по команде /find <запрос>."""
+    search_query = " ".join(context.args or []).strip()
+    if not search_query:
+        await update.message.reply_text(
+            "🔍 Использование: `/find <имя, логин, контакт или Telegram ID>`\n"
+            "Опечатки и неполные имена допускаются.",
+            parse_mode='Markdown'
+        )
+        return
+    try:
+        await _reply_with_user_search(update, context, search_query)
+    except Exception as e:
+        logger.error(f"Ошибка при поиске пользователей: {e}", exc_info=True)
+        await update.message.reply_text(f"❌ Ошибка поиска: {e}")
+
+async def show_user_search_results(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Возвращает к результатам последнего поиска из карточки пользователя."""
+    query = update.callback_query
+    search_query = context.user_data.get('user_search_query')
+    if not search_query:
+        query.data = f"users_list_page_{context.user_data.get('current_stats_page', 0)}"
+        return await show_users_list(update, context)
+    await query.answer()
+    try:
+        await _reply_with_user_search(update, context, search_query)
+    except Exception as e:
+        logger.error(f"Ошибка при поиске пользователей: {e}", exc_info=True)
+        await query.edit_message_text(f"❌ Ошибка поиска: {e}")
+
 def get_contact_type(contact_info: str) -> str:
     """Определяет тип контакта на основе его формата."""
     if not contact_info:
@@ -135,7 +188,8 @@ async def view_user_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
             for item in borrow_history[:5]:
                 message_parts.append(f"  • `{item['book_name']}`")
 
-        reply_markup = keyboards.get_user_profile_keyboard(user, current_page)
+        from_search = 'user_search_query' in context.user_data
+        reply_markup = keyboards.get_user_profile_keyboard(user, current_page, from_search)
         await query.edit_message_text(
             "\n".join(message_parts),
             reply_markup=reply_markup,
@@ -151,10 +205,10 @@ async def kick_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     user_id = int(query.data.split('_')[-1])
     try:
-        async with get_db_connection() as conn:
+        async with get_db_connection() as conn, conn.transaction():
             await db_data.set_force_logout(conn, user_id)
+            await db_data.enqueue_admin_notification(conn, text=f"👢 Админ 'кикнул' пользователя (ID: {user_id}).", category='admin_action')
         await query.answer("✅ Пользователь будет отключен при следующем действии.", show_alert=True)
-        tasks.notify_admin.delay(text=f"👢 Админ 'кикнул' пользователя (ID: {user_id}).", category='admin_action')
     except Exception as e:
         await query.answer(f"❌ Ошибка: {e}", show_alert=True)
 
@@ -164,16 +218,17 @@ async def ban_unban_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     user_id = int(query.data.split('_')[-1])
     try:
-        async with get_db_connection() as conn:
+        async with get_db_connection() as conn, conn.transaction():
             user = await db_data.get_user_by_id(conn, user_id)
             if user.get('is_banned'):
                 await db_data.unban_user(conn, user_id)
-                await query.answer("✅ Пользователь разбанен.", show_alert=True)
-                tasks.notify_admin.delay(text=f"🟢 Админ разбанил @{user.get('username', user_id)}.", category='admin_action')
+                await db_data.enqueue_admin_notification(conn, text=f"🟢 Админ разбанил @{user.get('username', user_id)}.", category='admin_action')
+                answer_text = "✅ Пользователь разбанен."
             else:
                 await db_data.ban_user(conn, user_id)
-                await query.answer("🚫 Пользователь забанен.", show_alert=True)
-                tasks.notify_admin.delay(text=f"🔴 Админ забанил @{user.get('username', user_id)}.", category='admin_action')
+                await db_data.enqueue_admin_notification(conn, text=f"🔴 Админ забанил @{user.get('username', user_id)}.", category='admin_action')
+                answer_text = "🚫 Пользователь забанен."
+        await query.answer(answer_text, show_alert=True)
         # Обновляем карточку пользователя, чтобы показать изменения
         await view_user_profile(update, context)
     except Exception as e:
@@ -197,12 +252,12 @@ async def process_delete_confirmation(update: Update, context: ContextTypes.DEFA
     user_id = int(query.data.split('_')[3])
     current_page = context.user_data.get('current_stats_page', 0)
     try:
-        async with get_db_connection() as conn:
+        async with get_db_connection() as conn, conn.transaction():
             user_to_delete = await db_data.get_user_by_id(conn, user_id)
             username = user_to_delete.get('username', f'ID: {user_id}')
             await db_data.delete_user_by_admin(conn, user_id)
+            await db_data.enqueue_admin_notification(conn, text=f"🗑️ Админ удалил (анонимизировал) пользователя: @{username}", category='admin_action')
 
-        tasks.notify_admin.delay(text=f"🗑️ Админ удалил (анонимизировал) пользователя: @{username}", category='admin_action')
         await query.edit_message_text("✅ Пользователь успешно удален (анонимизирован).")
 
         query.data = f"users_list_page_{current_page}"
@@ -211,41 +266,6 @@ async def process_delete_confirmation(update: Update, context: ContextTypes.DEFA
         logger.error(f"Ошибка при удалении пользователя admin'ом: {e}", exc_info=True)
         await query.edit_message_text(f"❌ Ошибка при удалении: {e}")
 
-async def show_user_activity(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Показывает постраничный лог активности пользователя."""
-    query = update.callback_query
-    await query.answer()
-    parts = query.data.split('_')
-    user_id, page = int(parts[2]), int(parts[3])
-
-    try:
-        async with get_db_connection() as conn:
-            logs, total_logs = await db_data.get_user_activity(conn, user_id, limit=10, offset=page * 10)
-            user = await db_data.get_user_by_id(conn, user_id)
-
-        message_parts = [f"**📜 Журнал действий для `{user['username']}`** (Стр. {page + 1})\n"]
-        if logs:
-            for log in logs:
-                ts = log['timestamp'].strftime('%d.%m.%Y %H:%M')
-                details = f"({log['details']})" if log['details'] else ""
-                message_parts.append(f"`{ts}`: **{log['action']}** {details}")
-        else:
-            message_parts.append("  _Нет записей._")
-
-        nav_buttons = []
-        if page > 0:
-            nav_buttons.append(InlineKeyboardButton("⬅️", callback_data=f"admin_activity_{user_id}_{page - 1}"))
-        if (page + 1) * 10 < total_logs:
-            nav_buttons.append(InlineKeyboardButton("➡️", callback_data=f"admin_activity_{user_id}_{page + 1}"))
-
-        keyboard = [nav_buttons] if nav_buttons else []
-        keyboard.append([InlineKeyboardButton("👤 Назад к карточке", callback_data=f"admin_view_user_{user_id}")])
-
-        await query.edit_message_text("\n".join(message_parts), reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
-    except Exception as e:
-        logger.error(f"Ошибка при получении логов: {e}", exc_info=True)
-        await query.edit_message_text(f"❌ Ошибка: {e}")
-
 async def show_ratings_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает общую статистику и историю оценок."""
     query = update.callback_query
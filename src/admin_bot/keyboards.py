@@ -11,6 +11,21 @@ def get_stats_panel_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(keyboard)
 
 
+def get_activity_keyboard(has_prev: bool, has_next: bool, user_id: int | None = None) -> InlineKeyboardMarkup:
+    """Клавиатура журнала активности: листание по ключу, выгрузка и возврат к карточке."""
+    nav_buttons = []
+    if has_prev:
+        nav_buttons.append(InlineKeyboardButton("⬅️ Новее", callback_data="activity_prev"))
+    if has_next:
+        nav_buttons.append(InlineKeyboardButton("Старше ➡️", callback_data="activity_next"))
+
+    keyboard = [nav_buttons] if nav_buttons else []
+    keyboard.append([InlineKeyboardButton("📥 Выгрузить CSV", callback_data="activity_export")])
+    if user_id is not None:
+        keyboard.append([InlineKeyboardButton("👤 Назад к карточке", callback_data=f"admin_view_user_{user_id}")])
+    return InlineKeyboardMarkup(keyboard)
+
+
 def get_users_list_keyboard(users: list, total_users: int, page: int, users_per_page: int) -> InlineKeyboardMarkup:
     """Клавиатура для постраничного списка пользователей."""
     keyboard = [[InlineKeyboardButton(f"👤 {user['username']} ({user['full_name']})", callback_data=f"admin_view_user_{user['id']}")] for user in users]
@@ -26,17 +41,28 @@ def get_users_list_keyboard(users: list, total_users: int, page: int, users_per_
     keyboard.append([InlineKeyboardButton("📊 Назад к статистике", callback_data="back_to_stats_panel")])
     return InlineKeyboardMarkup(keyboard)
 
-def get_user_profile_keyboard(user: dict, current_page: int) -> InlineKeyboardMarkup:
+def get_user_search_results_keyboard(users: list) -> InlineKeyboardMarkup:
+    """Клавиатура с результатами поиска пользователей."""
+    keyboard = [
+        [InlineKeyboardButton(f"{'🚫' if user['is_banned'] else '👤'} {user['full_name']} (@{user['username']})",
+                              callback_data=f"admin_view_user_{user['id']}")]
+        for user in users
+    ]
+    keyboard.append([InlineKeyboardButton("👥 Все пользователи", callback_data="users_list_page_0")])
+    return InlineKeyboardMarkup(keyboard)
+
+def get_user_profile_keyboard(user: dict, current_page: int, from_search: bool = False) -> InlineKeyboardMarkup:
     """Клавиатура для карточки профиля пользователя."""
     user_id = user['id']
     keyboard = [
-        [InlineKeyboardButton("📜 История действий", callback_data=f"admin_activity_{user_id}_0")],
+        [InlineKeyboardButton("📜 История действий", callback_data=f"admin_activity_{user_id}")],
         [
             InlineKeyboardButton(" KICK ", callback_data=f"admin_kick_user_{user_id}"),
             InlineKeyboardButton(" BAN " if not user.get('is_banned') else " UNBAN ", callback_data=f"admin_ban_user_{user_id}")
         ],
         [InlineKeyboardButton("🗑️ Удалить пользователя", callback_data=f"admin_delete_user_{user_id}")],
-        [InlineKeyboardButton("⬅️ Назад к списку", callback_data=f"users_list_page_{current_page}")]
+        [InlineKeyboardButton("⬅️ Назад к результатам поиска", callback_data="user_search_results")] if from_search
+        else [InlineKeyboardButton("⬅️ Назад к списку", callback_data=f"users_list_page_{current_page}")]
     ]
     return InlineKeyboardMarkup(keyboard)
 
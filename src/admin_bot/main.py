@@ -14,7 +14,8 @@ from telegram.ext import (
 
 # --- Локальные импорты из новой структуры ---
 from src.core import config
-from src.admin_bot.handlers import stats, books, broadcast, start, requests, help as help_handler
+from src.core.loop_monitor import start_loop_monitor
+from src.admin_bot.handlers import stats, books, broadcast, start, requests, circulation, activity, help as help_handler
 from telegram.request import HTTPXRequest
 
 # --- Настройка логгера ---
@@ -77,24 +78,33 @@ async def main() -> None:
     application.add_handler(CommandHandler("books", books.show_books_list, filters=admin_filter))
     application.add_handler(CommandHandler("requests", requests.show_book_requests, filters=admin_filter))
     application.add_handler(CommandHandler("help", help_handler.show_help, filters=admin_filter))
+    application.add_handler(CommandHandler("find", stats.search_users, filters=admin_filter))
+    application.add_handler(CommandHandler("activity", activity.show_activity, filters=admin_filter))
 
     # --- Диалоги (ConversationHandlers) ---
     application.add_handler(broadcast.broadcast_handler)
     application.add_handler(books.add_book_handler)
     application.add_handler(books.edit_book_handler)
     application.add_handler(books.bulk_add_books_handler)
+    application.add_handler(circulation.bulk_checkin_handler)
+    application.add_handler(circulation.bulk_checkout_handler)
 
     # --- Статистика и пользователи ---
     application.add_handler(CallbackQueryHandler(stats.show_stats_panel, pattern="^back_to_stats_panel$"))
     application.add_handler(CallbackQueryHandler(stats.show_users_list, pattern="^users_list_page_"))
     application.add_handler(CallbackQueryHandler(stats.view_user_profile, pattern="^admin_view_user_"))
-    application.add_handler(CallbackQueryHandler(stats.show_user_activity, pattern="^admin_activity_"))
+    application.add_handler(CallbackQueryHandler(stats.show_user_search_results, pattern="^user_search_results$"))
     application.add_handler(CallbackQueryHandler(stats.kick_user, pattern="^admin_kick_user_"))
     application.add_handler(CallbackQueryHandler(stats.ban_unban_user, pattern="^admin_ban_user_"))
     application.add_handler(CallbackQueryHandler(stats.ask_for_delete_confirmation, pattern="^admin_delete_user_"))
     application.add_handler(CallbackQueryHandler(stats.process_delete_confirmation, pattern="^admin_confirm_delete_"))
     application.add_handler(CallbackQueryHandler(stats.show_ratings_history, pattern="^ratings_page_"))
 
+    # --- Журнал активности ---
+    application.add_handler(CallbackQueryHandler(activity.show_user_activity, pattern="^admin_activity_"))
+    application.add_handler(CallbackQueryHandler(activity.turn_activity_page, pattern="^activity_(next|prev)$"))
+    application.add_handler(CallbackQueryHandler(activity.export_activity, pattern="^activity_export$"))
+
     # --- Книги ---
     application.add_handler(CallbackQueryHandler(books.show_books_list, pattern="^books_page_"))
     application.add_handler(CallbackQueryHandler(books.show_book_details, pattern="^admin_view_book_"))
@@ -111,6 +121,7 @@ async def main() -> None:
     
     await application.initialize()
     await application.start()
+    start_loop_monitor("admin_bot")
     await application.updater.start_polling()
     await asyncio.Future()
 
@@ -21,4 +21,8 @@ class AdminState(Enum):
     GET_DESCRIPTION = auto()
     GET_COVER = auto()
     CONFIRM_ADD = auto()
-    BULK_ADD_WAITING_FILE = auto()
\ No newline at end of file
+    BULK_ADD_WAITING_FILE = auto()
+    # --- Пакетная выдача и возврат ---
+    CIRCULATION_CHECKIN_INPUT = auto()
+    CIRCULATION_CHECKOUT_USER = auto()
+    CIRCULATION_CHECKOUT_INPUT = auto()
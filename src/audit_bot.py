@@ -4,6 +4,7 @@ import logging
 from telegram import Update
 from telegram.ext import Application, CommandHandler, ContextTypes
 from src.core import config
+from src.core.loop_monitor import start_loop_monitor
 from telegram.request import HTTPXRequest
 
 logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
@@ -40,6 +41,7 @@ async def main() -> None:
     
     await application.initialize()
     await application.start()
+    start_loop_monitor("audit_bot")
     await application.updater.start_polling()
     await asyncio.Future()
 
@@ -0,0 +1,234 @@
+# src/core/catalog_index.py
+"""
+Memory-mapped trigram index of book titles and authors for inline-mode autocomplete.
+
+The `rebuild_catalog_index` task writes the catalog into one binary file and atomically
+replaces the previous one. Bot processes map the file read-only and answer inline
+queries from it without touching the database: a lookup binary-searches the sorted
+trigram keys and counts hits in the posting lists, reading both straight from the
+mapping. Every `CATALOG_INDEX_CHECK_INTERVAL` seconds the loader stats the file and
+maps the new one if it was replaced.
+
+File layout (native byte order; the index is built and read by the same deployment):
+    header    magic b'LBCI', version, book_count, gram_count, posting_count, strings_size (u32)
+    books     book_count records: id u32, available u32, text_offset u32, name_len u16, author_len u16
+    grams     gram_count sorted u64 keys (three code points, 21 bits each)
+    offsets   gram_count + 1 u32 offsets into postings
+    postings  u32 book numbers, ascending within each gram
+    strings   UTF-8 names and authors
+"""
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Iterable
+
+from src.core import config
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'LBCI'
+VERSION = 1
+_HEADER = struct.Struct('=4s5I')
+_BOOK = struct.Struct('=3I2H')
+# Share of the query trigrams a book must contain; tolerates a typo in a longer word.
+MIN_MATCH = 0.5
+
+_WORD = re.compile(r"\w+")
+
+
+def _words(text: str) -> list[str]:
+    return _WORD.findall(text.lower().replace('ё', 'е'))
+
+
+def _pack(gram: str) -> int:
+    return (ord(gram[0]) << 42) | (ord(gram[1]) << 21) | ord(gram[2])
+
+
+def _grams(padded: str) -> set[int]:
+    return {_pack(padded[i:i + 3]) for i in range(len(padded) - 2)}
+
+
+def book_trigrams(text: str) -> set[int]:
+    """Trigrams of every word, padded so that word starts and ends are indexed too."""
+    grams = set()
+    for word in _words(text):
+        grams |= _grams(f"  {word} ")
+    return grams
+
+
+def query_trigrams(query: str) -> set[int]:
+    """Like book_trigrams, but the last word is still being typed, so only its start is anchored."""
+    words = _words(query)
+    grams = set()
+    for number, word in enumerate(words):
+        finished = number < len(words) - 1 or query[-1:].isspace()
+        grams |= _grams(f"  {word} " if finished else f"  {word}")
+    return grams
+
+
+def build_index(books: Iterable[tuple[int, str, str, bool]], path: str) -> int:
+    """
+    Writes the index of (id, name, author, is_available) rows to `path` and returns the
+    number of books. The file is written next to the target and moved into place with
+    os.replace, so readers see either the old or the new index, never a partial one.
+    """
+    records = bytearray()
+    strings = bytearray()
+    postings: dict[int, list[int]] = defaultdict(list)
+    count = 0
+    for book_id, name, author, available in books:
+        name_bytes, author_bytes = name.encode(), (author or '').encode()
+        records += _BOOK.pack(book_id, int(bool(available)), len(strings), len(name_bytes), len(author_bytes))
+        strings += name_bytes + author_bytes
+        for gram in book_trigrams(f"{name} {author or ''}"):
+            postings[gram].append(count)
+        count += 1
+
+    keys = array('Q', sorted(postings))
+    offsets = array('I', [0])
+    flat = array('I')
+    for key in keys:
+        flat.extend(postings[key])
+        offsets.append(len(flat))
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, count, len(keys), len(flat), len(strings)))
+            f.write(records)
+            keys.tofile(f)
+            offsets.tofile(f)
+            flat.tofile(f)
+            f.write(strings)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return count
+
+
+class CatalogIndex:
+    """A read-only view of one index file. Lookups read from the mapping without copying it."""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, self.book_count, gram_count, posting_count, strings_size = _HEADER.unpack_from(self._mmap)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a catalog index of version {VERSION}")
+            books_at = _HEADER.size
+            grams_at = books_at + self.book_count * _BOOK.size
+            offsets_at = grams_at + gram_count * 8
+            postings_at = offsets_at + (gram_count + 1) * 4
+            self._strings_at = postings_at + posting_count * 4
+            if self._strings_at + strings_size != len(self._mmap):
+                raise ValueError(f"{path} is truncated")
+            self._books_at = books_at
+            view = memoryview(self._mmap)
+            self._grams = view[grams_at:offsets_at].cast('Q')
+            self._offsets = view[offsets_at:postings_at].cast('I')
+            self._postings = view[postings_at:self._strings_at].cast('I')
+            view.release()
+        except BaseException:
+            self._mmap.close()
+            raise
+
+    def search(self, query: str, limit: int) -> list[dict]:
+        """
+        Returns up to `limit` books ranked by the share of query trigrams they contain;
+        ties go to available books, then to catalog order (by title).
+        """
+        grams = query_trigrams(query)
+        if not grams:
+            return []
+        hits = Counter()
+        for gram in grams:
+            position = bisect_left(self._grams, gram)
+            if position < len(self._grams) and self._grams[position] == gram:
+                hits.update(self._postings[self._offsets[position]:self._offsets[position + 1]])
+
+        threshold = max(1, math.ceil(len(grams) * MIN_MATCH))
+        books = [self._book(number) | {'score': score / len(grams)}
+                 for number, score in hits.items() if score >= threshold]
+        books.sort(key=lambda book: (-book['score'], not book['is_available'], book['number']))
+        return books[:limit]
+
+    def _book(self, number: int) -> dict:
+        book_id, available, text_offset, name_len, author_len = _BOOK.unpack_from(self._mmap, self._books_at + number * _BOOK.size)
+        start = self._strings_at + text_offset
+        return {
+            'number': number,
+            'id': book_id,
+            'name': self._mmap[start:start + name_len].decode(),
+            'author': self._mmap[start + name_len:start + name_len + author_len].decode(),
+            'is_available': bool(available),
+        }
+
+    def close(self) -> None:
+        for view in (self._grams, self._offsets, self._postings):
+            view.release()
+        self._mmap.close()
+
+
+class CatalogIndexLoader:
+    """
+    Holds the current CatalogIndex of a process and swaps it when the file is replaced.
+    Searches are synchronous, so no lookup is in flight when the old mapping is closed.
+    """
+
+    def __init__(self, path: str | None = None, check_interval: float | None = None):
+        self.path = path or config.CATALOG_INDEX_PATH
+        self.check_interval = config.CATALOG_INDEX_CHECK_INTERVAL if check_interval is None else check_interval
+        self._index: CatalogIndex | None = None
+        self._signature = None
+        self._checked_at = float('-inf')
+
+    def get(self) -> CatalogIndex | None:
+        """Returns the current index, or None if it has not been built yet."""
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            self._reload_if_replaced()
+        return self._index
+
+    def _reload_if_replaced(self) -> None:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            return
+        try:
+            index = CatalogIndex(self.path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Catalog index {self.path} could not be loaded, keeping the previous one: {e}")
+            return
+        previous, self._index, self._signature = self._index, index, signature
+        if previous is not None:
+            previous.close()
+        logger.info(f"Catalog index loaded: {index.book_count} books.")
+
+    def close(self) -> None:
+        if self._index is not None:
+            self._index.close()
+        self._index, self._signature = None, None
+        self._checked_at = float('-inf')
+
+
+# Process-wide index used by the library bot's inline mode.
+catalog_index = CatalogIndexLoader()
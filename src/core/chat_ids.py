@@ -0,0 +1,101 @@
+# src/core/chat_ids.py
+"""
+Resolution of internal user ids to Telegram chat ids for the notification paths.
+
+Fan-out jobs resolve all recipients with one query and put the chat id into the
+notification payload. Single notifications go through a process-level cache.
+Entries expire after `CHAT_ID_CACHE_TTL` seconds. Long-running consumers also
+subscribe to `user_chat_changed`, which the database raises when a user links a
+different Telegram account, blocks or unblocks the bot, or is deleted.
+"""
+import logging
+import time
+from collections import OrderedDict
+
+import asyncpg
+
+from src.core import config
+from src.core.db import data_access as db_data
+
+logger = logging.getLogger(__name__)
+
+USER_CHAT_CHANGED_CHANNEL = 'user_chat_changed'
+
+
+class ChatIdCache:
+    """LRU cache of delivery targets (`telegram_id`, `bot_blocked`) keyed by user id."""
+
+    def __init__(self, ttl: float | None = None, max_size: int | None = None):
+        self.ttl = config.CHAT_ID_CACHE_TTL if ttl is None else ttl
+        self.max_size = max_size or config.CHAT_ID_CACHE_SIZE
+        self._entries: OrderedDict[int, tuple[float, dict]] = OrderedDict()
+
+    def get(self, user_id: int) -> dict | None:
+        """Returns the cached target or None if it is missing or expired."""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, target = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return target
+
+    def put(self, user_id: int, target: dict) -> None:
+        self._entries[user_id] = (time.monotonic() + self.ttl, target)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int | None = None) -> None:
+        """Drops one user (or everything when `user_id` is None)."""
+        if user_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(user_id, None)
+
+    async def resolve(self, conn: asyncpg.Connection, user_id: int) -> dict:
+        """
+        Returns the delivery target of one user.
+
+        Raises:
+            NotFoundError: the user does not exist or has no linked Telegram account.
+        """
+        target = self.get(user_id)
+        if target is None:
+            target = await db_data.get_user_delivery_target(conn, user_id)
+            self.put(user_id, target)
+        return target
+
+    async def resolve_many(self, conn: asyncpg.Connection, user_ids: list[int]) -> dict[int, dict]:
+        """Returns delivery targets for many users with at most one query. Users without Telegram are omitted."""
+        targets = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            target = self.get(user_id)
+            if target is None:
+                missing.append(user_id)
+            else:
+                targets[user_id] = target
+        if missing:
+            resolved = await db_data.get_delivery_targets(conn, missing)
+            for user_id, target in resolved.items():
+                self.put(user_id, target)
+            targets.update(resolved)
+        return targets
+
+    async def listen(self, conn: asyncpg.Connection) -> None:
+        """Subscribes the connection to invalidation events from the database."""
+        await conn.add_listener(USER_CHAT_CHANGED_CHANNEL, self._on_user_chat_changed)
+
+    def _on_user_chat_changed(self, connection, pid, channel, payload: str) -> None:
+        try:
+            self.invalidate(int(payload))
+        except ValueError:
+            logger.warning(f"Unexpected {channel} payload {payload!r}, clearing the chat id cache.")
+            self.invalidate()
+
+
+# Process-wide cache shared by all notification paths of this process.
+chat_id_cache = ChatIdCache()
@@ -50,6 +50,92 @@ CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://redis:6379/0
 # Flag to run Celery tasks synchronously for testing purposes.
 CELERY_TASK_ALWAYS_EAGER = os.getenv('CELERY_TASK_ALWAYS_EAGER', 'False').lower() in ('true', '1', 't')
 
+# Redis instance used for cross-process coordination (Telegram send scheduler).
+REDIS_URL = os.getenv('REDIS_URL', CELERY_BROKER_URL)
+
+# --- Telegram Send Limits ---
+# Shared across all workers through Redis. Telegram allows ~30 msg/s per bot and ~1 msg/s per chat.
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '30'))
+TELEGRAM_PER_CHAT_RATE = float(os.getenv('TELEGRAM_PER_CHAT_RATE', '1'))
+TELEGRAM_SEND_MAX_ATTEMPTS = int(os.getenv('TELEGRAM_SEND_MAX_ATTEMPTS', '5'))
+# Exponential backoff with full jitter for transient errors (seconds).
+TELEGRAM_BACKOFF_BASE = float(os.getenv('TELEGRAM_BACKOFF_BASE', '1'))
+TELEGRAM_BACKOFF_MAX = float(os.getenv('TELEGRAM_BACKOFF_MAX', '60'))
+# Longer RetryAfter waits are handed back to Celery instead of blocking the worker.
+TELEGRAM_MAX_INLINE_RETRY_AFTER = float(os.getenv('TELEGRAM_MAX_INLINE_RETRY_AFTER', '20'))
+
+# --- Database Cursors ---
+# Rows fetched per round trip by the streaming (iter_*) data access functions.
+DB_CURSOR_PREFETCH = int(os.getenv('DB_CURSOR_PREFETCH', '500'))
+
+# --- Celery Queues ---
+# Fan-outs publish to the `bulk` queue in batches and pause while it is deeper than the watermark.
+BULK_PUBLISH_BATCH_SIZE = int(os.getenv('BULK_PUBLISH_BATCH_SIZE', '50'))
+BULK_QUEUE_HIGH_WATERMARK = int(os.getenv('BULK_QUEUE_HIGH_WATERMARK', '500'))
+BULK_THROTTLE_INTERVAL = float(os.getenv('BULK_THROTTLE_INTERVAL', '2'))
+
+# --- Async Delivery Worker ---
+# When enabled, user notifications go to Redis streams consumed by src/core/delivery_worker.py
+# instead of one Celery task per message.
+DELIVERY_WORKER_ENABLED = os.getenv('DELIVERY_WORKER_ENABLED', 'True').lower() in ('true', '1', 't')
+# Maximum number of notifications in flight on the worker's event loop.
+DELIVERY_CONCURRENCY = int(os.getenv('DELIVERY_CONCURRENCY', '200'))
+DELIVERY_MAX_ATTEMPTS = int(os.getenv('DELIVERY_MAX_ATTEMPTS', '5'))
+# Unacknowledged messages idle longer than this (seconds) are reclaimed and retried.
+DELIVERY_RECLAIM_IDLE = float(os.getenv('DELIVERY_RECLAIM_IDLE', '60'))
+DELIVERY_RECLAIM_INTERVAL = float(os.getenv('DELIVERY_RECLAIM_INTERVAL', '15'))
+
+# --- Notification Delivery Ledger ---
+# A pending ledger row is claimed by one sender for this long (seconds); longer than the
+# notify_user time limit, so a claim outlives the attempt that took it unless it crashed.
+NOTIFICATION_CLAIM_LEASE = float(os.getenv('NOTIFICATION_CLAIM_LEASE', '90'))
+
+# --- Chat ID Cache ---
+# user_id -> chat_id mappings cached per process; invalidated via LISTEN where possible.
+CHAT_ID_CACHE_TTL = float(os.getenv('CHAT_ID_CACHE_TTL', '300'))
+CHAT_ID_CACHE_SIZE = int(os.getenv('CHAT_ID_CACHE_SIZE', '50000'))
+
+# --- Notification Outbox ---
+# Handlers write notifications to the outbox table; the relay moves them to the broker in batches.
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '100'))
+# Fallback poll interval (seconds) in case a LISTEN/NOTIFY wake-up is missed.
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', '5'))
+
+# --- Batch Circulation ---
+# Upper bound on items in one /checkin or /checkout batch (each batch is a single transaction).
+BULK_CIRCULATION_MAX_ITEMS = int(os.getenv('BULK_CIRCULATION_MAX_ITEMS', '200'))
+
+# --- Callback De-duplication ---
+# Repeated taps on the same button within this window (seconds) get the first tap's result.
+CALLBACK_DEDUP_WINDOW = float(os.getenv('CALLBACK_DEDUP_WINDOW', '2'))
+
+# --- Search Result Cache ---
+# Book search results (with the card fields) are cached per term; paging and opening cards
+# of cached results do not touch the database. Only the first SEARCH_CACHE_MAX_RESULTS are kept.
+SEARCH_CACHE_TTL = float(os.getenv('SEARCH_CACHE_TTL', '60'))
+SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', '256'))
+SEARCH_CACHE_MAX_RESULTS = int(os.getenv('SEARCH_CACHE_MAX_RESULTS', '100'))
+
+# --- Catalog Index (inline mode) ---
+# Trigram index of titles and authors, rebuilt by the maintenance worker and memory-mapped by
+# the library bot. The path must be shared by both (compose.yaml mounts the app directory).
+CATALOG_INDEX_PATH = os.getenv('CATALOG_INDEX_PATH', 'data/catalog_index.bin')
+CATALOG_INDEX_CHECK_INTERVAL = float(os.getenv('CATALOG_INDEX_CHECK_INTERVAL', '5'))
+# Telegram shows at most 50 inline results per answer.
+INLINE_RESULTS_LIMIT = min(int(os.getenv('INLINE_RESULTS_LIMIT', '20')), 50)
+INLINE_CACHE_TIME = int(os.getenv('INLINE_CACHE_TIME', '30'))
+
+# --- Activity Explorer ---
+# Rows per /activity page (keyset pagination) and upper bound on rows in one CSV export.
+ACTIVITY_PAGE_SIZE = int(os.getenv('ACTIVITY_PAGE_SIZE', '15'))
+ACTIVITY_EXPORT_MAX_ROWS = int(os.getenv('ACTIVITY_EXPORT_MAX_ROWS', '100000'))
+
+# --- Reservation Queue ---
+# A returned copy is held for the first waiter this long; expired holds pass to the next one.
+RESERVATION_HOLD_HOURS = int(os.getenv('RESERVATION_HOLD_HOURS', '48'))
+# Expired holds processed per sweep statement.
+RESERVATION_SWEEP_BATCH = int(os.getenv('RESERVATION_SWEEP_BATCH', '500'))
+
 # --- Email Configuration - SendGrid (OPTIONAL) ---
 # API key for SendGrid, used for sending verification emails.
 SENDGRID_API_KEY = os.getenv('SENDGRID_API_KEY')
@@ -60,6 +146,13 @@ FROM_EMAIL = os.getenv('FROM_EMAIL')
 TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
 TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
 
+# --- Event Loop Monitoring ---
+# Every bot process measures the lag of its asyncio loop and dumps the loop thread's
+# stack when a single blocking call holds the loop longer than the threshold.
+LOOP_MONITOR_ENABLED = os.getenv('LOOP_MONITOR_ENABLED', 'True').lower() in ('true', '1', 't')
+LOOP_MONITOR_INTERVAL = float(os.getenv('LOOP_MONITOR_INTERVAL', '0.5'))
+LOOP_LAG_THRESHOLD_MS = float(os.getenv('LOOP_LAG_THRESHOLD_MS', '250'))
+LOOP_MONITOR_REPORT_INTERVAL = float(os.getenv('LOOP_MONITOR_REPORT_INTERVAL', '300'))
 
 # --- Feature Flags ---
 # These flags are automatically set based on the presence of optional service credentials.
@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
 import logging
-from .utils import hash_password
-from datetime import datetime, timedelta
+from .utils import hash_password, Row
+from datetime import datetime
+from typing import AsyncIterator
 import asyncpg
+import json
 import uuid
 
+from src.core import config
+
 # Настройка логирования
 logger = logging.getLogger(__name__)
 
@@ -21,12 +25,15 @@ class UserExistsError(DatabaseError):
     """Ошибка, когда пользователь уже существует."""
     pass
 
-# --- Вспомогательные функции для преобразования ---
-def _record_to_dict(record: asyncpg.Record | None) -> dict | None:
-    return dict(record) if record else None
+# --- Строки результата ---
+# Соединения создаются с record_class=Row, поэтому строки отдаются как есть, без копирования
+# в dict: доступ по ключу, через get() и как атрибут (row.name). Строки неизменяемы — если
+# нужно что-то дописать, сделайте dict(row).
+def _row(record: Row | None) -> Row | None:
+    return record or None
 
-def _records_to_list_of_dicts(records: list[asyncpg.Record]) -> list[dict]:
-    return [dict(r) for r in records]
+def _rows(records: list[Row]) -> list[Row]:
+    return records
 
 # ==============================================================================
 # --- Функции для работы с ПОЛЬЗОВАТЕЛЯМИ (Users) ---
@@ -51,50 +58,136 @@ async def add_user(conn: asyncpg.Connection, data: dict) -> int:
     except asyncpg.PostgresError as e:
         raise DatabaseError(f"Не удалось добавить пользователя: {e}")
 
-async def get_user_by_login(conn: asyncpg.Connection, login_query: str) -> dict:
+# Колонки пользователя, которые читают обработчики (без registration_code и флагов доставки).
+_USER_COLUMNS = (
+    "id, username, telegram_id, telegram_username, full_name, dob, contact_info, status, "
+    "password_hash, registration_date, is_banned, force_logout, active_loans, unread_notifications"
+)
+
+# Поиск по user_identifiers: значения нормализованы (normalize_login в БД), поэтому регистр
+# email, '@' перед Telegram username и формат телефона не важны. Логин и контакт уникальны в
+# нормализованном виде (idx_user_identifiers_unique_login); если значение совпадает с
+# идентификаторами разного вида, приоритет у логина, затем у контакта, затем у Telegram username.
+_IDENTIFIER_PRIORITY = "array_position(ARRAY['username', 'contact', 'telegram'], kind::text)"
+
+async def get_user_by_login(conn: asyncpg.Connection, login_query: str) -> Row:
     """Ищет пользователя по username, contact_info или telegram_username."""
     row = await conn.fetchrow(
-        "SELECT * FROM users WHERE username = $1 OR contact_info = $1 OR telegram_username = $1",
+        f"""
+        SELECT {_USER_COLUMNS} FROM users
+        WHERE id = (
+            SELECT user_id FROM user_identifiers WHERE identifier = normalize_login($1)
+            ORDER BY {_IDENTIFIER_PRIORITY}, user_id LIMIT 1
+        )
+        """,
         login_query
     )
     if not row:
         raise NotFoundError("Пользователь с таким логином не найден.")
     if row['is_banned']:
         raise NotFoundError("Этот пользователь забанен.")
-    return _record_to_dict(row)
+    return _row(row)
 
-async def get_user_by_id(conn: asyncpg.Connection, user_id: int) -> dict:
+async def get_user_by_id(conn: asyncpg.Connection, user_id: int) -> Row:
     """Возвращает все данные одного пользователя по его ID."""
-    row = await conn.fetchrow("SELECT * FROM users WHERE id = $1", user_id)
+    row = await conn.fetchrow(f"SELECT {_USER_COLUMNS} FROM users WHERE id = $1", user_id)
+    if not row:
+        raise NotFoundError("Пользователь с таким ID не найден.")
+    return _row(row)
+
+async def get_user_counters(conn: asyncpg.Connection, user_id: int) -> Row:
+    """
+    Возвращает счетчики пользователя active_loans и unread_notifications (поиск по первичному
+    ключу). Счетчики поддерживаются триггерами, расхождения исправляет reconcile_user_counters.
+    """
+    row = await conn.fetchrow("SELECT active_loans, unread_notifications FROM users WHERE id = $1", user_id)
     if not row:
         raise NotFoundError("Пользователь с таким ID не найден.")
-    return _record_to_dict(row)
+    return row
 
-async def get_all_users(conn: asyncpg.Connection, limit: int, offset: int) -> tuple[list, int]:
+async def reconcile_user_counters(conn: asyncpg.Connection) -> int:
+    """Пересчитывает разошедшиеся счетчики пользователей. Возвращает число исправленных."""
+    return await conn.fetchval("SELECT reconcile_user_counters()")
+
+async def get_all_users(conn: asyncpg.Connection, limit: int, offset: int) -> tuple[list[Row], int]:
     """Возвращает порцию пользователей для постраничной навигации и общее количество."""
     total_users = await conn.fetchval("SELECT COUNT(*) FROM users")
     rows = await conn.fetch(
         "SELECT id, username, full_name, registration_date, dob FROM users ORDER BY registration_date DESC LIMIT $1 OFFSET $2",
         limit, offset
     )
-    return _records_to_list_of_dicts(rows), total_users or 0
+    return _rows(rows), total_users or 0
+
+async def search_users(conn: asyncpg.Connection, search_query: str, limit: int = 10) -> list[Row]:
+    """
+    Ищет пользователей по имени, логину, контакту, Telegram username (нечеткое совпадение по
+    триграммам, pg_trgm) или Telegram ID, одним запросом. Имя сравнивается без учета регистра,
+    остальное — по нормализованным идентификаторам (user_identifiers). Точное совпадение
+    идентификатора или Telegram ID ранжируется выше любого похожего.
+
+    Returns:
+        list[Row]: id, username, full_name, contact_info, telegram_id, is_banned, score —
+                   по убыванию score.
+    """
+    search_query = search_query.strip()
+    if not search_query:
+        return []
+    telegram_id = int(search_query) if search_query.isdigit() and len(search_query) <= 18 else None
+    rows = await conn.fetch(
+        """
+        WITH term AS (
+            SELECT lower($1) AS name, normalize_login($1) AS login
+        ),
+        matches AS (
+            SELECT u.id AS user_id, word_similarity(term.name, lower(u.full_name)) AS score
+            FROM users u, term
+            WHERE term.name <% lower(u.full_name)
+            UNION ALL
+            SELECT ui.user_id,
+                   CASE WHEN ui.identifier = term.login THEN 2 ELSE word_similarity(term.login, ui.identifier) END
+            FROM user_identifiers ui, term
+            WHERE term.login <% ui.identifier
+            UNION ALL
+            SELECT id, 3 FROM users WHERE telegram_id = $2
+        ),
+        ranked AS (
+            SELECT user_id, MAX(score) AS score FROM matches GROUP BY user_id
+        )
+        SELECT u.id, u.username, u.full_name, u.contact_info, u.telegram_id, u.is_banned, ranked.score
+        FROM ranked JOIN users u ON u.id = ranked.user_id
+        ORDER BY ranked.score DESC, u.full_name
+        LIMIT $3
+        """,
+        search_query, telegram_id, limit
+    )
+    return _rows(rows)
 
 async def get_all_user_ids(conn: asyncpg.Connection) -> list[int]:
-    """Возвращает список всех ID пользователей, привязавших Telegram."""
-    records = await conn.fetch("SELECT id FROM users WHERE telegram_id IS NOT NULL")
+    """Возвращает список ID пользователей, привязавших Telegram и не заблокировавших бота."""
+    records = await conn.fetch("SELECT id FROM users WHERE telegram_id IS NOT NULL AND bot_blocked IS NOT TRUE")
     return [item['id'] for item in records]
 
-async def get_user_profile(conn: asyncpg.Connection, user_id: int) -> dict:
+async def get_user_profile(conn: asyncpg.Connection, user_id: int) -> Row:
     """Получает данные для карточки профиля пользователя."""
     row = await conn.fetchrow("SELECT username, full_name, telegram_username, status, contact_info, registration_date, dob FROM users WHERE id = $1", user_id)
     if not row:
         raise NotFoundError("Профиль пользователя не найден.")
-    return _record_to_dict(row)
+    return _row(row)
 
 async def update_user_password(conn: asyncpg.Connection, login_query: str, new_password: str):
     """Обновляет пароль пользователя по логину."""
     hashed_pass = hash_password(new_password)
-    result = await conn.execute("UPDATE users SET password_hash = $1 WHERE username = $2 OR contact_info = $2", hashed_pass, login_query)
+    result = await conn.execute(
+        f"""
+        UPDATE users SET password_hash = $1
+        WHERE id = (
+            SELECT user_id FROM user_identifiers
+            WHERE identifier = normalize_login($2) AND kind IN ('username', 'contact')
+            ORDER BY {_IDENTIFIER_PRIORITY}, user_id LIMIT 1
+        )
+        """,
+        hashed_pass, login_query
+    )
     if int(result.split()[-1]) == 0:
         raise NotFoundError("Пользователь для обновления пароля не найден.")
 
@@ -120,14 +213,32 @@ async def update_user_contact(conn: asyncpg.Connection, user_id: int, new_contac
     except asyncpg.IntegrityConstraintViolationError:
         raise UserExistsError("Этот контакт уже используется другим пользователем.")
 
+async def _drop_user_reservations(conn: asyncpg.Connection, user_id: int):
+    """Убирает пользователя из очередей; отложенные для него экземпляры передаст следующая проверка сроков."""
+    await conn.execute(
+        """
+        WITH dropped AS (
+            DELETE FROM reservations WHERE user_id = $1 AND NOT notified
+        )
+        UPDATE reservations SET hold_expires_at = now() WHERE user_id = $1 AND notified
+        """, user_id
+    )
+
 async def delete_user_by_admin(conn: asyncpg.Connection, user_id: int):
     """Анонимизирует пользователя (выполняется администратором)."""
     async with conn.transaction():
-        book_ids_records = await conn.fetch("SELECT book_id FROM borrowed_books WHERE user_id = $1 AND return_date IS NULL", user_id)
-        if book_ids_records:
-            book_ids = [(r['book_id'],) for r in book_ids_records]
-            await conn.executemany("UPDATE books SET available_quantity = available_quantity + 1 WHERE id = $1", book_ids)
-        await conn.execute("UPDATE borrowed_books SET return_date = CURRENT_DATE WHERE user_id = $1 AND return_date IS NULL", user_id)
+        # Закрываем выдачи и возвращаем экземпляры на полку (счетчики книг обновит триггер)
+        await conn.execute(
+            """
+            WITH closed AS (
+                UPDATE borrowed_books SET return_date = CURRENT_DATE
+                WHERE user_id = $1 AND return_date IS NULL
+                RETURNING copy_id
+            )
+            UPDATE book_copies SET is_available = TRUE WHERE id IN (SELECT copy_id FROM closed)
+            """, user_id
+        )
+        await _drop_user_reservations(conn, user_id)
         anonymized_username = f"deleted_user_{user_id}"
         await conn.execute(
             "UPDATE users SET username = $1, full_name = '(удален админом)', contact_info = $2, password_hash = 'deleted', status = 'deleted', telegram_id = NULL, telegram_username = NULL WHERE id = $3",
@@ -158,6 +269,7 @@ async def delete_user_by_self(conn: asyncpg.Connection, user_id: int) -> str:
         has_books = await conn.fetchval("SELECT 1 FROM borrowed_books WHERE user_id = $1 AND return_date IS NULL", user_id)
         if has_books:
             return "У вас есть невозвращенные книги. Удаление невозможно."
+        await _drop_user_reservations(conn, user_id)
         anonymized_username = f"deleted_user_{user_id}"
         await conn.execute(
             "UPDATE users SET username = $1, full_name = '(удален)', contact_info = $2, password_hash = 'deleted', status = 'deleted', telegram_id = NULL, telegram_username = NULL WHERE id = $3",
@@ -176,8 +288,8 @@ async def set_registration_code(conn: asyncpg.Connection, user_id: int) -> str:
     return code
 
 async def link_telegram_id_by_code(conn: asyncpg.Connection, code: str, telegram_id: int, telegram_username: str):
-    """Находит пользователя по коду регистрации и обновляет его telegram_id."""
-    res = await conn.fetchval("UPDATE users SET telegram_id = $1, telegram_username = $2 WHERE registration_code = $3 RETURNING id", telegram_id, telegram_username, code)
+    """Находит пользователя по коду регистрации и обновляет его telegram_id (и снимает флаг блокировки бота)."""
+    res = await conn.fetchval("UPDATE users SET telegram_id = $1, telegram_username = $2, bot_blocked = FALSE WHERE registration_code = $3 RETURNING id", telegram_id, telegram_username, code)
     if res is None:
         raise NotFoundError("Пользователь с таким кодом регистрации не найден.")
 
@@ -188,6 +300,30 @@ async def get_telegram_id_by_user_id(conn: asyncpg.Connection, user_id: int) ->
         raise NotFoundError(f"Telegram ID для пользователя с ID {user_id} не найден.")
     return tid
 
+async def get_user_delivery_target(conn: asyncpg.Connection, user_id: int) -> dict:
+    """Возвращает telegram_id пользователя и флаг bot_blocked для доставки уведомления."""
+    row = await conn.fetchrow("SELECT telegram_id, bot_blocked FROM users WHERE id = $1", user_id)
+    if not row or not row['telegram_id']:
+        raise NotFoundError(f"Telegram ID для пользователя с ID {user_id} не найден.")
+    return {'telegram_id': row['telegram_id'], 'bot_blocked': bool(row['bot_blocked'])}
+
+async def get_delivery_targets(conn: asyncpg.Connection, user_ids: list[int]) -> dict[int, dict]:
+    """Возвращает telegram_id и bot_blocked для списка пользователей одним запросом (без непривязанных)."""
+    rows = await conn.fetch(
+        "SELECT id, telegram_id, bot_blocked FROM users WHERE id = ANY($1::int[]) AND telegram_id IS NOT NULL",
+        user_ids
+    )
+    return {r['id']: {'telegram_id': r['telegram_id'], 'bot_blocked': bool(r['bot_blocked'])} for r in rows}
+
+async def mark_user_bot_blocked(conn: asyncpg.Connection, user_id: int, blocked: bool = True):
+    """Помечает, что пользователь заблокировал (или разблокировал) бота-уведомителя."""
+    await conn.execute("UPDATE users SET bot_blocked = $1 WHERE id = $2", blocked, user_id)
+
+async def clear_bot_blocked_by_telegram_id(conn: asyncpg.Connection, telegram_id: int) -> bool:
+    """Снимает флаг блокировки бота по telegram_id. Возвращает True, если флаг был установлен."""
+    res = await conn.fetchval("UPDATE users SET bot_blocked = FALSE WHERE telegram_id = $1 AND bot_blocked RETURNING id", telegram_id)
+    return res is not None
+
 # ==============================================================================
 # --- Функции для работы с КНИГАМИ (Books & Authors) ---
 # ==============================================================================
@@ -201,22 +337,35 @@ async def get_or_create_author(conn: asyncpg.Connection, author_name: str) -> in
         return await conn.fetchval("INSERT INTO authors (name) VALUES ($1) RETURNING id", author_name)
 
 async def add_new_book(conn: asyncpg.Connection, book_data: dict) -> int:
-    """Добавляет новую книгу, находя или создавая автора."""
+    """
+    Добавляет новую книгу, находя или создавая автора, и заводит 'total_quantity' экземпляров.
+    Счетчики total_quantity/available_quantity выставляет триггер по экземплярам при коммите.
+    """
     author_id = await get_or_create_author(conn, book_data['author'])
     return await conn.fetchval(
-        "INSERT INTO books (name, author_id, genre, description, cover_image_id, total_quantity, available_quantity) VALUES ($1, $2, $3, $4, $5, $6, $6) RETURNING id",
+        """
+        WITH book AS (
+            INSERT INTO books (name, author_id, genre, description, cover_image_id, total_quantity, available_quantity)
+            VALUES ($1, $2, $3, $4, $5, 0, 0) RETURNING id
+        ),
+        copies AS (
+            INSERT INTO book_copies (book_id, serial_number)
+            SELECT id, 'B' || id || '-' || n FROM book, generate_series(1, $6::int) AS n
+        )
+        SELECT id FROM book
+        """,
         book_data['name'], author_id, book_data['genre'], book_data['description'],
         book_data.get('cover_image_id'), book_data.get('total_quantity', 1)
     )
 
-async def get_book_by_id(conn: asyncpg.Connection, book_id: int) -> dict:
+async def get_book_by_id(conn: asyncpg.Connection, book_id: int) -> Row:
     """Ищет одну книгу по её ID для базовых операций."""
     row = await conn.fetchrow("SELECT b.id, b.name, a.name as author_name, b.available_quantity FROM books b JOIN authors a ON b.author_id = a.id WHERE b.id = $1", book_id)
     if not row:
         raise NotFoundError("Книга с таким ID не найдена.")
-    return _record_to_dict(row)
+    return _row(row)
 
-async def get_all_books_paginated(conn: asyncpg.Connection, limit: int, offset: int) -> tuple[list, int]:
+async def get_all_books_paginated(conn: asyncpg.Connection, limit: int, offset: int) -> tuple[list[Row], int]:
     """Возвращает порцию книг для админ-панели и их общее количество."""
     total_books = await conn.fetchval("SELECT COUNT(*) FROM books")
     rows = await conn.fetch(
@@ -226,9 +375,9 @@ async def get_all_books_paginated(conn: asyncpg.Connection, limit: int, offset:
         ORDER BY b.name LIMIT $1 OFFSET $2
         """, limit, offset
     )
-    return _records_to_list_of_dicts(rows), total_books or 0
+    return _rows(rows), total_books or 0
 
-async def get_book_details(conn: asyncpg.Connection, book_id: int) -> dict | None:
+async def get_book_details(conn: asyncpg.Connection, book_id: int) -> Row | None:
     """Возвращает детальную информацию о книге для админа (включая текущего владельца)."""
     row = await conn.fetchrow(
         """
@@ -240,19 +389,19 @@ async def get_book_details(conn: asyncpg.Connection, book_id: int) -> dict | Non
         WHERE b.id = $1
         """, book_id
     )
-    return _record_to_dict(row)
+    return _row(row)
+
+# Поля карточки книги для пользователя (get_book_card_details и результаты поиска)
+_BOOK_CARD_COLUMNS = "b.id, b.name, a.name as author, b.genre, b.description, b.cover_image_id, (b.available_quantity > 0) as is_available"
 
-async def get_book_card_details(conn: asyncpg.Connection, book_id: int) -> dict:
+async def get_book_card_details(conn: asyncpg.Connection, book_id: int) -> Row:
     """Возвращает все данные для карточки книги (для пользователя), включая статус доступности."""
     book_details = await conn.fetchrow(
-        """
-        SELECT b.id, b.name, a.name as author, b.genre, b.description, b.cover_image_id, (b.available_quantity > 0) as is_available
-        FROM books b JOIN authors a ON b.author_id = a.id WHERE b.id = $1
-        """, book_id
+        f"SELECT {_BOOK_CARD_COLUMNS} FROM books b JOIN authors a ON b.author_id = a.id WHERE b.id = $1", book_id
     )
     if not book_details:
         raise NotFoundError("Книга с таким ID не найдена.")
-    return _record_to_dict(book_details)
+    return _row(book_details)
 
 async def update_book_field(conn: asyncpg.Connection, book_id: int, field: str, value: str):
     """Обновляет указанное поле для указанной книги (безопасно)."""
@@ -275,38 +424,81 @@ async def delete_book(conn: asyncpg.Connection, book_id: int):
 # --- Функции для ПОИСКА КНИГ (Search) ---
 # ==============================================================================
 
-async def get_unique_genres(conn: asyncpg.Connection) -> list[str]:
-    """Возвращает список всех уникальных жанров из таблицы книг."""
-    records = await conn.fetch("SELECT DISTINCT genre FROM books WHERE genre IS NOT NULL AND genre != '' ORDER BY genre")
-    return [row['genre'] for row in records]
+async def get_unique_genres(conn: asyncpg.Connection) -> list[Row]:
+    """
+    Возвращает жанры, в которых есть книги, с числом свободных книг (id, name, available_books).
+    Счетчики поддерживаются триггерами, поэтому запрос читает только индекс idx_genres_menu.
+    """
+    rows = await conn.fetch("SELECT id, name, available_books FROM genres WHERE book_count > 0 ORDER BY name")
+    return _rows(rows)
+
+async def get_genre(conn: asyncpg.Connection, genre_id: int) -> Row:
+    """Возвращает жанр по ID (id, name, book_count, available_books)."""
+    row = await conn.fetchrow("SELECT id, name, book_count, available_books FROM genres WHERE id = $1", genre_id)
+    if not row:
+        raise NotFoundError(f"Жанр с ID {genre_id} не найден.")
+    return _row(row)
 
-async def get_available_books_by_genre(conn: asyncpg.Connection, genre: str, limit: int, offset: int) -> tuple[list, int]:
-    """Возвращает порцию свободных книг по жанру."""
-    total = await conn.fetchval("SELECT COUNT(*) FROM books WHERE genre = $1 AND available_quantity > 0", genre)
+async def get_available_books_by_genre(conn: asyncpg.Connection, genre_id: int, limit: int, offset: int) -> tuple[list[Row], int]:
+    """
+    Возвращает порцию свободных книг жанра и их общее число. Книги выбираются по индексу
+    idx_books_genre_available, общее число берется из счетчика жанра вместо COUNT(*).
+    """
+    total = await conn.fetchval("SELECT available_books FROM genres WHERE id = $1", genre_id)
     rows = await conn.fetch(
-        "SELECT b.id, b.name, a.name as author, (b.available_quantity > 0) as is_available FROM books b JOIN authors a ON b.author_id = a.id WHERE b.genre = $1 AND b.available_quantity > 0 ORDER BY b.name LIMIT $2 OFFSET $3",
-        genre, limit, offset
+        """
+        SELECT b.id, b.name, a.name as author, (b.available_quantity > 0) as is_available
+        FROM books b JOIN authors a ON b.author_id = a.id
+        WHERE b.genre_id = $1 AND b.available_quantity > 0
+        ORDER BY b.name LIMIT $2 OFFSET $3
+        """,
+        genre_id, limit, offset
     )
-    return _records_to_list_of_dicts(rows), total or 0
+    return _rows(rows), total or 0
 
-async def search_available_books(conn: asyncpg.Connection, search_term: str, limit: int, offset: int) -> tuple[list, int]:
-    """Ищет доступные книги по названию или автору."""
-    search_pattern = f"%{search_term}%"
-    total = await conn.fetchval(
-        "SELECT COUNT(b.id) FROM books b JOIN authors a ON b.author_id = a.id WHERE (b.name ILIKE $1 OR a.name ILIKE $1) AND b.available_quantity > 0",
-        search_pattern
+async def search_available_books(conn: asyncpg.Connection, search_term: str, limit: int, offset: int) -> tuple[list[Row], int]:
+    """
+    Ищет доступные книги по названию или автору. Страница и общее число — одним запросом;
+    строки содержат все поля карточки книги, чтобы карточку можно было показать без запроса.
+    """
+    rows = await conn.fetch(
+        f"""
+        SELECT {_BOOK_CARD_COLUMNS}, COUNT(*) OVER () as total
+        FROM books b JOIN authors a ON b.author_id = a.id
+        WHERE (b.name ILIKE $1 OR a.name ILIKE $1) AND b.available_quantity > 0
+        ORDER BY b.name LIMIT $2 OFFSET $3
+        """,
+        f"%{search_term}%", limit, offset
     )
+    return _rows(rows), rows[0]['total'] if rows else 0
+
+async def search_books_fulltext(conn: asyncpg.Connection, search_term: str, limit: int, offset: int) -> tuple[list[Row], int]:
+    """
+    Полнотекстовый поиск по названию, автору, жанру и описанию с учетом русской морфологии.
+    Запрос разбирается как в поисковиках ("точная фраза", -исключение, or), книги отбираются
+    по GIN-индексу books.search_vector и ранжируются по весам (название выше описания).
+
+    Returns:
+        tuple[list[Row], int]: поля карточки книги и rank — и общее число найденных.
+    """
     rows = await conn.fetch(
-        "SELECT b.id, b.name, a.name as author FROM books b JOIN authors a ON b.author_id = a.id WHERE (b.name ILIKE $1 OR a.name ILIKE $1) AND b.available_quantity > 0 ORDER BY b.name LIMIT $2 OFFSET $3",
-        search_pattern, limit, offset
+        f"""
+        WITH q AS (SELECT websearch_to_tsquery('russian', $1) AS query)
+        SELECT {_BOOK_CARD_COLUMNS},
+               ts_rank_cd(b.search_vector, q.query) as rank, COUNT(*) OVER () as total
+        FROM books b JOIN authors a ON b.author_id = a.id, q
+        WHERE b.search_vector @@ q.query
+        ORDER BY rank DESC, b.name LIMIT $2 OFFSET $3
+        """,
+        search_term, limit, offset
     )
-    return _records_to_list_of_dicts(rows), total or 0
+    return _rows(rows), rows[0]['total'] if rows else 0
 
 # ==============================================================================
 # --- Функции для ВЗАИМОДЕЙСТВИЙ с книгами (Borrow, Return, Rate, etc.) ---
 # ==============================================================================
 
-async def get_borrowed_books(conn: asyncpg.Connection, user_id: int) -> list[dict]:
+async def get_borrowed_books(conn: asyncpg.Connection, user_id: int) -> list[Row]:
     """Получает список книг, взятых пользователем."""
     rows = await conn.fetch(
         """
@@ -315,9 +507,9 @@ async def get_borrowed_books(conn: asyncpg.Connection, user_id: int) -> list[dic
         WHERE bb.user_id = $1 AND bb.return_date IS NULL
         """, user_id
     )
-    return _records_to_list_of_dicts(rows)
+    return _rows(rows)
 
-async def get_user_borrow_history(conn: asyncpg.Connection, user_id: int) -> list[dict]:
+async def get_user_borrow_history(conn: asyncpg.Connection, user_id: int) -> list[Row]:
     """Получает всю историю заимствований пользователя, включая его оценки."""
     rows = await conn.fetch(
         """
@@ -327,26 +519,268 @@ async def get_user_borrow_history(conn: asyncpg.Connection, user_id: int) -> lis
         WHERE bb.user_id = $1 ORDER BY bb.borrow_date DESC
         """, user_id
     )
-    return _records_to_list_of_dicts(rows)
+    return _rows(rows)
+
+# --- Операции выдачи: каждая выполняется одним запросом (CTE) ---
+# Проверки, изменение остатка, запись выдачи и журнал активности происходят в одном
+# выражении, поэтому блокировки строк держатся один round-trip, а обработчику хватает
+# одного вызова. Условия (свободный экземпляр, лимит, открытая выдача) проверяются в самих
+# запросах и перепроверяются Postgres при конкурентном изменении строки. Сроки возврата
+# отдаются как datetime (полночь даты), как и раньше ожидали обработчики.
+#
+# Выдается конкретный экземпляр из book_copies: он выбирается с FOR UPDATE SKIP LOCKED,
+# поэтому параллельные выдачи одной книги не ждут друг друга, а занимают разные
+# экземпляры. books.available_quantity — производный счетчик, его обновляет отложенный
+# триггер при коммите (внутри незакоммиченной транзакции он еще старый).
+#
+# Очередь броней: вернувшийся экземпляр не попадает на полку, если книгу ждут, — он
+# откладывается для первой брони в порядке очереди (reservations.copy_id) на
+# RESERVATION_HOLD_HOURS. Выдача забирает отложенный экземпляр и закрывает бронь, а
+# просроченные отложения передает следующему expire_reservation_holds.
+
+LOAN_PERIOD_DAYS = 14
+EXTENSION_DAYS = 7
+
+async def checkout_book(conn: asyncpg.Connection, user_id: int, book_id: int, borrow_limit: int | None = None) -> Row:
+    """
+    Выдает книгу пользователю, если она в наличии и не превышен лимит активных выдач
+    (None — без лимита). Пишет 'borrow_book' в журнал активности.
 
-async def borrow_book(conn: asyncpg.Connection, user_id: int, book_id: int) -> datetime:
-    """Обрабатывает взятие книги. Возвращает due_date."""
-    async with conn.transaction():
-        available = await conn.fetchval("SELECT available_quantity FROM books WHERE id = $1 FOR UPDATE", book_id)
-        if not available or available <= 0:
-            raise ValueError("Книга недоступна для взятия")
-        await conn.execute("UPDATE books SET available_quantity = available_quantity - 1 WHERE id = $1", book_id)
-        due_date = datetime.now().date() + timedelta(days=14)
-        return await conn.fetchval(
-            "INSERT INTO borrowed_books (user_id, book_id, borrow_date, due_date) VALUES ($1, $2, CURRENT_DATE, $3) RETURNING due_date",
-            user_id, book_id, due_date
+    Returns:
+        Row: status ('borrowed', 'limit_reached' или 'unavailable'), book_id, book_name,
+             active_loans (до выдачи), borrow_id, due_date и copy_id/serial_number
+             выданного экземпляра (только для 'borrowed').
+    Raises:
+        NotFoundError: книга не найдена.
+    """
+    row = await conn.fetchrow(
+        """
+        WITH book AS (
+            SELECT id, name FROM books WHERE id = $2
+        ),
+        active AS (
+            -- Счетчик по первичному ключу; блокировка строки упорядочивает выдачи одного пользователя
+            SELECT active_loans AS loans FROM users WHERE id = $1 FOR UPDATE
+        ),
+        held AS (
+            SELECT copy_id AS id FROM reservations
+            WHERE user_id = $1 AND book_id = $2 AND notified AND hold_expires_at > now()
+        ),
+        free_copy AS (
+            -- Отложенный для пользователя экземпляр важнее свободного
+            SELECT c.id FROM book_copies c, active
+            WHERE c.book_id = $2 AND ($3::int IS NULL OR active.loans < $3)
+              AND (c.is_available OR c.id IN (SELECT id FROM held))
+            ORDER BY c.id IN (SELECT id FROM held) DESC, c.id
+            LIMIT 1
+            FOR UPDATE OF c SKIP LOCKED
+        ),
+        taken AS (
+            UPDATE book_copies c SET is_available = FALSE
+            FROM free_copy WHERE c.id = free_copy.id
+            RETURNING c.id, c.serial_number
+        ),
+        loan AS (
+            INSERT INTO borrowed_books (user_id, book_id, copy_id, borrow_date, due_date)
+            SELECT $1, $2, id, CURRENT_DATE, CURRENT_DATE + $4::int FROM taken
+            RETURNING borrow_id, due_date, copy_id
+        ),
+        logged AS (
+            INSERT INTO activity_log (user_id, action, details)
+            SELECT $1, 'borrow_book', 'Book ID: ' || $2::int FROM loan
+        ),
+        fulfilled AS (
+            -- Бронь с отложенным экземпляром закрывается, только если выдан он сам. Если отложение
+            -- истекло и выдан другой экземпляр, бронь остается уборке: та передаст экземпляр
+            -- следующему в очереди или вернет на полку
+            DELETE FROM reservations r
+            WHERE r.user_id = $1 AND r.book_id = $2 AND EXISTS (SELECT 1 FROM loan)
+              AND (r.copy_id IS NULL OR r.copy_id = (SELECT copy_id FROM loan))
         )
+        SELECT CASE
+                   WHEN loan.borrow_id IS NOT NULL THEN 'borrowed'
+                   WHEN $3::int IS NOT NULL AND active.loans >= $3 THEN 'limit_reached'
+                   ELSE 'unavailable'
+               END AS status,
+               book.id AS book_id, book.name AS book_name, active.loans AS active_loans,
+               loan.borrow_id, loan.due_date::timestamp AS due_date,
+               loan.copy_id, (SELECT serial_number FROM taken) AS serial_number
+        FROM book CROSS JOIN active LEFT JOIN loan ON TRUE
+        """,
+        user_id, book_id, borrow_limit, LOAN_PERIOD_DAYS
+    )
+    if not row:
+        raise NotFoundError("Книга с таким ID не найдена.")
+    return row
+
+async def checkin_book(conn: asyncpg.Connection, borrow_id: int, user_id: int | None = None) -> Row | None:
+    """
+    Закрывает открытую выдачу, пишет 'return_book' в журнал и откладывает экземпляр для
+    первой брони в очереди; если книгу никто не ждет, экземпляр возвращается на полку.
+    Если передан user_id, выдача должна принадлежать этому пользователю.
+
+    Returns:
+        Row: book_id, book_name, user_id, next_user_id (кого уведомить о поступлении, или None)
+        и hold_expires_at (до какого момента для него отложен экземпляр);
+        None, если открытой выдачи нет (книга уже возвращена).
+    """
+    return await conn.fetchrow(
+        """
+        WITH closed AS (
+            UPDATE borrowed_books SET return_date = CURRENT_DATE
+            WHERE borrow_id = $1 AND return_date IS NULL AND ($2::int IS NULL OR user_id = $2)
+            RETURNING book_id, user_id, copy_id
+        ),
+        next_reservation AS (
+            UPDATE reservations
+            SET notified = TRUE, copy_id = (SELECT copy_id FROM closed), hold_expires_at = now() + make_interval(hours => $3)
+            WHERE reservation_id = (
+                SELECT r.reservation_id FROM reservations r JOIN closed ON r.book_id = closed.book_id
+                WHERE NOT r.notified ORDER BY r.reservation_date, r.reservation_id LIMIT 1
+                FOR UPDATE OF r SKIP LOCKED
+            )
+            RETURNING user_id, hold_expires_at
+        ),
+        released AS (
+            UPDATE book_copies c SET is_available = TRUE
+            FROM closed WHERE c.id = closed.copy_id AND NOT EXISTS (SELECT 1 FROM next_reservation)
+        ),
+        restocked AS (
+            SELECT b.id, b.name, closed.user_id FROM books b JOIN closed ON b.id = closed.book_id
+        ),
+        logged AS (
+            INSERT INTO activity_log (user_id, action, details)
+            SELECT user_id, 'return_book', 'Book ID: ' || id FROM restocked
+        )
+        SELECT restocked.id AS book_id, restocked.name AS book_name, restocked.user_id,
+               next_reservation.user_id AS next_user_id, next_reservation.hold_expires_at
+        FROM restocked LEFT JOIN next_reservation ON TRUE
+        """,
+        borrow_id, user_id, config.RESERVATION_HOLD_HOURS
+    )
+
+async def bulk_checkin(conn: asyncpg.Connection, borrow_ids: list[int] = (), serials: list[str] = ()) -> dict[str, list[Row]]:
+    """
+    Пакетный возврат (стойка выдачи): закрывает открытые выдачи, заданные номерами выдач и/или
+    серийными номерами экземпляров, одним запросом. В журнал пишется 'return_book', а очередь
+    броней проходится один раз: вернувшиеся экземпляры книги по порядку откладываются для
+    самых ранних броней, остальные возвращаются на полку.
+
+    Returns:
+        dict: 'returned' — строки borrow_id, user_id, book_id, book_name, serial_number;
+              'reservations' — строки user_id, book_id, book_name, hold_expires_at для
+              уведомления о поступлении.
+    """
+    rows = await conn.fetch(
+        """
+        WITH closed AS (
+            UPDATE borrowed_books bb SET return_date = CURRENT_DATE
+            WHERE bb.return_date IS NULL
+              AND (bb.borrow_id = ANY($1::int[])
+                   OR bb.copy_id IN (SELECT id FROM book_copies WHERE serial_number = ANY($2::text[])))
+            RETURNING bb.borrow_id, bb.user_id, bb.book_id, bb.copy_id
+        ),
+        logged AS (
+            INSERT INTO activity_log (user_id, action, details)
+            SELECT user_id, 'return_book', 'Book ID: ' || book_id FROM closed
+        ),
+        returned_copies AS (
+            SELECT book_id, copy_id, row_number() OVER (PARTITION BY book_id ORDER BY copy_id) AS n
+            FROM closed WHERE copy_id IS NOT NULL
+        ),
+        queue AS (
+            -- По каждой книге из очереди читается не больше броней, чем вернулось экземпляров
+            SELECT waiting.reservation_id, counts.book_id,
+                   row_number() OVER (PARTITION BY counts.book_id ORDER BY waiting.reservation_date, waiting.reservation_id) AS n
+            FROM (SELECT book_id, COUNT(*) AS copies FROM returned_copies GROUP BY book_id) AS counts
+            CROSS JOIN LATERAL (
+                SELECT r.reservation_id, r.reservation_date FROM reservations r
+                WHERE r.book_id = counts.book_id AND NOT r.notified
+                ORDER BY r.reservation_date, r.reservation_id
+                LIMIT counts.copies
+            ) AS waiting
+        ),
+        notified AS (
+            UPDATE reservations r
+            SET notified = TRUE, copy_id = rc.copy_id, hold_expires_at = now() + make_interval(hours => $3)
+            FROM queue JOIN returned_copies rc USING (book_id, n)
+            WHERE r.reservation_id = queue.reservation_id AND NOT r.notified
+            RETURNING r.user_id, r.book_id, r.copy_id, r.hold_expires_at
+        ),
+        released AS (
+            UPDATE book_copies c SET is_available = TRUE
+            FROM returned_copies rc
+            WHERE c.id = rc.copy_id AND NOT EXISTS (SELECT 1 FROM notified WHERE notified.copy_id = c.id)
+        )
+        SELECT 'returned' AS kind, closed.borrow_id, closed.user_id, closed.book_id, b.name AS book_name,
+               c.serial_number, NULL::timestamp AS hold_expires_at
+        FROM closed
+        JOIN books b ON b.id = closed.book_id
+        LEFT JOIN book_copies c ON c.id = closed.copy_id
+        UNION ALL
+        SELECT 'reservation', NULL, notified.user_id, notified.book_id, b.name, NULL, notified.hold_expires_at
+        FROM notified JOIN books b ON b.id = notified.book_id
+        """,
+        list(borrow_ids), list(serials), config.RESERVATION_HOLD_HOURS
+    )
+    result = {'returned': [], 'reservations': []}
+    for row in rows:
+        result['returned' if row['kind'] == 'returned' else 'reservations'].append(row)
+    return result
+
+async def bulk_checkout(conn: asyncpg.Connection, user_id: int, serials: list[str]) -> list[Row]:
+    """
+    Пакетная выдача экземпляров (например, комплект для класса) одному пользователю одним
+    запросом. Лимит выдач не применяется: решение принимает библиотекарь. Занятые и
+    неизвестные серийные номера пропускаются — сравните результат с запросом.
+
+    Returns:
+        list[Row]: borrow_id, book_id, book_name, serial_number, due_date выданных экземпляров.
+    """
+    return await conn.fetch(
+        """
+        WITH requested AS (
+            SELECT id FROM book_copies
+            WHERE serial_number = ANY($2::text[]) AND is_available
+            ORDER BY id
+            FOR UPDATE
+        ),
+        taken AS (
+            UPDATE book_copies c SET is_available = FALSE
+            FROM requested WHERE c.id = requested.id AND c.is_available
+            RETURNING c.id, c.book_id, c.serial_number
+        ),
+        loans AS (
+            INSERT INTO borrowed_books (user_id, book_id, copy_id, borrow_date, due_date)
+            SELECT $1, book_id, id, CURRENT_DATE, CURRENT_DATE + $3::int FROM taken
+            RETURNING borrow_id, book_id, copy_id, due_date
+        ),
+        logged AS (
+            INSERT INTO activity_log (user_id, action, details)
+            SELECT $1, 'borrow_book', 'Book ID: ' || book_id FROM loans
+        )
+        SELECT loans.borrow_id, loans.book_id, b.name AS book_name, taken.serial_number,
+               loans.due_date::timestamp AS due_date
+        FROM loans
+        JOIN taken ON taken.id = loans.copy_id
+        JOIN books b ON b.id = loans.book_id
+        ORDER BY taken.serial_number
+        """,
+        user_id, list(serials), LOAN_PERIOD_DAYS
+    )
+
+async def borrow_book(conn: asyncpg.Connection, user_id: int, book_id: int) -> datetime:
+    """Обрабатывает взятие книги (без проверки лимита). Возвращает due_date."""
+    result = await checkout_book(conn, user_id, book_id)
+    if result['status'] != 'borrowed':
+        raise ValueError("Книга недоступна для взятия")
+    return result['due_date']
 
 async def return_book(conn: asyncpg.Connection, borrow_id: int, book_id: int) -> str:
     """Обрабатывает возврат книги."""
-    async with conn.transaction():
-        await conn.execute("UPDATE borrowed_books SET return_date = CURRENT_DATE WHERE borrow_id = $1", borrow_id)
-        await conn.execute("UPDATE books SET available_quantity = available_quantity + 1 WHERE id = $1", book_id)
+    result = await checkin_book(conn, borrow_id)
+    if not result:
+        raise NotFoundError("Открытая выдача не найдена: книга уже возвращена.")
     return "Успешно"
 
 async def add_rating(conn: asyncpg.Connection, user_id: int, book_id: int, rating: int):
@@ -356,15 +790,51 @@ async def add_rating(conn: asyncpg.Connection, user_id: int, book_id: int, ratin
         user_id, book_id, rating
     )
 
-async def get_user_ratings(conn: asyncpg.Connection, user_id: int) -> list[dict]:
+async def rate_book(conn: asyncpg.Connection, user_id: int, book_id: int, rating: int) -> int | None:
+    """
+    Добавляет или обновляет оценку и пишет 'add_rating'/'update_rating' в журнал одним запросом.
+    Возвращает предыдущую оценку (None, если книга оценивается впервые).
+    """
+    return await conn.fetchval(
+        """
+        WITH previous AS (
+            SELECT rating FROM ratings WHERE user_id = $1 AND book_id = $2
+        ),
+        upserted AS (
+            INSERT INTO ratings (user_id, book_id, rating) VALUES ($1, $2, $3)
+            ON CONFLICT (user_id, book_id) DO UPDATE SET rating = EXCLUDED.rating
+        ),
+        logged AS (
+            INSERT INTO activity_log (user_id, action, details)
+            SELECT $1,
+                   CASE WHEN EXISTS (SELECT 1 FROM previous) THEN 'update_rating' ELSE 'add_rating' END,
+                   'Book ID: ' || $2::int || ', Rating: ' || $3::int
+        )
+        SELECT rating FROM previous
+        """,
+        user_id, book_id, rating
+    )
+
+async def get_user_rating(conn: asyncpg.Connection, user_id: int, book_id: int) -> int | None:
+    """Возвращает текущую оценку пользователя для книги или None."""
+    return await conn.fetchval("SELECT rating FROM ratings WHERE user_id = $1 AND book_id = $2", user_id, book_id)
+
+async def has_borrowed_book(conn: asyncpg.Connection, user_id: int, book_id: int) -> bool:
+    """Проверяет, брал ли пользователь книгу хотя бы раз."""
+    return await conn.fetchval(
+        "SELECT EXISTS (SELECT 1 FROM borrowed_books WHERE user_id = $1 AND book_id = $2)",
+        user_id, book_id
+    )
+
+async def get_user_ratings(conn: asyncpg.Connection, user_id: int) -> list[Row]:
     """Возвращает историю оценок пользователя (книга и оценка)."""
     rows = await conn.fetch(
         "SELECT b.name as book_name, r.rating FROM ratings r JOIN books b ON r.book_id = b.id WHERE r.user_id = $1 ORDER BY b.name",
         user_id
     )
-    return _records_to_list_of_dicts(rows)
+    return _rows(rows)
 
-async def get_top_rated_books(conn: asyncpg.Connection, limit: int = 10) -> list[dict]:
+async def get_top_rated_books(conn: asyncpg.Connection, limit: int = 10) -> list[Row]:
     """
     Возвращает список книг с самым высоким средним рейтингом.
     Теперь включает книги с ОДНОЙ или более оценками.
@@ -387,23 +857,49 @@ async def get_top_rated_books(conn: asyncpg.Connection, limit: int = 10) -> list
         LIMIT $1
         """, limit
     )
-    return _records_to_list_of_dicts(rows)
+    return _rows(rows)
 
-async def extend_due_date(conn: asyncpg.Connection, borrow_id: int) -> datetime | str:
-    """Продлевает срок возврата книги, если это возможно."""
-    async with conn.transaction():
-        borrow_info = await conn.fetchrow("SELECT book_id, extensions_count FROM borrowed_books WHERE borrow_id = $1 FOR UPDATE", borrow_id)
-        if not borrow_info:
-            return "Запись о взятии книги не найдена."
-        if borrow_info['extensions_count'] >= 1:
-            return "Вы уже продлевали эту книгу. Повторное продление невозможно."
-        has_reservation = await conn.fetchval("SELECT 1 FROM reservations WHERE book_id = $1 AND notified = FALSE", borrow_info['book_id'])
-        if has_reservation:
-            return "Невозможно продлить: эту книгу уже зарезервировал другой читатель."
-        return await conn.fetchval(
-            "UPDATE borrowed_books SET due_date = due_date + INTERVAL '7 day', extensions_count = extensions_count + 1 WHERE borrow_id = $1 RETURNING due_date",
-            borrow_id
+async def extend_due_date(conn: asyncpg.Connection, borrow_id: int, user_id: int | None = None) -> datetime | str:
+    """
+    Продлевает срок возврата открытой выдачи (один раз и только если на книгу нет брони)
+    и пишет 'extend_book' в журнал, одним запросом. Если передан user_id, выдача должна
+    принадлежать этому пользователю. Возвращает новый due_date или текст причины отказа.
+    """
+    row = await conn.fetchrow(
+        """
+        WITH loan AS (
+            SELECT borrow_id, book_id, extensions_count FROM borrowed_books
+            WHERE borrow_id = $1 AND return_date IS NULL AND ($2::int IS NULL OR user_id = $2)
+        ),
+        reserved AS (
+            -- Одна проба по частичному индексу очереди (idx_reservations_queue)
+            SELECT EXISTS (
+                SELECT 1 FROM reservations r JOIN loan ON r.book_id = loan.book_id WHERE NOT r.notified
+            ) AS has_reservation
+        ),
+        extended AS (
+            UPDATE borrowed_books bb
+            SET due_date = bb.due_date + $3::int, extensions_count = bb.extensions_count + 1
+            FROM loan, reserved
+            WHERE bb.borrow_id = loan.borrow_id AND bb.extensions_count < 1 AND NOT reserved.has_reservation
+            RETURNING bb.user_id, bb.book_id, bb.due_date
+        ),
+        logged AS (
+            INSERT INTO activity_log (user_id, action, details)
+            SELECT user_id, 'extend_book', 'Book ID: ' || book_id FROM extended
         )
+        SELECT loan.extensions_count, reserved.has_reservation, extended.due_date::timestamp AS due_date
+        FROM loan CROSS JOIN reserved LEFT JOIN extended ON TRUE
+        """,
+        borrow_id, user_id, EXTENSION_DAYS
+    )
+    if not row:
+        return "Запись о взятии книги не найдена."
+    if row['due_date'] is not None:
+        return row['due_date']
+    if row['has_reservation']:
+        return "Невозможно продлить: эту книгу уже зарезервировал другой читатель."
+    return "Вы уже продлевали эту книгу. Повторное продление невозможно."
 
 async def create_book_request(conn: asyncpg.Connection, user_id: int, request_data: dict) -> int:
     """Создает запрос на добавление новой книги от пользователя."""
@@ -422,26 +918,31 @@ async def create_book_request(conn: asyncpg.Connection, user_id: int, request_da
     return request_id
 
 
-async def get_pending_book_requests(conn: asyncpg.Connection) -> list[dict]:
+_PENDING_BOOK_REQUESTS_QUERY = """
+    SELECT br.id, br.book_name, br.author_name, br.genre, br.description,
+           br.created_at, u.username, u.full_name, u.telegram_id
+    FROM book_requests br
+    JOIN users u ON br.user_id = u.id
+    WHERE br.status = 'pending'
+    ORDER BY br.created_at DESC
+"""
+
+async def get_pending_book_requests(conn: asyncpg.Connection) -> list[Row]:
     """Получает все ожидающие запросы на книги."""
-    rows = await conn.fetch(
-        """
-        SELECT br.id, br.book_name, br.author_name, br.genre, br.description,
-               br.created_at, u.username, u.full_name, u.telegram_id
-        FROM book_requests br
-        JOIN users u ON br.user_id = u.id
-        WHERE br.status = 'pending'
-        ORDER BY br.created_at DESC
-        """
-    )
-    return _records_to_list_of_dicts(rows)
+    rows = await conn.fetch(_PENDING_BOOK_REQUESTS_QUERY)
+    return _rows(rows)
 
+async def count_pending_book_requests(conn: asyncpg.Connection) -> int:
+    """Возвращает количество ожидающих запросов на книги."""
+    return await conn.fetchval("SELECT COUNT(*) FROM book_requests WHERE status = 'pending'") or 0
 
-async def approve_book_request(conn: asyncpg.Connection, request_id: int) -> dict:
+
+async def approve_book_request(conn: asyncpg.Connection, request_id: int) -> Row:
     """Одобряет запрос и возвращает данные для добавления книги."""
     async with conn.transaction():
         request_data = await conn.fetchrow(
-            "SELECT * FROM book_requests WHERE id = $1",
+            "SELECT id, user_id, book_name, author_name, genre, description, status, created_at "
+            "FROM book_requests WHERE id = $1",
             request_id
         )
         
@@ -453,7 +954,7 @@ async def approve_book_request(conn: asyncpg.Connection, request_id: int) -> dic
             request_id
         )
         
-        return _record_to_dict(request_data)
+        return _row(request_data)
 
 
 async def reject_book_request(conn: asyncpg.Connection, request_id: int, reason: str = None):
@@ -463,7 +964,7 @@ async def reject_book_request(conn: asyncpg.Connection, request_id: int, reason:
         reason, request_id
     )
 
-async def get_all_ratings_paginated(conn: asyncpg.Connection, limit: int, offset: int) -> tuple[list, int]:
+async def get_all_ratings_paginated(conn: asyncpg.Connection, limit: int, offset: int) -> tuple[list[Row], int]:
     """Возвращает постраничный список всех оценок с деталями."""
     total = await conn.fetchval("SELECT COUNT(*) FROM ratings")
     
@@ -487,7 +988,7 @@ async def get_all_ratings_paginated(conn: asyncpg.Connection, limit: int, offset
         limit, offset
     )
     
-    return _records_to_list_of_dicts(rows), total or 0
+    return _rows(rows), total or 0
 
 
 async def get_rating_statistics(conn: asyncpg.Connection) -> dict:
@@ -525,18 +1026,136 @@ async def get_rating_statistics(conn: asyncpg.Connection) -> dict:
 # ==============================================================================
 
 async def add_reservation(conn: asyncpg.Connection, user_id: int, book_id: int) -> str:
-    """Добавляет запись о бронировании книги."""
+    """Ставит пользователя в очередь на книгу. Возвращает сообщение с местом в очереди."""
     try:
-        await conn.execute("INSERT INTO reservations (user_id, book_id) VALUES ($1, $2)", user_id, book_id)
-        return "Книга успешно зарезервирована."
+        position = await conn.fetchval(
+            """
+            WITH added AS (
+                INSERT INTO reservations (user_id, book_id) VALUES ($1, $2)
+                ON CONFLICT (user_id, book_id) DO NOTHING
+                RETURNING reservation_id
+            )
+            SELECT (SELECT COUNT(*) FROM reservations WHERE book_id = $2 AND NOT notified) + 1 FROM added
+            """,
+            user_id, book_id
+        )
     except asyncpg.IntegrityConstraintViolationError:
         return "Вы уже зарезервировали эту книгу."
+    if position is None:
+        return "Вы уже зарезервировали эту книгу."
+    return f"Книга успешно зарезервирована. Ваше место в очереди: {position}."
 
 async def get_reservations_for_book(conn: asyncpg.Connection, book_id: int) -> list[int]:
-    """Получает ID пользователей, зарезервировавших книгу."""
-    records = await conn.fetch("SELECT user_id FROM reservations WHERE book_id = $1 AND notified = FALSE ORDER BY reservation_date", book_id)
+    """Возвращает ID пользователей в очереди на книгу (без уже уведомленных), по порядку."""
+    records = await conn.fetch(
+        "SELECT user_id FROM reservations WHERE book_id = $1 AND NOT notified ORDER BY reservation_date, reservation_id",
+        book_id
+    )
     return [r['user_id'] for r in records]
 
+async def get_reservation_position(conn: asyncpg.Connection, user_id: int, book_id: int) -> int | None:
+    """
+    Возвращает место пользователя в очереди на книгу (с 1) или None, если он не в очереди
+    (нет брони или экземпляр уже отложен для него).
+    """
+    return await conn.fetchval(
+        """
+        SELECT (
+            SELECT COUNT(*) FROM reservations q
+            WHERE q.book_id = me.book_id AND NOT q.notified
+              AND (q.reservation_date, q.reservation_id) < (me.reservation_date, me.reservation_id)
+        ) + 1
+        FROM reservations me
+        WHERE me.user_id = $1 AND me.book_id = $2 AND NOT me.notified
+        """,
+        user_id, book_id
+    )
+
+async def get_user_reservations(conn: asyncpg.Connection, user_id: int) -> list[Row]:
+    """
+    Возвращает брони пользователя: book_id, book_name, position (место в очереди, None для
+    отложенного экземпляра) и hold_expires_at (до какого момента экземпляр отложен).
+    """
+    rows = await conn.fetch(
+        """
+        SELECT me.book_id, b.name AS book_name, me.hold_expires_at,
+               CASE WHEN NOT me.notified THEN (
+                   SELECT COUNT(*) FROM reservations q
+                   WHERE q.book_id = me.book_id AND NOT q.notified
+                     AND (q.reservation_date, q.reservation_id) < (me.reservation_date, me.reservation_id)
+               ) + 1 END AS position
+        FROM reservations me
+        JOIN books b ON b.id = me.book_id
+        WHERE me.user_id = $1 AND (NOT me.notified OR me.hold_expires_at > now())
+        ORDER BY me.notified DESC, me.reservation_date
+        """,
+        user_id
+    )
+    return _rows(rows)
+
+async def expire_reservation_holds(conn: asyncpg.Connection, limit: int | None = None) -> dict[str, list[Row]]:
+    """
+    Снимает просроченные отложения (не больше limit за вызов) и передает экземпляры следующим
+    в очереди на новый срок; экземпляры книг, которые больше никто не ждет, возвращаются на
+    полку. Выполняется одним запросом, параллельные вызовы не мешают друг другу (SKIP LOCKED).
+
+    Returns:
+        dict: 'expired' — строки user_id, book_id, book_name снятых броней;
+              'passed' — строки user_id, book_id, book_name, hold_expires_at новых отложений.
+    """
+    rows = await conn.fetch(
+        """
+        WITH expired AS (
+            DELETE FROM reservations
+            WHERE reservation_id IN (
+                SELECT reservation_id FROM reservations
+                WHERE notified AND hold_expires_at <= now()
+                ORDER BY hold_expires_at
+                LIMIT $1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING user_id, book_id, copy_id
+        ),
+        freed_copies AS (
+            SELECT book_id, copy_id, row_number() OVER (PARTITION BY book_id ORDER BY copy_id) AS n
+            FROM expired WHERE copy_id IS NOT NULL
+        ),
+        queue AS (
+            SELECT waiting.reservation_id, counts.book_id,
+                   row_number() OVER (PARTITION BY counts.book_id ORDER BY waiting.reservation_date, waiting.reservation_id) AS n
+            FROM (SELECT book_id, COUNT(*) AS copies FROM freed_copies GROUP BY book_id) AS counts
+            CROSS JOIN LATERAL (
+                SELECT r.reservation_id, r.reservation_date FROM reservations r
+                WHERE r.book_id = counts.book_id AND NOT r.notified
+                ORDER BY r.reservation_date, r.reservation_id
+                LIMIT counts.copies
+            ) AS waiting
+        ),
+        passed AS (
+            UPDATE reservations r
+            SET notified = TRUE, copy_id = fc.copy_id, hold_expires_at = now() + make_interval(hours => $2)
+            FROM queue JOIN freed_copies fc USING (book_id, n)
+            WHERE r.reservation_id = queue.reservation_id AND NOT r.notified
+            RETURNING r.user_id, r.book_id, r.copy_id, r.hold_expires_at
+        ),
+        released AS (
+            UPDATE book_copies c SET is_available = TRUE
+            FROM freed_copies fc
+            WHERE c.id = fc.copy_id AND NOT EXISTS (SELECT 1 FROM passed WHERE passed.copy_id = c.id)
+        )
+        SELECT 'expired' AS kind, expired.user_id, expired.book_id, b.name AS book_name, NULL::timestamp AS hold_expires_at
+        FROM expired JOIN books b ON b.id = expired.book_id
+        UNION ALL
+        SELECT 'passed', passed.user_id, passed.book_id, b.name, passed.hold_expires_at
+        FROM passed JOIN books b ON b.id = passed.book_id
+        """,
+        limit or config.RESERVATION_SWEEP_BATCH, config.RESERVATION_HOLD_HOURS
+    )
+    result = {'expired': [], 'passed': []}
+    for row in rows:
+        result[row['kind']].append(row)
+    return result
+
 async def update_reservation_status(conn: asyncpg.Connection, user_id: int, book_id: int, notified: bool):
     """Обновляет статус уведомления для брони."""
     await conn.execute("UPDATE reservations SET notified = $1 WHERE user_id = $2 AND book_id = $3 AND notified = FALSE", notified, user_id, book_id)
@@ -545,68 +1164,185 @@ async def create_notification(conn: asyncpg.Connection, user_id: int, text: str,
     """Сохраняет новое уведомление для пользователя в базу данных."""
     await conn.execute("INSERT INTO notifications (user_id, text, category) VALUES ($1, $2, $3)", user_id, text, category)
 
-async def get_notifications_for_user(conn: asyncpg.Connection, user_id: int, limit: int = 20) -> list[dict]:
+# Статусы, после которых повторная доставка уведомления не выполняется.
+NOTIFICATION_FINAL_STATUSES = ('sent', 'blocked', 'failed')
+
+async def begin_notification_delivery(conn: asyncpg.Connection, user_id: int, text: str, category: str,
+                                      idempotency_key: str | None = None) -> Row:
+    """
+    Регистрирует попытку доставки уведомления в журнале и захватывает запись на время аренды.
+    Для уже известного ключа новая строка не создается: запись захватывается атомарно, если
+    предыдущая попытка завершилась ошибкой ('timed_out') или ее аренда истекла, и тогда
+    увеличивается счетчик попыток. Возвращает id, status, attempts, telegram_message_id и claimed;
+    при claimed = FALSE уведомление уже доставлено или его доставляет другой обработчик.
+    """
+    try:
+        row = await conn.fetchrow("""
+            INSERT INTO notifications (user_id, text, category, idempotency_key, attempts, claimed_at)
+            VALUES ($1, $2, $3, $4, 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (idempotency_key) DO UPDATE
+                SET attempts = notifications.attempts + 1, status = 'pending', claimed_at = CURRENT_TIMESTAMP
+                WHERE notifications.status = 'timed_out'
+                   OR (notifications.status = 'pending'
+                       AND (notifications.claimed_at IS NULL
+                            OR notifications.claimed_at < CURRENT_TIMESTAMP - make_interval(secs => $5)))
+            RETURNING id, status, attempts, telegram_message_id, TRUE AS claimed
+        """, user_id, text, category, idempotency_key, config.NOTIFICATION_CLAIM_LEASE)
+    except asyncpg.exceptions.ForeignKeyViolationError:
+        raise NotFoundError(f"Пользователь с ID {user_id} не найден.")
+    if row is None:
+        # Уведомление с этим ключом уже доставлено (или отклонено) ранее, либо его аренда еще действует
+        row = await conn.fetchrow("""
+            SELECT id, status, attempts, telegram_message_id, FALSE AS claimed
+            FROM notifications WHERE idempotency_key = $1
+        """, idempotency_key)
+    return _row(row)
+
+async def mark_notification_sent(conn: asyncpg.Connection, notification_id: int, telegram_message_id: int):
+    """Отмечает уведомление как доставленное и сохраняет id сообщения в Telegram."""
+    await conn.execute("""
+        UPDATE notifications SET status = 'sent', telegram_message_id = $2, sent_at = CURRENT_TIMESTAMP, last_error = NULL
+        WHERE id = $1
+    """, notification_id, telegram_message_id)
+
+async def mark_notification_failed(conn: asyncpg.Connection, notification_id: int, status: str, error: str | None = None):
+    """Отмечает неудачную попытку доставки: 'blocked', 'failed' или 'timed_out' (будет повтор)."""
+    await conn.execute(
+        "UPDATE notifications SET status = $2, last_error = $3 WHERE id = $1 AND status <> 'sent'",
+        notification_id, status, error
+    )
+
+async def mark_notifications_read(conn: asyncpg.Connection, user_id: int) -> int:
+    """Отмечает все уведомления пользователя прочитанными. Возвращает число отмеченных."""
+    status = await conn.execute(
+        "UPDATE notifications SET is_read = TRUE WHERE user_id = $1 AND is_read IS NOT TRUE", user_id
+    )
+    return int(status.split()[-1])
+
+async def get_notifications_for_user(conn: asyncpg.Connection, user_id: int, limit: int = 20) -> list[Row]:
     """Возвращает последние уведомления для пользователя."""
     rows = await conn.fetch("SELECT text, category, created_at, is_read FROM notifications WHERE user_id = $1 ORDER BY created_at DESC LIMIT $2", user_id, limit)
     if not rows:
         raise NotFoundError("Уведомлений для этого пользователя не найдено.")
-    return _records_to_list_of_dicts(rows)
+    return _rows(rows)
 
 async def log_activity(conn: asyncpg.Connection, user_id: int, action: str, details: str = None):
     """Записывает действие пользователя в журнал активности."""
     await conn.execute("INSERT INTO activity_log (user_id, action, details) VALUES ($1, $2, $3)", user_id, action, details)
 
-async def get_user_activity(conn: asyncpg.Connection, user_id: int, limit: int, offset: int) -> tuple[list, int]:
-    """Возвращает порцию логов активности для пользователя и их общее количество."""
-    total = await conn.fetchval("SELECT COUNT(*) FROM activity_log WHERE user_id = $1", user_id)
-    rows = await conn.fetch("SELECT action, details, timestamp FROM activity_log WHERE user_id = $1 ORDER BY timestamp DESC LIMIT $2 OFFSET $3", user_id, limit, offset)
-    return _records_to_list_of_dicts(rows), total or 0
+# Допустимые фильтры журнала активности: имя фильтра -> условие (подставляется номер параметра)
+_ACTIVITY_FILTERS = {
+    'action': "a.action = ${}",
+    'user_id': "a.user_id = ${}",
+    'book_id': "a.book_id = ${}",
+    'since': "a.timestamp >= ${}",
+    'until': "a.timestamp < ${}",
+}
+
+_ACTIVITY_COLUMNS = "a.id, a.timestamp, a.user_id, u.username, a.action, a.book_id, a.details"
+
+def _activity_where(filters: dict) -> tuple[str, list]:
+    """Собирает условие WHERE и параметры из заданных фильтров (None — фильтр не задан)."""
+    conditions, args = [], []
+    for name, condition in _ACTIVITY_FILTERS.items():
+        if filters.get(name) is not None:
+            args.append(filters[name])
+            conditions.append(condition.format(len(args)))
+    return " AND ".join(conditions) or "TRUE", args
+
+async def get_activity_page(conn: asyncpg.Connection, filters: dict, before: tuple | None = None, limit: int = 20) -> list[Row]:
+    """
+    Возвращает страницу журнала активности по фильтрам (action, user_id, book_id, since, until),
+    от новых к старым. Пагинация по ключу: `before` — (timestamp, id) последней строки
+    предыдущей страницы; без OFFSET и COUNT, поэтому глубина страницы не влияет на скорость.
+    """
+    where, args = _activity_where(filters)
+    if before is not None:
+        args.extend(before)
+        where += f" AND (a.timestamp, a.id) < (${len(args) - 1}, ${len(args)})"
+    args.append(limit)
+    rows = await conn.fetch(
+        f"""
+        SELECT {_ACTIVITY_COLUMNS}
+        FROM activity_log a LEFT JOIN users u ON u.id = a.user_id
+        WHERE {where}
+        ORDER BY a.timestamp DESC, a.id DESC
+        LIMIT ${len(args)}
+        """,
+        *args
+    )
+    return _rows(rows)
 
-async def get_users_with_overdue_books(conn: asyncpg.Connection) -> list[dict]:
+async def get_activity_actions(conn: asyncpg.Connection) -> list[str]:
+    """
+    Возвращает список различных действий в журнале. Рекурсивный запрос перескакивает
+    по индексу idx_activity_log_action_time от значения к значению, не читая весь журнал.
+    """
+    rows = await conn.fetch(
+        """
+        WITH RECURSIVE actions AS (
+            (SELECT action FROM activity_log ORDER BY action LIMIT 1)
+            UNION ALL
+            SELECT (SELECT action FROM activity_log WHERE action > actions.action ORDER BY action LIMIT 1)
+            FROM actions WHERE actions.action IS NOT NULL
+        )
+        SELECT action FROM actions WHERE action IS NOT NULL
+        """
+    )
+    return [row['action'] for row in rows]
+
+_OVERDUE_BOOKS_QUERY = """
+    SELECT u.id as user_id, u.username, u.telegram_id, u.bot_blocked, b.name as book_name, bb.due_date, bb.borrow_id
+    FROM borrowed_books bb JOIN users u ON bb.user_id = u.id JOIN books b ON bb.book_id = b.id
+    WHERE bb.return_date IS NULL AND bb.due_date < CURRENT_DATE
+"""
+
+_BOOKS_DUE_SOON_QUERY = """
+    SELECT u.id as user_id, u.telegram_id, u.bot_blocked, b.name as book_name, bb.due_date, bb.borrow_id
+    FROM borrowed_books bb JOIN users u ON bb.user_id = u.id JOIN books b ON bb.book_id = b.id
+    WHERE bb.return_date IS NULL AND bb.due_date = CURRENT_DATE + make_interval(days => $1)
+"""
+
+async def get_users_with_overdue_books(conn: asyncpg.Connection) -> list[Row]:
     """Возвращает пользователей с просроченными книгами."""
-    rows = await conn.fetch("""
-        SELECT u.id as user_id, u.username, b.name as book_name, bb.due_date
-        FROM borrowed_books bb JOIN users u ON bb.user_id = u.id JOIN books b ON bb.book_id = b.id
-        WHERE bb.return_date IS NULL AND bb.due_date < CURRENT_DATE
-    """)
-    return _records_to_list_of_dicts(rows)
+    rows = await conn.fetch(_OVERDUE_BOOKS_QUERY)
+    return _rows(rows)
 
-async def get_users_with_books_due_soon(conn: asyncpg.Connection, days_ahead: int = 2) -> list[dict]:
+async def get_users_with_books_due_soon(conn: asyncpg.Connection, days_ahead: int = 2) -> list[Row]:
     """Возвращает пользователей, у которых срок возврата истекает через 'days_ahead' дней."""
-    rows = await conn.fetch("""
-        SELECT u.id as user_id, b.name as book_name, bb.due_date, bb.borrow_id
-        FROM borrowed_books bb JOIN users u ON bb.user_id = u.id JOIN books b ON bb.book_id = b.id
-        WHERE bb.return_date IS NULL AND bb.due_date = CURRENT_DATE + make_interval(days => $1)
-    """, days_ahead)
-    return _records_to_list_of_dicts(rows)
-
-async def get_all_authors_paginated(conn: asyncpg.Connection, limit: int, offset: int) -> tuple[list, int]:
-    """Возвращает постраничный список авторов с количеством их книг."""
-    total = await conn.fetchval("SELECT COUNT(*) FROM authors a JOIN books b ON a.id = b.author_id")
-    rows = await conn.fetch("""
-        SELECT a.id, a.name, COUNT(b.id) as books_count,
-               SUM(CASE WHEN b.available_quantity > 0 THEN 1 ELSE 0 END) as available_books_count
-        FROM authors a LEFT JOIN books b ON a.id = b.author_id
-        GROUP BY a.id, a.name HAVING COUNT(b.id) > 0
+    rows = await conn.fetch(_BOOKS_DUE_SOON_QUERY, days_ahead)
+    return _rows(rows)
+
+_AUTHOR_AVG_RATING = "round(a.rating_sum::numeric / NULLIF(a.rating_count, 0), 1)"
+
+async def get_all_authors_paginated(conn: asyncpg.Connection, limit: int, offset: int) -> tuple[list[Row], int]:
+    """
+    Возвращает постраничный список авторов, у которых есть книги, и общее число таких авторов.
+    Счетчики хранятся в authors (обновляются триггерами), список читается по индексу idx_authors_listing.
+    """
+    total = await conn.fetchval("SELECT COUNT(*) FROM authors WHERE book_count > 0")
+    rows = await conn.fetch(f"""
+        SELECT a.id, a.name, a.book_count as books_count, a.available_books as available_books_count,
+               {_AUTHOR_AVG_RATING} as avg_rating, a.rating_count as ratings_count
+        FROM authors a WHERE a.book_count > 0
         ORDER BY a.name LIMIT $1 OFFSET $2
     """, limit, offset)
-    return _records_to_list_of_dicts(rows), total or 0
-
-async def get_author_details(conn: asyncpg.Connection, author_id: int) -> dict:
-    """Возвращает детальную информацию об авторе."""
-    row = await conn.fetchrow("""
-        SELECT a.id, a.name, COUNT(b.id) as total_books,
-               SUM(CASE WHEN b.available_quantity > 0 THEN 1 ELSE 0 END) as available_books_count
-        FROM authors a LEFT JOIN books b ON a.id = b.author_id
-        WHERE a.id = $1 GROUP BY a.id, a.name
+    return _rows(rows), total or 0
+
+async def get_author_details(conn: asyncpg.Connection, author_id: int) -> Row:
+    """Возвращает детальную информацию об авторе по готовым счетчикам."""
+    row = await conn.fetchrow(f"""
+        SELECT a.id, a.name, a.book_count as total_books, a.available_books as available_books_count,
+               {_AUTHOR_AVG_RATING} as avg_rating, a.rating_count as ratings_count
+        FROM authors a WHERE a.id = $1
     """, author_id)
     if not row:
         raise NotFoundError("Автор не найден.")
-    return _record_to_dict(row)
+    return _row(row)
 
-async def get_books_by_author(conn: asyncpg.Connection, author_id: int, limit: int = 10, offset: int = 0) -> tuple[list, int]:
+async def get_books_by_author(conn: asyncpg.Connection, author_id: int, limit: int = 10, offset: int = 0) -> tuple[list[Row], int]:
     """Возвращает книги конкретного автора с пагинацией."""
-    total = await conn.fetchval("SELECT COUNT(*) FROM books WHERE author_id = $1", author_id)
+    total = await conn.fetchval("SELECT book_count FROM authors WHERE id = $1", author_id)
     rows = await conn.fetch("""
         SELECT b.id, b.name, b.genre, b.description, (b.available_quantity > 0) as is_available,
                AVG(r.rating) as avg_rating, COUNT(r.rating) as ratings_count
@@ -615,17 +1351,226 @@ async def get_books_by_author(conn: asyncpg.Connection, author_id: int, limit: i
         GROUP BY b.id, b.name, b.genre, b.description
         ORDER BY b.name LIMIT $2 OFFSET $3
     """, author_id, limit, offset)
-    return _records_to_list_of_dicts(rows), total or 0
+    return _rows(rows), total or 0
 
-async def check_telegram_id_exists(conn: asyncpg.Connection, telegram_id: int) -> dict | None:
+async def check_telegram_id_exists(conn: asyncpg.Connection, telegram_id: int) -> Row | None:
     """
     Проверяет, существует ли уже пользователь с данным telegram_id.
     
     Returns:
-        dict: Данные пользователя если найден, None если не найден
+        Row: Данные пользователя если найден, None если не найден
     """
     row = await conn.fetchrow(
         "SELECT id, username, full_name FROM users WHERE telegram_id = $1",
         telegram_id
     )
-    return _record_to_dict(row) if row else None
\ No newline at end of file
+    return _row(row)
+
+# ==============================================================================
+# --- Функции для OUTBOX уведомлений (Transactional Outbox) ---
+# ==============================================================================
+# Уведомления и задачи Celery не публикуются из обработчиков напрямую: они
+# записываются в notification_outbox в той же транзакции, что и бизнес-изменение,
+# а ретранслятор (src/core/outbox.py) пачками переносит их в очередь доставки.
+
+OUTBOX_NOTIFY_USER = 'src.core.tasks.notify_user'
+OUTBOX_NOTIFY_ADMIN = 'src.core.tasks.notify_admin'
+OUTBOX_BROADCAST_NEW_BOOK = 'src.core.tasks.broadcast_new_book'
+OUTBOX_REBUILD_CATALOG_INDEX = 'src.core.tasks.rebuild_catalog_index'
+
+async def enqueue_outbox_task(conn: asyncpg.Connection, task_name: str, payload: dict) -> int:
+    """Ставит задачу Celery в outbox. Публикация произойдет только после коммита."""
+    return await conn.fetchval(
+        "INSERT INTO notification_outbox (task_name, payload) VALUES ($1, $2::jsonb) RETURNING id",
+        task_name, json.dumps(payload, ensure_ascii=False)
+    )
+
+async def enqueue_user_notification(conn: asyncpg.Connection, user_id: int, text: str, category: str = 'system',
+                                    button_text: str = None, button_callback: str = None) -> int:
+    """Ставит в outbox уведомление пользователю."""
+    payload = {'user_id': user_id, 'text': text, 'category': category}
+    if button_text and button_callback:
+        payload.update(button_text=button_text, button_callback=button_callback)
+    return await enqueue_outbox_task(conn, OUTBOX_NOTIFY_USER, payload)
+
+async def enqueue_admin_notification(conn: asyncpg.Connection, text: str, category: str = 'audit', user_id: int = None) -> int:
+    """Ставит в outbox уведомление администратору."""
+    payload = {'text': text, 'category': category}
+    if user_id:
+        payload['user_id'] = user_id
+    return await enqueue_outbox_task(conn, OUTBOX_NOTIFY_ADMIN, payload)
+
+async def enqueue_catalog_index_rebuild(conn: asyncpg.Connection) -> int:
+    """Ставит в outbox перестройку индекса inline-поиска после изменения каталога."""
+    return await enqueue_outbox_task(conn, OUTBOX_REBUILD_CATALOG_INDEX, {})
+
+async def enqueue_bulk_user_notifications(conn: asyncpg.Connection, user_ids: list[int], text: str, category: str,
+                                          button_text: str = None, button_callback: str = None) -> int:
+    """
+    Ставит в outbox одинаковое уведомление для множества пользователей одним запросом.
+    chat_id получателей разрешается тут же, чтобы при доставке не искать его для каждого сообщения.
+    """
+    if not user_ids:
+        return 0
+    status = await conn.execute(
+        """
+        INSERT INTO notification_outbox (task_name, payload)
+        SELECT $1, jsonb_strip_nulls(jsonb_build_object(
+            'user_id', uid, 'text', $3::text, 'category', $4::text,
+            'button_text', $5::text, 'button_callback', $6::text,
+            'chat_id', CASE WHEN u.bot_blocked IS NOT TRUE THEN u.telegram_id END
+        ))
+        FROM unnest($2::int[]) WITH ORDINALITY AS t(uid, ord)
+        LEFT JOIN users u ON u.id = t.uid
+        ORDER BY ord
+        """,
+        OUTBOX_NOTIFY_USER, user_ids, text, category, button_text, button_callback
+    )
+    return int(status.split()[-1])
+
+async def enqueue_user_notifications(conn: asyncpg.Connection, notifications: list[dict]) -> int:
+    """
+    Ставит в outbox набор разных уведомлений пользователям одним запросом. Каждый элемент —
+    аргументы notify_user (user_id, text, category, необязательные button_text/button_callback);
+    chat_id получателей разрешается тут же.
+    """
+    if not notifications:
+        return 0
+    status = await conn.execute(
+        """
+        INSERT INTO notification_outbox (task_name, payload)
+        SELECT $1, t.payload || jsonb_strip_nulls(jsonb_build_object(
+            'chat_id', CASE WHEN u.bot_blocked IS NOT TRUE THEN u.telegram_id END
+        ))
+        FROM unnest($2::jsonb[]) WITH ORDINALITY AS t(payload, ord)
+        LEFT JOIN users u ON u.id = (t.payload->>'user_id')::int
+        ORDER BY ord
+        """,
+        OUTBOX_NOTIFY_USER, [json.dumps(n, ensure_ascii=False) for n in notifications]
+    )
+    return int(status.split()[-1])
+
+async def enqueue_broadcast_to_all_users(conn: asyncpg.Connection, text: str, category: str = 'broadcast') -> int:
+    """
+    Ставит в outbox уведомление для всех пользователей, которым можно отправлять рассылки.
+    Получатели выбираются прямо в INSERT ... SELECT, без загрузки списка id в приложение.
+    """
+    status = await conn.execute(
+        """
+        INSERT INTO notification_outbox (task_name, payload)
+        SELECT $1, jsonb_build_object('user_id', id, 'text', $2::text, 'category', $3::text, 'chat_id', telegram_id)
+        FROM users
+        WHERE telegram_id IS NOT NULL AND bot_blocked IS NOT TRUE
+        ORDER BY id
+        """,
+        OUTBOX_NOTIFY_USER, text, category
+    )
+    return int(status.split()[-1])
+
+async def claim_outbox_batch(conn: asyncpg.Connection, limit: int) -> list[dict]:
+    """
+    Забирает из outbox порцию записей в порядке их создания.
+    Вызывается внутри транзакции: записи удаляются только при ее коммите,
+    параллельные ретрансляторы пропускают заблокированные строки.
+    """
+    rows = await conn.fetch(
+        """
+        DELETE FROM notification_outbox
+        WHERE id IN (
+            SELECT id FROM notification_outbox ORDER BY id LIMIT $1 FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, task_name, payload
+        """,
+        limit
+    )
+    return sorted(
+        ({'id': r['id'], 'task_name': r['task_name'], 'payload': json.loads(r['payload'])} for r in rows),
+        key=lambda r: r['id']
+    )
+
+# ==============================================================================
+# --- Потоковое чтение для массовых задач (Server-side cursors) ---
+# ==============================================================================
+# Функции iter_* читают результат через серверный курсор порциями по `prefetch` строк,
+# поэтому память не растет с числом пользователей и выдач. Курсор живет только внутри
+# транзакции: если вызывающий код ее не открыл, она открывается здесь.
+# Прерывая итерацию досрочно, оборачивайте генератор в contextlib.aclosing().
+# Получатели массовых рассылок читаются иначе — порциями по ключу (keyset), отдельным
+# запросом на порцию: продюсер ждет разгрузки очереди между порциями, и открытая на это
+# время транзакция держала бы снимок и мешала VACUUM.
+
+async def _iter_records(conn: asyncpg.Connection, query: str, *args, prefetch: int | None = None) -> AsyncIterator[Row]:
+    """Итерирует строки запроса через серверный курсор."""
+    prefetch = prefetch or config.DB_CURSOR_PREFETCH
+    if conn.is_in_transaction():
+        async for record in conn.cursor(query, *args, prefetch=prefetch):
+            yield record
+        return
+    async with conn.transaction():
+        async for record in conn.cursor(query, *args, prefetch=prefetch):
+            yield record
+
+async def _iter_keyset_batches(conn: asyncpg.Connection, query: str, key: str, column: str, *args,
+                               batch_size: int | None = None) -> AsyncIterator[list[Row]]:
+    """
+    Итерирует строки запроса порциями по `batch_size`, продолжая после последнего значения ключа.
+    `query` заканчивается условием WHERE, к нему добавляется `column > ...`; `key` — имя столбца
+    результата с этим значением. Между порциями транзакция не открыта.
+    """
+    batch_size = batch_size or config.DB_CURSOR_PREFETCH
+    n = len(args)
+    page_query = f"{query} AND {column} > ${n + 1} ORDER BY {column} LIMIT ${n + 2}"
+    last = 0
+    while rows := await conn.fetch(page_query, *args, last, batch_size):
+        yield _rows(rows)
+        if len(rows) < batch_size:
+            return
+        last = rows[-1][key]
+
+async def iter_activity(conn: asyncpg.Connection, filters: dict, prefetch: int | None = None) -> AsyncIterator[Row]:
+    """Итерирует записи журнала активности по фильтрам (как get_activity_page) для выгрузки."""
+    where, args = _activity_where(filters)
+    query = f"""
+        SELECT {_ACTIVITY_COLUMNS}
+        FROM activity_log a LEFT JOIN users u ON u.id = a.user_id
+        WHERE {where}
+        ORDER BY a.timestamp DESC, a.id DESC
+    """
+    async for record in _iter_records(conn, query, *args, prefetch=prefetch):
+        yield record
+
+async def iter_catalog_for_index(conn: asyncpg.Connection, prefetch: int | None = None) -> AsyncIterator[Row]:
+    """Потоково отдает каталог (id, название, автор, наличие) по названию для индекса inline-режима."""
+    query = """
+        SELECT b.id, b.name, a.name AS author, (b.available_quantity > 0) AS is_available
+        FROM books b JOIN authors a ON a.id = b.author_id
+        ORDER BY b.name, b.id
+    """
+    async for row in _iter_records(conn, query, prefetch=prefetch):
+        yield row
+
+async def iter_notifiable_users(conn: asyncpg.Connection, batch_size: int | None = None) -> AsyncIterator[list[Row]]:
+    """Порциями отдает id и telegram_id пользователей, которым можно отправлять рассылки."""
+    async for batch in _iter_keyset_batches(
+        conn, "SELECT id, telegram_id FROM users WHERE telegram_id IS NOT NULL AND bot_blocked IS NOT TRUE",
+        'id', 'id', batch_size=batch_size
+    ):
+        yield batch
+
+async def iter_users_with_overdue_books(conn: asyncpg.Connection, batch_size: int | None = None) -> AsyncIterator[Row]:
+    """Порциями отдает выдачи с истекшим сроком возврата (вместе с telegram_id получателя)."""
+    async for batch in _iter_keyset_batches(conn, _OVERDUE_BOOKS_QUERY, 'borrow_id', 'bb.borrow_id', batch_size=batch_size):
+        for row in batch:
+            yield row
+
+async def iter_users_with_books_due_soon(conn: asyncpg.Connection, days_ahead: int = 2, batch_size: int | None = None) -> AsyncIterator[Row]:
+    """Порциями отдает выдачи, срок возврата которых истекает через 'days_ahead' дней."""
+    async for batch in _iter_keyset_batches(conn, _BOOKS_DUE_SOON_QUERY, 'borrow_id', 'bb.borrow_id', days_ahead,
+                                            batch_size=batch_size):
+        for row in batch:
+            yield row
+
+async def iter_pending_book_requests(conn: asyncpg.Connection, prefetch: int | None = None) -> AsyncIterator[Row]:
+    """Потоково отдает ожидающие запросы на книги, новые первыми."""
+    async for row in _iter_records(conn, _PENDING_BOOK_REQUESTS_QUERY, prefetch=prefetch):
+        yield row
@@ -4,6 +4,7 @@ import asyncpg
 import contextlib
 import logging
 import asyncio
+import time
 
 from src.core import config
 
@@ -11,6 +12,20 @@ from src.core import config
 logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class Row(asyncpg.Record):
+    """
+    Строка результата запроса. Поля доступны по ключу (row['name']), через get()
+    и как атрибуты (row.name). Используется как record_class соединений, поэтому
+    data_access отдает строки без копирования в dict.
+    """
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
 # --- Глобальный пул соединений ---
 db_pool = None
 
@@ -27,7 +42,8 @@ async def init_db_pool():
                 user=config.DB_USER,
                 password=config.DB_PASSWORD,
                 host=config.DB_HOST,
-                port=config.DB_PORT
+                port=config.DB_PORT,
+                record_class=Row
             )
             logger.info("Пул соединений с базой данных (asyncpg) успешно создан.")
         except Exception as e:
@@ -53,6 +69,76 @@ async def get_db_connection():
         logger.error(f"Ошибка при работе с соединением из пула asyncpg: {e}", exc_info=True)
         raise
 
+class DbSession:
+    """
+    Сессия БД на одно обновление (unit of work).
+
+    Соединение берется из пула лениво, при первом вызове connection(), и сразу открывает
+    транзакцию: все чтения и записи обновления идут через одно соединение и коммитятся
+    вместе. Выход из блока `async with` (или release()) коммитит транзакцию и возвращает
+    соединение в пул, при исключении транзакция откатывается. Обращения к Telegram API
+    делайте после выхода из блока, чтобы не держать соединение во время сетевых запросов.
+
+    Пример:
+        async with DbSession() as session:
+            conn = await session.connection()
+            ...
+        await query.edit_message_text(...)
+    """
+
+    def __init__(self):
+        self._conn = None
+        self._transaction = None
+        self._acquired_at = None
+
+    @property
+    def active(self) -> bool:
+        """True, пока сессия держит соединение из пула."""
+        return self._conn is not None
+
+    async def connection(self) -> asyncpg.Connection:
+        """Возвращает соединение сессии, при первом вызове берет его из пула и открывает транзакцию."""
+        if self._conn is not None:
+            return self._conn
+        if db_pool is None:
+            await init_db_pool()
+        if not db_pool:
+            raise ConnectionError("Пул соединений (asyncpg) не был инициализирован или не удалось его создать.")
+
+        conn = await db_pool.acquire()
+        try:
+            transaction = conn.transaction()
+            await transaction.start()
+        except Exception:
+            await db_pool.release(conn)
+            raise
+        self._conn, self._transaction = conn, transaction
+        self._acquired_at = time.monotonic()
+        return conn
+
+    async def release(self, commit: bool = True):
+        """Завершает транзакцию (коммит или откат) и возвращает соединение в пул. Повторный вызов ничего не делает."""
+        if self._conn is None:
+            return
+        conn, transaction = self._conn, self._transaction
+        self._conn = self._transaction = None
+        try:
+            if commit:
+                await transaction.commit()
+            else:
+                await transaction.rollback()
+        finally:
+            await db_pool.release(conn)
+            logger.debug(f"Соединение сессии удерживалось {(time.monotonic() - self._acquired_at) * 1000:.1f} мс.")
+
+    async def __aenter__(self) -> "DbSession":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is not None and self._conn is not None:
+            logger.error(f"Ошибка в сессии БД, транзакция откатывается: {exc}", exc_info=(exc_type, exc, tb))
+        await self.release(commit=exc_type is None)
+
 def hash_password(password: str) -> str:
     """Хеширует пароль для безопасного хранения, используя SHA256."""
     return hashlib.sha256(password.encode()).hexdigest()
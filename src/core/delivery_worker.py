@@ -0,0 +1,183 @@
+# src/core/delivery_worker.py
+"""
+Asyncio-native delivery worker for user notifications.
+
+A Celery prefork child runs one `asyncio.run` per task and therefore sends one
+Telegram message at a time. This worker instead consumes the notification
+streams (see notification_streams.py) on a single event loop and keeps up to
+`DELIVERY_CONCURRENCY` sends in flight, sharing one DB pool, one Bot client and
+one send scheduler. Telegram rate limits are still enforced by the scheduler, so
+one process can run at the bot-level ceiling.
+
+Entries are read through a consumer group and acknowledged only after the
+notification was delivered or permanently rejected. Anything left unacknowledged
+(transient error, crash) is reclaimed after `DELIVERY_RECLAIM_IDLE` seconds and
+retried until `DELIVERY_MAX_ATTEMPTS`; the ledger's idempotency keys make a
+redelivery safe.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+
+import redis.asyncio as aioredis
+import redis.exceptions
+
+from src.core import config
+from src.core.chat_ids import chat_id_cache
+from src.core.db.utils import get_db_connection, init_db_pool, close_db_pool
+from src.core.loop_monitor import start_loop_monitor
+from src.core.notification_streams import DELIVERY_STREAMS, CONSUMER_GROUP
+from src.core.send_scheduler import TelegramSendScheduler
+from src.core.tasks import create_telegram_bot, deliver_user_notification, get_connection
+
+logger = logging.getLogger(__name__)
+
+# How long a read waits for new entries when every stream is empty (ms).
+_READ_BLOCK_MS = 1000
+
+
+class DeliveryWorker:
+    """Consumes the notification streams and delivers entries with bounded concurrency."""
+
+    def __init__(self, redis_client: aioredis.Redis, bot, scheduler: TelegramSendScheduler,
+                 consumer: str | None = None, concurrency: int | None = None):
+        self._redis = redis_client
+        self._bot = bot
+        self._scheduler = scheduler
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.concurrency = concurrency or config.DELIVERY_CONCURRENCY
+        self._in_flight: set[asyncio.Task] = set()
+
+    async def ensure_groups(self) -> None:
+        """Creates the consumer group on every stream (idempotent)."""
+        for stream in DELIVERY_STREAMS:
+            try:
+                await self._redis.xgroup_create(stream, CONSUMER_GROUP, id='0', mkstream=True)
+            except redis.exceptions.ResponseError as e:
+                if 'BUSYGROUP' not in str(e):
+                    raise
+
+    async def run(self) -> None:
+        """Reads, reclaims and dispatches entries until cancelled."""
+        await self.ensure_groups()
+        loop = asyncio.get_running_loop()
+        next_reclaim = loop.time()
+        logger.info(f"Delivery worker '{self.consumer}' started (concurrency={self.concurrency}).")
+        try:
+            while True:
+                if len(self._in_flight) >= self.concurrency:
+                    await asyncio.wait(self._in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                free = self.concurrency - len(self._in_flight)
+
+                entries = []
+                if loop.time() >= next_reclaim:
+                    entries = await self._reclaim(free)
+                    next_reclaim = loop.time() + config.DELIVERY_RECLAIM_INTERVAL
+                if not entries:
+                    entries = await self._read(free)
+                for stream, entry_id, fields in entries:
+                    self._dispatch(stream, entry_id, fields)
+        finally:
+            for task in self._in_flight:
+                task.cancel()
+
+    def _dispatch(self, stream: str, entry_id: str, fields: dict) -> None:
+        task = asyncio.create_task(self.process(stream, entry_id, fields))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _read(self, count: int) -> list[tuple[str, str, dict]]:
+        """Reads new entries, interactive first; blocks only when every stream is empty."""
+        entries = []
+        for stream in DELIVERY_STREAMS:
+            if len(entries) >= count:
+                break
+            response = await self._redis.xreadgroup(CONSUMER_GROUP, self.consumer, {stream: '>'}, count=count - len(entries))
+            entries.extend(_flatten(response))
+        if entries:
+            return entries
+        response = await self._redis.xreadgroup(
+            CONSUMER_GROUP, self.consumer, {stream: '>' for stream in DELIVERY_STREAMS}, count=count, block=_READ_BLOCK_MS
+        )
+        return _flatten(response)
+
+    async def _reclaim(self, count: int) -> list[tuple[str, str, dict]]:
+        """Takes over entries that stayed unacknowledged longer than the reclaim idle time."""
+        entries = []
+        for stream in DELIVERY_STREAMS:
+            if len(entries) >= count:
+                break
+            response = await self._redis.xautoclaim(
+                stream, CONSUMER_GROUP, self.consumer, min_idle_time=int(config.DELIVERY_RECLAIM_IDLE * 1000),
+                start_id='0-0', count=count - len(entries)
+            )
+            entries.extend((stream, entry_id, fields) for entry_id, fields in response[1] if fields)
+        if entries:
+            logger.info(f"Reclaimed {len(entries)} unacknowledged notifications.")
+        return entries
+
+    async def process(self, stream: str, entry_id: str, fields: dict) -> None:
+        """Delivers one entry and acknowledges it unless it should be retried."""
+        try:
+            payload = json.loads(fields['payload'])
+            payload.setdefault('idempotency_key', f"stream:{entry_id}")
+            await deliver_user_notification(get_db_connection, self._bot, self._scheduler, **payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            attempts = await self._times_delivered(stream, entry_id)
+            if attempts < config.DELIVERY_MAX_ATTEMPTS:
+                logger.warning(f"Delivery of {stream}/{entry_id} failed (attempt {attempts}), will be reclaimed: {e}")
+                return
+            logger.error(f"Giving up on {stream}/{entry_id} after {attempts} attempts: {e}")
+        await self._ack(stream, entry_id)
+
+    async def _times_delivered(self, stream: str, entry_id: str) -> int:
+        pending = await self._redis.xpending_range(stream, CONSUMER_GROUP, min=entry_id, max=entry_id, count=1)
+        return pending[0]['times_delivered'] if pending else 1
+
+    async def _ack(self, stream: str, entry_id: str) -> None:
+        # Deleting acknowledged entries keeps the stream length equal to the backlog.
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.xack(stream, CONSUMER_GROUP, entry_id)
+        pipe.xdel(stream, entry_id)
+        await pipe.execute()
+
+
+def _flatten(response) -> list[tuple[str, str, dict]]:
+    """Turns an XREADGROUP response (RESP2 list or RESP3 map) into (stream, entry_id, fields) tuples."""
+    items = response.items() if isinstance(response, dict) else (response or [])
+    entries = []
+    for stream, stream_entries in items:
+        if stream_entries and isinstance(stream_entries[0], list):
+            # RESP3 replies wrap the entry list of every stream in one more list.
+            stream_entries = stream_entries[0]
+        entries.extend((stream, entry_id, fields) for entry_id, fields in stream_entries if fields)
+    return entries
+
+
+async def main() -> None:
+    """Runs the delivery worker with a shared DB pool, Bot client and send scheduler."""
+    await init_db_pool()
+    # Keeps the chat id cache consistent with re-linked, blocked and deleted users.
+    listener = await get_connection()
+    await chat_id_cache.listen(listener)
+    redis_client = aioredis.from_url(config.REDIS_URL, decode_responses=True)
+    bot = create_telegram_bot(config.NOTIFICATION_BOT_TOKEN, connection_pool_size=min(config.DELIVERY_CONCURRENCY, 100))
+    scheduler = TelegramSendScheduler(redis_client, config.NOTIFICATION_BOT_TOKEN)
+    try:
+        async with bot:
+            start_loop_monitor("Delivery Worker")
+            await DeliveryWorker(redis_client, bot, scheduler).run()
+    finally:
+        await listener.close()
+        await redis_client.aclose()
+        await close_db_pool()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,211 @@
+# src/core/loop_monitor.py
+"""
+Event-loop lag monitor and blocking-call detector for the bot processes.
+
+Every bot runs all of its handlers on a single asyncio loop, so one synchronous
+call (an HTTP client, a sync Redis call, heavy CPU work) stalls every user of
+that bot. This module measures how late the loop wakes up and, when a stall
+crosses the configured threshold, captures the stack of the loop thread from a
+watchdog thread so the offending call can be found in the logs.
+
+Each reporting window is also published to Redis under `loop_stats:<name>`, where the
+periodic health check (src/health_check.py) reads the lag of every running process.
+"""
+import asyncio
+import json
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Awaitable, Callable
+
+import redis.asyncio as aioredis
+
+from src.core import config
+
+logger = logging.getLogger(__name__)
+
+LOOP_STATS_KEY_PREFIX = 'loop_stats:'
+
+
+class LoopLagMonitor:
+    """
+    Measures event-loop lag and reports blocking calls.
+
+    The monitor consists of two parts:
+    - a heartbeat coroutine on the monitored loop that sleeps for `interval`
+      seconds and records how late it woke up (the loop lag);
+    - a watchdog thread that notices when the heartbeat has not run for longer
+      than `threshold` seconds and dumps the stack of the loop thread while
+      the loop is still blocked.
+    """
+
+    def __init__(self, name: str, interval: float, threshold: float, report_every: float,
+                 publish: Callable[[dict], Awaitable[None]] | None = None):
+        self.name = name
+        self.interval = interval
+        self.threshold = threshold
+        self.report_every = report_every
+        self.publish = publish
+
+        self._loop_thread_id = None
+        self._last_beat = time.monotonic()
+        self._stall_reported = False
+        self._stop = threading.Event()
+        self._heartbeat_task = None
+        self._watchdog = None
+
+        # Metrics for the current reporting window and for the process lifetime.
+        self._window_samples = 0
+        self._window_total_lag = 0.0
+        self._window_max_lag = 0.0
+        self._window_start_stalls = 0
+        self.stats = {
+            'samples': 0,
+            'max_lag_ms': 0.0,
+            'stalls': 0,
+            'last_stall_at': None,
+            'last_stall_stack': None,
+        }
+
+    def start(self) -> None:
+        """Starts the heartbeat on the running loop and the watchdog thread."""
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._heartbeat_task = asyncio.get_running_loop().create_task(
+            self._heartbeat(), name=f"loop-monitor-{self.name}"
+        )
+        self._watchdog = threading.Thread(
+            target=self._watch, name=f"loop-watchdog-{self.name}", daemon=True
+        )
+        self._watchdog.start()
+        logger.info(
+            f"Loop monitor started for {self.name} "
+            f"(interval={self.interval}s, threshold={self.threshold * 1000:.0f}ms)"
+        )
+
+    def stop(self) -> None:
+        """Stops the heartbeat and the watchdog thread."""
+        self._stop.set()
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+
+    def get_stats(self) -> dict:
+        """Returns a snapshot of the lifetime metrics."""
+        return dict(self.stats)
+
+    async def _heartbeat(self) -> None:
+        last_report = time.monotonic()
+        while not self._stop.is_set():
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - started - self.interval)
+            self._last_beat = now
+            self._record(lag)
+
+            if self._stall_reported:
+                logger.warning(
+                    f"[{self.name}] Event loop unblocked after {lag * 1000:.0f}ms"
+                )
+                self._stall_reported = False
+
+            if now - last_report >= self.report_every:
+                snapshot = self._report_window()
+                last_report = now
+                if snapshot and self.publish:
+                    try:
+                        await self.publish(snapshot)
+                    except Exception as e:
+                        logger.warning(f"[{self.name}] Could not publish loop stats: {e}")
+
+    def _record(self, lag: float) -> None:
+        lag_ms = lag * 1000
+        self.stats['samples'] += 1
+        self.stats['max_lag_ms'] = max(self.stats['max_lag_ms'], lag_ms)
+        self._window_samples += 1
+        self._window_total_lag += lag_ms
+        self._window_max_lag = max(self._window_max_lag, lag_ms)
+
+    def _report_window(self) -> dict | None:
+        """Logs the finished window, resets it and returns its summary."""
+        if not self._window_samples:
+            return None
+        avg = self._window_total_lag / self._window_samples
+        logger.info(
+            f"[{self.name}] loop lag: avg={avg:.1f}ms max={self._window_max_lag:.1f}ms "
+            f"samples={self._window_samples} stalls_total={self.stats['stalls']}"
+        )
+        snapshot = {
+            'name': self.name,
+            'reported_at': time.time(),
+            'window_seconds': self.report_every,
+            'avg_lag_ms': round(avg, 1),
+            'max_lag_ms': round(self._window_max_lag, 1),
+            'samples': self._window_samples,
+            'stalls': self.stats['stalls'] - self._window_start_stalls,
+            'stalls_total': self.stats['stalls'],
+            'max_lag_ms_total': round(self.stats['max_lag_ms'], 1),
+            'threshold_ms': self.threshold * 1000,
+        }
+        self._window_samples = 0
+        self._window_total_lag = 0.0
+        self._window_max_lag = 0.0
+        self._window_start_stalls = self.stats['stalls']
+        return snapshot
+
+    def _watch(self) -> None:
+        check_every = min(self.interval, self.threshold) / 2
+        while not self._stop.wait(check_every):
+            blocked_for = time.monotonic() - self._last_beat - self.interval
+            if blocked_for > self.threshold and not self._stall_reported:
+                self._stall_reported = True
+                self._report_stall(blocked_for)
+
+    def _report_stall(self, blocked_for: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame else "<stack unavailable>"
+        self.stats['stalls'] += 1
+        self.stats['last_stall_at'] = time.time()
+        self.stats['last_stall_stack'] = stack
+        logger.warning(
+            f"[{self.name}] Event loop blocked for {blocked_for * 1000:.0f}ms "
+            f"(threshold {self.threshold * 1000:.0f}ms). Loop thread stack:\n{stack}"
+        )
+
+
+_monitor = None
+
+
+def _redis_publisher(name: str, ttl: float) -> Callable[[dict], Awaitable[None]]:
+    """Publishes window summaries to Redis; the key expires if the process stops reporting."""
+    client = None
+
+    async def publish(snapshot: dict) -> None:
+        nonlocal client
+        if client is None:
+            client = aioredis.from_url(config.REDIS_URL)
+        await client.set(f"{LOOP_STATS_KEY_PREFIX}{name}", json.dumps(snapshot), ex=int(ttl))
+
+    return publish
+
+
+def start_loop_monitor(name: str) -> LoopLagMonitor | None:
+    """
+    Starts the loop monitor for the current process, if enabled in the config.
+    Must be called from inside the running event loop of the bot.
+    """
+    global _monitor
+    if not config.LOOP_MONITOR_ENABLED:
+        return None
+    if _monitor is None:
+        _monitor = LoopLagMonitor(
+            name=name,
+            interval=config.LOOP_MONITOR_INTERVAL,
+            threshold=config.LOOP_LAG_THRESHOLD_MS / 1000,
+            report_every=config.LOOP_MONITOR_REPORT_INTERVAL,
+            publish=_redis_publisher(name, ttl=config.LOOP_MONITOR_REPORT_INTERVAL * 3),
+        )
+        _monitor.start()
+    return _monitor
@@ -0,0 +1,69 @@
+# src/core/message_renderer.py
+"""
+Renders a screen (text, inline keyboard and an optional photo) into the message whose
+button was pressed.
+
+Telegram edits a message in place only within its kind: a photo message can take
+another photo with a new caption (edit_message_media), a text message can take new
+text (edit_message_text). Moving between screens of the same kind is therefore one
+API call and keeps the chat history intact. Only a change of kind (text <-> photo), or
+a message Telegram no longer lets the bot edit, falls back to deleting the message and
+sending a new one.
+"""
+import logging
+
+from telegram import InputMediaPhoto, Message, Update
+from telegram.error import BadRequest, TelegramError
+from telegram.ext import ContextTypes
+
+logger = logging.getLogger(__name__)
+
+
+def _is_not_modified(error: BadRequest) -> bool:
+    return 'message is not modified' in error.message.lower()
+
+
+async def render_screen(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    text: str,
+    reply_markup=None,
+    photo: str | None = None,
+    parse_mode: str | None = None,
+) -> Message | None:
+    """
+    Shows the screen in place of the callback's message when its kind allows, otherwise
+    replaces the message. `photo` is a file_id; without it the screen is a text message.
+    Returns the message now showing the screen.
+    """
+    query = update.callback_query
+    message = query.message if query else None
+    # An InaccessibleMessage (too old) can be neither edited nor deleted
+    editable = isinstance(message, Message)
+    is_photo = editable and bool(message.photo)
+    is_text = editable and message.text is not None
+
+    if editable and (is_photo if photo else is_text):
+        try:
+            if photo:
+                return await query.edit_message_media(
+                    InputMediaPhoto(media=photo, caption=text, parse_mode=parse_mode), reply_markup=reply_markup
+                )
+            return await query.edit_message_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
+        except BadRequest as e:
+            if _is_not_modified(e):
+                return message
+            logger.info(f"Message {message.message_id} cannot be edited in place, resending: {e}")
+
+    chat_id = message.chat.id if message is not None else update.effective_chat.id
+    if editable:
+        try:
+            await message.delete()
+        except TelegramError as e:
+            # Messages older than 48 hours cannot be deleted; the new one is sent anyway
+            logger.debug(f"Could not delete message {message.message_id}: {e}")
+    if photo:
+        return await context.bot.send_photo(
+            chat_id=chat_id, photo=photo, caption=text, reply_markup=reply_markup, parse_mode=parse_mode
+        )
+    return await context.bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup, parse_mode=parse_mode)
@@ -0,0 +1,38 @@
+# src/core/notification_streams.py
+"""
+Redis streams that feed the asyncio delivery worker (see delivery_worker.py).
+
+User notifications are appended to one of two streams: `interactive` for
+confirmations triggered by a user action and `bulk` for fan-outs (broadcasts,
+reminders). Each entry holds the `notify_user` kwargs as JSON. The worker reads
+them through a consumer group and acknowledges and deletes an entry only after
+it was delivered, so the stream length is the current backlog.
+"""
+import json
+
+import redis.asyncio as aioredis
+
+STREAM_INTERACTIVE = 'notifications:interactive'
+STREAM_BULK = 'notifications:bulk'
+# Streams in read priority order.
+DELIVERY_STREAMS = (STREAM_INTERACTIVE, STREAM_BULK)
+CONSUMER_GROUP = 'delivery'
+
+# Notification categories that are produced by fan-outs rather than by a user action.
+BULK_NOTIFICATION_CATEGORIES = frozenset({'new_arrival', 'broadcast', 'due_date', 'due_date_reminder', 'batch_confirmation'})
+
+
+def stream_for_category(category: str | None) -> str:
+    """Returns the stream a user notification of the given category belongs to."""
+    return STREAM_BULK if category in BULK_NOTIFICATION_CATEGORIES else STREAM_INTERACTIVE
+
+
+async def publish_notifications(redis_client: aioredis.Redis, notifications: list[dict]) -> None:
+    """Appends user notifications (`notify_user` kwargs) to their streams in one round trip."""
+    if not notifications:
+        return
+    pipe = redis_client.pipeline(transaction=False)
+    for notification in notifications:
+        stream = stream_for_category(notification.get('category'))
+        pipe.xadd(stream, {'payload': json.dumps(notification, ensure_ascii=False)})
+    await pipe.execute()
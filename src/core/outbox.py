@@ -0,0 +1,117 @@
+# src/core/outbox.py
+"""
+Relay for the transactional notification outbox.
+
+Handlers write notifications into the `notification_outbox` table in the same
+transaction as the business change (see `enqueue_*` in data_access). This relay
+is the only component that talks to the broker: it claims rows in id order,
+publishes them to Celery as one batch and deletes them in the same transaction.
+If publishing fails the transaction is rolled back and the rows stay in the
+outbox, so nothing is lost after a commit and nothing is sent for a rollback.
+
+With the delivery worker enabled, user notifications are appended to its Redis
+streams instead of being published as Celery tasks.
+"""
+import asyncio
+import logging
+
+import asyncpg
+import redis.asyncio as aioredis
+from celery import group
+
+from src.core import config
+from src.core.db import data_access as db_data
+from src.core.db.utils import get_db_connection, init_db_pool, close_db_pool
+from src.core.notification_streams import publish_notifications
+from src.core.send_scheduler import create_redis_client
+from src.core.tasks import celery_app, get_connection
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_CHANNEL = 'notification_outbox'
+
+
+def _task_kwargs(entry: dict) -> dict:
+    """
+    Builds task kwargs for an outbox entry. User notifications are keyed by the outbox id,
+    so an entry that is published twice (commit lost after publish) is delivered once.
+    """
+    kwargs = dict(entry['payload'])
+    if entry['task_name'] == db_data.OUTBOX_NOTIFY_USER:
+        kwargs.setdefault('idempotency_key', f"outbox:{entry['id']}")
+    return kwargs
+
+
+def _publish(entries: list[dict]) -> None:
+    """Publishes a batch of outbox entries to the broker (blocking, runs in a thread)."""
+    job = group(
+        celery_app.signature(entry['task_name'], kwargs=_task_kwargs(entry))
+        for entry in entries
+    )
+    job.apply_async()
+
+
+async def relay_batch(conn: asyncpg.Connection, batch_size: int, redis_client: aioredis.Redis | None = None) -> int:
+    """
+    Moves one batch from the outbox to the broker (and to the delivery streams if `redis_client` is given).
+
+    Returns:
+        The number of relayed entries.
+    """
+    async with conn.transaction():
+        entries = await db_data.claim_outbox_batch(conn, batch_size)
+        if not entries:
+            return 0
+        celery_entries = entries
+        if redis_client is not None:
+            celery_entries = [e for e in entries if e['task_name'] != db_data.OUTBOX_NOTIFY_USER]
+            await publish_notifications(redis_client, [
+                _task_kwargs(e) for e in entries if e['task_name'] == db_data.OUTBOX_NOTIFY_USER
+            ])
+        if celery_entries:
+            await asyncio.to_thread(_publish, celery_entries)
+    logger.info(f"Relayed {len(entries)} outbox entries (last id={entries[-1]['id']}).")
+    return len(entries)
+
+
+async def drain(batch_size: int, redis_client: aioredis.Redis | None = None) -> int:
+    """Relays outbox batches until the table is empty."""
+    total = 0
+    while True:
+        async with get_db_connection() as conn:
+            relayed = await relay_batch(conn, batch_size, redis_client)
+        total += relayed
+        if relayed < batch_size:
+            return total
+
+
+async def main() -> None:
+    """Runs the outbox relay: drains on every NOTIFY and on a fallback poll interval."""
+    await init_db_pool()
+    wakeup = asyncio.Event()
+    listener = await get_connection()
+    await listener.add_listener(OUTBOX_CHANNEL, lambda *args: wakeup.set())
+    redis_client = create_redis_client() if config.DELIVERY_WORKER_ENABLED else None
+    logger.info("Outbox relay started.")
+
+    try:
+        while True:
+            wakeup.clear()
+            try:
+                await drain(config.OUTBOX_BATCH_SIZE, redis_client)
+            except Exception as e:
+                # The batch was rolled back and stays in the outbox; try again later.
+                logger.error(f"Outbox relay failed, will retry: {e}", exc_info=True)
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=config.OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        await listener.close()
+        if redis_client is not None:
+            await redis_client.aclose()
+        await close_db_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
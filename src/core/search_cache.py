@@ -0,0 +1,87 @@
+# src/core/search_cache.py
+"""
+Per-process cache of book search results for the library bot.
+
+The first page of a search runs one query that returns the ranked results (up to
+`SEARCH_CACHE_MAX_RESULTS`) together with every field of the book card. The rows
+are cached per (mode, term) for `SEARCH_CACHE_TTL` seconds. Paging then slices the
+cached list, and opening a card from the results reads it from the card index
+without touching the database.
+
+Availability shown from the cache can lag by up to the TTL. Borrowing and returning
+re-check it in the database, and this process drops a card as soon as it changes it.
+"""
+import time
+from collections import OrderedDict
+
+from src.core import config
+
+
+def _normalize(term: str) -> str:
+    return " ".join(term.lower().split())
+
+
+class SearchResultCache:
+    """LRU cache of search results keyed by (mode, normalized term), plus a card index by book id."""
+
+    def __init__(self, ttl: float | None = None, max_size: int | None = None):
+        self.ttl = config.SEARCH_CACHE_TTL if ttl is None else ttl
+        self.max_size = max_size or config.SEARCH_CACHE_SIZE
+        self._results: OrderedDict[tuple[str, str], tuple[float, list, int]] = OrderedDict()
+        self._cards: dict[int, tuple[float, dict]] = {}
+
+    def get(self, mode: str, term: str) -> tuple[list, int] | None:
+        """Returns (rows, total) or None if the term is missing or expired."""
+        key = (mode, _normalize(term))
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        expires_at, rows, total = entry
+        if expires_at < time.monotonic():
+            del self._results[key]
+            return None
+        self._results.move_to_end(key)
+        return rows, total
+
+    def put(self, mode: str, term: str, rows: list, total: int) -> None:
+        expires_at = time.monotonic() + self.ttl
+        key = (mode, _normalize(term))
+        self._results[key] = (expires_at, rows, total)
+        self._results.move_to_end(key)
+        for row in rows:
+            self._cards[row['id']] = (expires_at, row)
+        while len(self._results) > self.max_size:
+            self._results.popitem(last=False)
+        # Cards are only reachable from cached results, so they are bounded by the same limit
+        if len(self._cards) > self.max_size * config.SEARCH_CACHE_MAX_RESULTS:
+            self._drop_expired_cards()
+
+    def get_card(self, book_id: int) -> dict | None:
+        """Returns the cached book card or None if it is missing or expired."""
+        entry = self._cards.get(book_id)
+        if entry is None:
+            return None
+        expires_at, card = entry
+        if expires_at < time.monotonic():
+            del self._cards[book_id]
+            return None
+        return card
+
+    def invalidate_book(self, book_id: int) -> None:
+        """Drops the card of a book whose availability this process has just changed."""
+        self._cards.pop(book_id, None)
+
+    def clear(self) -> None:
+        self._results.clear()
+        self._cards.clear()
+
+    def _drop_expired_cards(self) -> None:
+        now = time.monotonic()
+        for book_id in [book_id for book_id, (expires_at, _) in self._cards.items() if expires_at < now]:
+            del self._cards[book_id]
+        if len(self._cards) > self.max_size * config.SEARCH_CACHE_MAX_RESULTS:
+            self._cards.clear()
+
+
+# Process-wide cache shared by all users of the library bot.
+search_cache = SearchResultCache()
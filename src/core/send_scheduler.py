@@ -0,0 +1,154 @@
+# src/core/send_scheduler.py
+"""
+Redis-coordinated send scheduler for the Telegram Bot API.
+
+Telegram limits a bot to roughly 30 messages per second overall and about one
+message per second to the same chat. A static Celery `rate_limit` only caps a
+single worker, so this scheduler reserves send slots in Redis instead: every
+worker and process sending through the same bot shares one global schedule and
+one schedule per chat. A 429 (`RetryAfter`) pauses the whole bot for exactly the
+time Telegram asks for, and transient network errors are retried with
+exponential backoff and full jitter.
+"""
+import asyncio
+import logging
+import random
+from datetime import timedelta
+from typing import Awaitable, Callable, TypeVar
+
+import redis.asyncio as aioredis
+import telegram
+
+from src.core import config
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Reserves the next send slot for a chat.
+# KEYS: global slot, chat slot, bot pause. ARGV: global interval ms, chat interval ms.
+# Returns {reserved, delay_ms}. When the chat itself is the bottleneck nothing is
+# reserved, so a slow chat never pushes back the global schedule of other chats.
+_RESERVE_SLOT_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local g = tonumber(redis.call('GET', KEYS[1]) or '0')
+local c = tonumber(redis.call('GET', KEYS[2]) or '0')
+local p = tonumber(redis.call('GET', KEYS[3]) or '0')
+local base = math.max(now, p)
+if c > base then
+    return {0, c - now}
+end
+local slot = math.max(base, g)
+local gi = tonumber(ARGV[1])
+local ci = tonumber(ARGV[2])
+redis.call('SET', KEYS[1], slot + gi, 'PX', slot + gi - now + 1000)
+redis.call('SET', KEYS[2], slot + ci, 'PX', slot + ci - now + 1000)
+return {1, slot - now}
+"""
+
+# Pauses all sends of the bot until now + ARGV[1] ms (never shortens an existing pause).
+_PAUSE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local resume_at = now + tonumber(ARGV[1])
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+if resume_at > current then
+    redis.call('SET', KEYS[1], resume_at, 'PX', tonumber(ARGV[1]) + 1000)
+end
+return resume_at
+"""
+
+
+class SendDeferred(Exception):
+    """Raised when Telegram asks to wait longer than the sender is willing to block."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Flood control: retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def backoff_delay(attempt: int, base: float | None = None, cap: float | None = None) -> float:
+    """Exponential backoff with full jitter for the given (zero-based) attempt."""
+    base = config.TELEGRAM_BACKOFF_BASE if base is None else base
+    cap = config.TELEGRAM_BACKOFF_MAX if cap is None else cap
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _retry_after_seconds(value: int | float | timedelta) -> float:
+    return value.total_seconds() if isinstance(value, timedelta) else float(value)
+
+
+class TelegramSendScheduler:
+    """
+    Shares Telegram rate limits of one bot between all processes through Redis.
+
+    Usage:
+        scheduler = TelegramSendScheduler(redis_client, bot.token)
+        message = await scheduler.send(chat_id, lambda: bot.send_message(chat_id, text))
+    """
+
+    def __init__(self, redis_client: aioredis.Redis, bot_token: str,
+                 global_rate: float | None = None, per_chat_rate: float | None = None,
+                 max_attempts: int | None = None, max_inline_wait: float | None = None):
+        global_rate = global_rate or config.TELEGRAM_GLOBAL_RATE
+        per_chat_rate = per_chat_rate or config.TELEGRAM_PER_CHAT_RATE
+        self.global_interval_ms = max(1, int(1000 / global_rate))
+        self.chat_interval_ms = max(1, int(1000 / per_chat_rate))
+        self.max_attempts = max_attempts or config.TELEGRAM_SEND_MAX_ATTEMPTS
+        self.max_inline_wait = config.TELEGRAM_MAX_INLINE_RETRY_AFTER if max_inline_wait is None else max_inline_wait
+
+        self._redis = redis_client
+        self._prefix = f"tg:rl:{bot_token.split(':')[0]}"
+        self._reserve = redis_client.register_script(_RESERVE_SLOT_LUA)
+        self._pause = redis_client.register_script(_PAUSE_LUA)
+
+    async def acquire(self, chat_id: int) -> None:
+        """Waits until a send slot for the chat is reserved and due."""
+        keys = [f"{self._prefix}:global", f"{self._prefix}:chat:{chat_id}", f"{self._prefix}:pause"]
+        while True:
+            reserved, delay_ms = await self._reserve(keys=keys, args=[self.global_interval_ms, self.chat_interval_ms])
+            if delay_ms > 0:
+                await asyncio.sleep(delay_ms / 1000)
+            if reserved:
+                return
+
+    async def pause(self, seconds: float) -> None:
+        """Pauses all sends of this bot for the given number of seconds."""
+        await self._pause(keys=[f"{self._prefix}:pause"], args=[int(seconds * 1000)])
+
+    async def send(self, chat_id: int, request: Callable[[], Awaitable[T]]) -> T:
+        """
+        Performs a Telegram API call for the chat within the shared limits.
+
+        Raises:
+            SendDeferred: Telegram asked to wait longer than `max_inline_wait`.
+            telegram.error.TelegramError: permanent errors (Forbidden, BadRequest)
+                immediately, transient ones after `max_attempts` attempts.
+        """
+        attempt = 0
+        while True:
+            await self.acquire(chat_id)
+            try:
+                return await request()
+            except telegram.error.RetryAfter as e:
+                attempt += 1
+                retry_after = _retry_after_seconds(e.retry_after)
+                logger.warning(f"Flood control for chat {chat_id}: pausing bot for {retry_after:.1f}s.")
+                await self.pause(retry_after)
+                if retry_after > self.max_inline_wait or attempt >= self.max_attempts:
+                    raise SendDeferred(retry_after) from e
+            except telegram.error.BadRequest:
+                raise
+            except telegram.error.NetworkError as e:
+                attempt += 1
+                if attempt >= self.max_attempts:
+                    raise
+                delay = backoff_delay(attempt - 1)
+                logger.warning(f"Transient error for chat {chat_id} ({e}), retry {attempt} in {delay:.1f}s.")
+                await asyncio.sleep(delay)
+
+
+def create_redis_client() -> aioredis.Redis:
+    """Creates an asyncio Redis client for the send scheduler."""
+    return aioredis.from_url(config.REDIS_URL)
@@ -7,18 +7,27 @@ The use of Celery allows the main application to remain responsive by offloading
 import os
 import logging
 import asyncio
+import contextlib
+from typing import AsyncIterator
 import subprocess
 import asyncpg
+import redis.asyncio as aioredis
 from celery import Celery
 from celery.schedules import crontab
+from kombu import Queue
 import telegram
 from telegram.request import HTTPXRequest
 from src.core.db import data_access as db_data
+from src.core.db.utils import Row
 from datetime import datetime
 from celery import group
 from celery.exceptions import SoftTimeLimitExceeded
 
 from src.core import config
+from src.core.send_scheduler import TelegramSendScheduler, SendDeferred, backoff_delay, create_redis_client
+from src.core.notification_streams import BULK_NOTIFICATION_CATEGORIES, STREAM_BULK, publish_notifications
+from src.core.chat_ids import chat_id_cache
+from src.core.catalog_index import build_index
 
 # --- Logging Configuration ---
 logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
@@ -33,25 +42,65 @@ celery_app = Celery(
 celery_app.conf.update(
     task_always_eager=config.CELERY_TASK_ALWAYS_EAGER
 )
+# Telegram send limits are enforced by the shared send scheduler (see send_scheduler.py),
+# so notify_user no longer needs a static per-worker rate limit.
+# A soft limit lets a long broadcast hand itself back to Celery; idempotency keys make the re-run safe.
 celery_app.conf.task_annotations = {
-    'src.core.tasks.notify_user': {'rate_limit': '10/s', 'time_limit': 30},
-    'src.core.tasks.broadcast_new_book': {'rate_limit': '1/m', 'time_limit': 600},
+    'src.core.tasks.notify_user': {'time_limit': 60},
+    'src.core.tasks.broadcast_new_book': {'rate_limit': '1/m', 'soft_time_limit': 570, 'time_limit': 600},
 }
 
+# --- Queues and Routing ---
+# Each queue is consumed by its own worker pool (see compose.yaml), so a large fan-out
+# in `bulk` never delays interactive confirmations or admin alerts.
+QUEUE_INTERACTIVE = 'interactive'
+QUEUE_BULK = 'bulk'
+QUEUE_ADMIN = 'admin'
+QUEUE_MAINTENANCE = 'maintenance'
+CELERY_QUEUES = (QUEUE_INTERACTIVE, QUEUE_BULK, QUEUE_ADMIN, QUEUE_MAINTENANCE)
+
+_TASK_QUEUES = {
+    'src.core.tasks.notify_admin': QUEUE_ADMIN,
+    'src.core.tasks.broadcast_new_book': QUEUE_BULK,
+    'src.core.tasks.check_due_dates_and_notify': QUEUE_MAINTENANCE,
+    'src.core.tasks.expire_reservation_holds': QUEUE_MAINTENANCE,
+    'src.core.tasks.reconcile_user_counters': QUEUE_MAINTENANCE,
+    'src.core.tasks.rebuild_catalog_index': QUEUE_MAINTENANCE,
+    'src.core.tasks.backup_database_task': QUEUE_MAINTENANCE,
+    'src.core.tasks.health_check_task': QUEUE_MAINTENANCE,
+}
+
+def route_task(name, args, kwargs, options, task=None, **kw):
+    """
+    Celery router: picks a queue by task name, and for user notifications by category.
+    An explicit `queue=` passed to `apply_async` still takes precedence.
+    """
+    if name == 'src.core.tasks.notify_user':
+        category = (kwargs or {}).get('category', 'system')
+        return {'queue': QUEUE_BULK if category in BULK_NOTIFICATION_CATEGORIES else QUEUE_INTERACTIVE}
+    return {'queue': _TASK_QUEUES.get(name, QUEUE_INTERACTIVE)}
+
+celery_app.conf.update(
+    task_queues=[Queue(name) for name in CELERY_QUEUES],
+    task_default_queue=QUEUE_INTERACTIVE,
+    task_routes=(route_task,),
+)
+
 # --- Telegram Bot Configuration ---
 
-def create_telegram_bot(token: str) -> telegram.Bot:
+def create_telegram_bot(token: str, connection_pool_size: int = 8) -> telegram.Bot:
     """
     Creates and configures a `telegram.Bot` instance with optimized timeouts.
 
     Args:
         token: The Telegram API token for the bot.
+        connection_pool_size: Maximum number of concurrent HTTP connections.
 
     Returns:
         A configured `telegram.Bot` instance.
     """
     request = HTTPXRequest(
-        connection_pool_size=8,
+        connection_pool_size=connection_pool_size,
         connect_timeout=30.0,
         read_timeout=30.0,
         write_timeout=30.0,
@@ -74,47 +123,119 @@ async def get_connection():
         user=config.DB_USER,
         password=config.DB_PASSWORD,
         host=config.DB_HOST,
-        port=config.DB_PORT
+        port=config.DB_PORT,
+        record_class=Row
     )
 
 # --- Core Asynchronous Task Logic ---
 
-async def _async_notify_user(user_id: int, text: str, category: str, button_text: str | None, button_callback: str | None):
+def _reuse_connection(conn: asyncpg.Connection):
+    """Adapts a single connection to the `acquire()` interface expected by `deliver_user_notification`."""
+    @contextlib.asynccontextmanager
+    async def acquire():
+        yield conn
+    return acquire
+
+async def _record_delivery_failure(acquire, delivery: dict | None, status: str, error: str, user_id: int | None = None) -> None:
+    """Stores the outcome of a failed attempt in the delivery ledger without masking the original error."""
+    if not delivery:
+        return
+    try:
+        async with acquire() as conn:
+            await db_data.mark_notification_failed(conn, delivery['id'], status, error[:500])
+            if status == 'blocked' and user_id is not None:
+                await db_data.mark_user_bot_blocked(conn, user_id)
+    except Exception as e:
+        logger.error(f"Could not record delivery failure for notification {delivery['id']}: {e}")
+
+async def deliver_user_notification(acquire, bot: telegram.Bot, scheduler: TelegramSendScheduler, user_id: int, text: str,
+                                    category: str = 'system', button_text: str | None = None, button_callback: str | None = None,
+                                    idempotency_key: str | None = None, chat_id: int | None = None) -> None:
     """
-    Handles the asynchronous logic of sending a notification to a single user.
+    Delivers a single user notification through the delivery ledger.
+
+    Every logical notification has one row in the `notifications` ledger, keyed by
+    `idempotency_key`. A retry resumes that row instead of inserting a new one, and a
+    notification that was already sent (or rejected for good) is not sent again. A pending
+    row is claimed for `NOTIFICATION_CLAIM_LEASE` seconds, so a duplicate running while
+    another worker holds the claim skips the send.
+    `acquire()` must return an async context manager yielding a DB connection; no
+    connection is held while waiting on Telegram. A `chat_id` resolved by the producer
+    skips the per-message lookup; otherwise the process-level chat id cache is used.
+
+    Permanent failures (no linked Telegram account, bot blocked, bad request) are recorded;
+    transient ones are recorded as 'timed_out' and propagate so that the caller can retry.
     """
-    conn = None
+    delivery = None
     try:
-        user_notifier_bot = create_telegram_bot(config.NOTIFICATION_BOT_TOKEN)
-        conn = await get_connection()
-        
-        await db_data.create_notification(conn, user_id=user_id, text=text, category=category)
-        telegram_id = await db_data.get_telegram_id_by_user_id(conn, user_id)
+        async with acquire() as conn:
+            delivery = await db_data.begin_notification_delivery(conn, user_id, text, category, idempotency_key)
+            if delivery['status'] in db_data.NOTIFICATION_FINAL_STATUSES:
+                logger.info(f"Notification {idempotency_key!r} for user_id={user_id} is already '{delivery['status']}', skipping.")
+                return
+            if not delivery['claimed']:
+                logger.info(f"Notification {idempotency_key!r} for user_id={user_id} is being delivered by another worker, skipping.")
+                return
+
+            if chat_id is None:
+                target = await chat_id_cache.resolve(conn, user_id)
+                if target['bot_blocked']:
+                    await db_data.mark_notification_failed(conn, delivery['id'], 'blocked', 'Bot is blocked by the user')
+                    logger.info(f"Skipping notification '{category}' for user_id={user_id}: bot is blocked by the user.")
+                    return
+                chat_id = target['telegram_id']
+        telegram_id = chat_id
 
         reply_markup = None
         if button_text and button_callback:
             keyboard = [[telegram.InlineKeyboardButton(button_text, callback_data=button_callback)]]
             reply_markup = telegram.InlineKeyboardMarkup(keyboard)
 
-        await user_notifier_bot.send_message(
+        message = await scheduler.send(telegram_id, lambda: bot.send_message(
             chat_id=telegram_id, text=text, parse_mode='Markdown', reply_markup=reply_markup
-        )
-        logger.info(f"Notification '{category}' for user_id={user_id} sent to telegram_id={telegram_id}.")
-    except db_data.NotFoundError:
+        ))
+    except db_data.NotFoundError as e:
         logger.warning(f"Failed to send notification: telegram_id for user_id={user_id} not found.")
-    except telegram.error.Forbidden:
+        await _record_delivery_failure(acquire, delivery, 'failed', str(e))
+        return
+    except telegram.error.Forbidden as e:
         logger.warning(f"Failed to send notification to user_id={user_id}: Bot was blocked by the user.")
-    except telegram.error.TimedOut:
-        logger.warning(f"Timeout while sending notification to user_id={user_id}. Retrying might be necessary.")
-    except telegram.error.TelegramError as e:
-        logger.error(f"A Telegram error occurred while notifying user_id={user_id}: {e}", exc_info=True)
-    except asyncpg.PostgresError as e:
-        logger.error(f"A database error occurred while notifying user_id={user_id}: {e}", exc_info=True)
+        await _record_delivery_failure(acquire, delivery, 'blocked', str(e), user_id=user_id)
+        chat_id_cache.invalidate(user_id)
+        return
+    except telegram.error.BadRequest as e:
+        logger.error(f"Telegram rejected the notification for user_id={user_id}: {e}")
+        await _record_delivery_failure(acquire, delivery, 'failed', str(e))
+        return
+    except Exception as e:
+        await _record_delivery_failure(acquire, delivery, 'timed_out', f"{type(e).__name__}: {e}")
+        raise
+
+    # The message is already delivered: a failure here must not trigger a resend.
+    try:
+        async with acquire() as conn:
+            await db_data.mark_notification_sent(conn, delivery['id'], message.message_id)
     except Exception as e:
-        logger.error(f"An unexpected error occurred in _async_notify_user for user_id={user_id}: {e}", exc_info=True)
+        logger.error(f"Notification {delivery['id']} was sent but could not be marked as sent: {e}")
+    logger.info(f"Notification '{category}' for user_id={user_id} sent to telegram_id={telegram_id}.")
+
+async def _async_notify_user(user_id: int, text: str, category: str, button_text: str | None, button_callback: str | None,
+                             idempotency_key: str | None = None, chat_id: int | None = None):
+    """
+    Handles the asynchronous logic of sending a notification to a single user from a Celery task.
+    """
+    conn = None
+    redis_client = create_redis_client()
+    try:
+        conn = await get_connection()
+        user_notifier_bot = create_telegram_bot(config.NOTIFICATION_BOT_TOKEN)
+        scheduler = TelegramSendScheduler(redis_client, config.NOTIFICATION_BOT_TOKEN)
+        await deliver_user_notification(_reuse_connection(conn), user_notifier_bot, scheduler, user_id, text, category,
+                                        button_text, button_callback, idempotency_key, chat_id)
     finally:
         if conn:
             await conn.close()
+        await redis_client.aclose()
 
 def escape_markdown(text: str) -> str:
     """
@@ -127,8 +248,10 @@ async def _async_notify_admin(text: str, category: str = 'audit', user_id: int |
     """
     Handles the asynchronous logic of sending a formatted notification to the administrator.
     """
+    redis_client = create_redis_client()
     try:
         admin_notifier_bot = create_telegram_bot(config.ADMIN_NOTIFICATION_BOT_TOKEN)
+        scheduler = TelegramSendScheduler(redis_client, config.ADMIN_NOTIFICATION_BOT_TOKEN)
         timestamp = datetime.now().strftime('%d.%m.%Y %H:%M:%S')
         
         header = f"🔔 **Уведомление:** `{category}`\n🕐 **Время:** `{timestamp}`\n{'─' * 30}\n"
@@ -142,81 +265,130 @@ async def _async_notify_admin(text: str, category: str = 'audit', user_id: int |
             ]]
             reply_markup = telegram.InlineKeyboardMarkup(keyboard)
 
-        await admin_notifier_bot.send_message(
-            chat_id=config.ADMIN_TELEGRAM_ID, text=formatted_text, parse_mode='Markdown', reply_markup=reply_markup
-        )
-        logger.info(f"Admin notification '{category}' sent successfully.")
-    except telegram.error.BadRequest as e:
-        if "can't parse entities" in str(e).lower():
+        try:
+            await scheduler.send(config.ADMIN_TELEGRAM_ID, lambda: admin_notifier_bot.send_message(
+                chat_id=config.ADMIN_TELEGRAM_ID, text=formatted_text, parse_mode='Markdown', reply_markup=reply_markup
+            ))
+        except telegram.error.BadRequest as e:
+            if "can't parse entities" not in str(e).lower():
+                raise
             logger.warning(f"Markdown parsing failed, sending as plain text: {e}")
             plain_text = f"Notification: {category}\nTime: {timestamp}\n---\n{text}"
-            await admin_notifier_bot.send_message(
+            await scheduler.send(config.ADMIN_TELEGRAM_ID, lambda: admin_notifier_bot.send_message(
                 chat_id=config.ADMIN_TELEGRAM_ID, text=plain_text, reply_markup=reply_markup
-            )
+            ))
+        logger.info(f"Admin notification '{category}' sent successfully.")
     except telegram.error.Forbidden:
         logger.error(f"Failed to send admin notification: Bot might be blocked by the admin.")
-    except telegram.error.TimedOut:
-        logger.warning(f"Timeout sending admin notification for category: {category}")
-    except telegram.error.TelegramError as e:
-        logger.error(f"A Telegram error occurred while notifying admin: {e}", exc_info=True)
-    except Exception as e:
-        logger.error(f"An unexpected error occurred in _async_notify_admin: {e}", exc_info=True)
+    except telegram.error.BadRequest as e:
+        logger.error(f"Telegram rejected the admin notification '{category}': {e}")
+    finally:
+        await redis_client.aclose()
 
 # --- Synchronous Celery Task Wrappers ---
 
-@celery_app.task(bind=True, max_retries=3)
-def notify_user(self, user_id: int, text: str, category: str = 'system', button_text: str = None, button_callback: str = None):
+@celery_app.task(bind=True, max_retries=5)
+def notify_user(self, user_id: int, text: str, category: str = 'system', button_text: str = None, button_callback: str = None,
+                idempotency_key: str = None, chat_id: int = None):
     """
     Synchronous Celery task that wraps the async user notification logic.
+    Flood control is retried after exactly `retry_after`, other failures with jittered backoff.
+    Without an explicit `idempotency_key` the task id is used, which Celery keeps across retries.
     """
+    idempotency_key = idempotency_key or f"task:{self.request.id}"
     try:
-        asyncio.run(_async_notify_user(user_id, text, category, button_text, button_callback))
+        asyncio.run(_async_notify_user(user_id, text, category, button_text, button_callback, idempotency_key, chat_id))
+    except SendDeferred as exc:
+        self.retry(exc=exc, countdown=exc.retry_after)
     except Exception as exc:
         logger.error(f"Error in notify_user for user_id={user_id}: {exc}")
-        self.retry(exc=exc, countdown=60)
+        self.retry(exc=exc, countdown=backoff_delay(self.request.retries))
 
-@celery_app.task(bind=True, max_retries=3)
+@celery_app.task(bind=True, max_retries=5)
 def notify_admin(self, text: str, category: str = 'audit', user_id: int | None = None):
     """
     Synchronous Celery task that wraps the async admin notification logic.
     """
     try:
         asyncio.run(_async_notify_admin(text, category, user_id))
+    except SendDeferred as exc:
+        self.retry(exc=exc, countdown=exc.retry_after)
     except Exception as exc:
         logger.error(f"Error in notify_admin: {exc}")
-        self.retry(exc=exc, countdown=60)
+        self.retry(exc=exc, countdown=backoff_delay(self.request.retries))
 
 # --- High-Level and Periodic Tasks ---
 
+async def _enqueue_bulk(notifications: AsyncIterator[dict], label: str) -> int:
+    """
+    Publishes fan-out user notifications (`notify_user` kwargs) in batches with backpressure:
+    while the bulk backlog is deeper than the high watermark, publishing pauses until the
+    consumers catch up. Goes to the delivery worker's stream when it is enabled, to the
+    Celery `bulk` queue otherwise. Notifications are consumed lazily, so a producer that
+    reads recipients in batches keeps memory flat. The producer must not hold a transaction
+    open across batches: a pause here can last as long as the consumers lag.
+
+    Returns:
+        The number of queued notifications.
+    """
+    broker = aioredis.from_url(config.REDIS_URL if config.DELIVERY_WORKER_ENABLED else config.CELERY_BROKER_URL)
+    queued = 0
+    batch = []
+    try:
+        async for notification in notifications:
+            batch.append(notification)
+            if len(batch) >= config.BULK_PUBLISH_BATCH_SIZE:
+                await _publish_bulk_batch(broker, batch, label)
+                queued += len(batch)
+                batch = []
+                logger.info(f"{label}: queued {queued} notifications.")
+        if batch:
+            await _publish_bulk_batch(broker, batch, label)
+            queued += len(batch)
+        logger.info(f"{label}: done, {queued} notifications queued.")
+        return queued
+    finally:
+        await broker.aclose()
+
+async def _publish_bulk_batch(broker: aioredis.Redis, batch: list[dict], label: str) -> None:
+    while (depth := await _bulk_backlog(broker)) > config.BULK_QUEUE_HIGH_WATERMARK:
+        logger.info(f"{label}: bulk backlog {depth} is above {config.BULK_QUEUE_HIGH_WATERMARK}, pausing.")
+        await asyncio.sleep(config.BULK_THROTTLE_INTERVAL)
+    if config.DELIVERY_WORKER_ENABLED:
+        await publish_notifications(broker, batch)
+    else:
+        await asyncio.to_thread(group(notify_user.s(**kwargs) for kwargs in batch).apply_async)
+
+async def _bulk_backlog(broker: aioredis.Redis) -> int:
+    """Returns the number of bulk notifications waiting for delivery."""
+    if config.DELIVERY_WORKER_ENABLED:
+        return await broker.xlen(STREAM_BULK)
+    return await broker.llen(QUEUE_BULK)
+
+async def _new_book_notifications(conn: asyncpg.Connection, book: dict) -> AsyncIterator[dict]:
+    """Streams new-arrival notifications for every notifiable user, with chat ids already resolved."""
+    book_id = book['id']
+    text = f"🆕 **В библиотеке пополнение!**\n\nКнига «{book['name']}» от автора {book['author']} была добавлена в каталог."
+    async for users in db_data.iter_notifiable_users(conn, batch_size=config.BULK_PUBLISH_BATCH_SIZE):
+        for user in users:
+            yield dict(user_id=user['id'], text=text, category='new_arrival',
+                       button_text="📖 Посмотреть карточку книги", button_callback=f"view_book_{book_id}",
+                       idempotency_key=f"new_book:{book_id}:{user['id']}", chat_id=user['telegram_id'])
+
 async def _async_broadcast_new_book(book_id: int):
     """
     Asynchronous logic for broadcasting a new book notification to all users.
+    Recipients are read in keyset batches, one short query per batch, and published as they are read.
     """
     logger.info(f"Starting new book broadcast for book_id: {book_id}")
-    conn = None
+    conn = await get_connection()
     try:
-        conn = await get_connection()
         book = await db_data.get_book_card_details(conn, book_id)
-        all_user_ids = await db_data.get_all_user_ids(conn)
+        queued = await _enqueue_bulk(_new_book_notifications(conn, book), label=f"new book broadcast {book_id}")
     finally:
-        if conn:
-            await conn.close()
-
-    text = f"🆕 **В библиотеке пополнение!**\n\nКнига «{book['name']}» от автора {book['author']} была добавлена в каталог."
-    button_text = "📖 Посмотреть карточку книги"
-    button_callback = f"view_book_{book_id}"
+        await conn.close()
 
-    BATCH_SIZE = 50
-    for i in range(0, len(all_user_ids), BATCH_SIZE):
-        batch = all_user_ids[i:i + BATCH_SIZE]
-        job = group(
-            notify_user.s(user_id=uid, text=text, category='new_arrival', button_text=button_text, button_callback=button_callback)
-            for uid in batch
-        )
-        job.apply_async()
-        logger.info(f"Sent {i + len(batch)}/{len(all_user_ids)} notifications.")
-
-    notify_admin.delay(f"🚀 New book broadcast for '{book['name']}' completed for {len(all_user_ids)} users.")
+    notify_admin.delay(f"🚀 New book broadcast for '{book['name']}' completed for {queued} users.")
 
 @celery_app.task(bind=True, max_retries=3)
 def broadcast_new_book(self, book_id: int):
@@ -233,27 +405,35 @@ def broadcast_new_book(self, book_id: int):
         notify_admin.delay(f"❗️ Error broadcasting new book (ID: {book_id}): {e}")
         self.retry(exc=e, countdown=30)
 
+async def _due_date_notifications(conn: asyncpg.Connection) -> AsyncIterator[dict]:
+    """Streams overdue and due-soon reminders; users without a reachable chat are skipped."""
+    # Daily keys: a re-run of the check on the same day does not repeat reminders.
+    today = datetime.now().date().isoformat()
+    async for entry in db_data.iter_users_with_overdue_books(conn):
+        if not entry['telegram_id'] or entry['bot_blocked']:
+            continue
+        user_text = f"❗️ **Просрочка:** Срок возврата «{entry['book_name']}» истек {entry['due_date'].strftime('%d.%m.%Y')}!"
+        yield dict(user_id=entry['user_id'], text=user_text, category='due_date',
+                   idempotency_key=f"overdue:{entry['borrow_id']}:{today}", chat_id=entry['telegram_id'])
+
+    async for entry in db_data.iter_users_with_books_due_soon(conn, days_ahead=2):
+        if not entry['telegram_id'] or entry['bot_blocked']:
+            continue
+        user_text = f"🔔 **Напоминание:** Срок возврата «{entry['book_name']}» истекает через 2 дня."
+        yield dict(user_id=entry['user_id'], text=user_text, category='due_date_reminder',
+                   button_text="♻️ Продлить на 7 дней", button_callback=f"extend_borrow_{entry['borrow_id']}",
+                   idempotency_key=f"due_soon:{entry['borrow_id']}:{entry['due_date']}", chat_id=entry['telegram_id'])
+
 async def _async_check_due_dates():
     """
     Asynchronous logic for checking book due dates and sending reminders.
     """
     logger.info("Running periodic task: checking book due dates...")
-    conn = None
+    conn = await get_connection()
     try:
-        conn = await get_connection()
-        overdue_entries = await db_data.get_users_with_overdue_books(conn)
-        due_soon_entries = await db_data.get_users_with_books_due_soon(conn, days_ahead=2)
+        await _enqueue_bulk(_due_date_notifications(conn), label="due date reminders")
     finally:
-        if conn:
-            await conn.close()
-
-    for entry in overdue_entries:
-        user_text = f"❗️ **Просрочка:** Срок возврата «{entry['book_name']}» истек {entry['due_date'].strftime('%d.%m.%Y')}!"
-        notify_user.delay(user_id=entry['user_id'], text=user_text, category='due_date')
-
-    for entry in due_soon_entries:
-        user_text = f"🔔 **Напоминание:** Срок возврата «{entry['book_name']}» истекает через 2 дня."
-        notify_user.delay(user_id=entry['user_id'], text=user_text, category='due_date_reminder', button_text="♻️ Продлить на 7 дней", button_callback=f"extend_borrow_{entry['borrow_id']}")
+        await conn.close()
 
 @celery_app.task
 def check_due_dates_and_notify():
@@ -271,6 +451,109 @@ def check_due_dates_and_notify():
         logger.error(error_message, exc_info=True)
         notify_admin.delay(text=error_message, category='error')
 
+# --- Reservation Queue ---
+
+def _reservation_hold_notifications(result: dict) -> list[dict]:
+    """Outbox payloads for users whose hold expired and for those who received the copy."""
+    notifications = [
+        dict(user_id=row['user_id'], category='reservation',
+             text=f"⌛️ Срок брони книги «{row['book_name']}» истек, экземпляр передан следующему читателю.")
+        for row in result['expired']
+    ]
+    notifications.extend(
+        dict(user_id=row['user_id'], category='reservation',
+             text=f"🎉 Книга «{row['book_name']}», которую вы ждали, снова в наличии!\n\n"
+                  f"Экземпляр отложен для вас до **{row['hold_expires_at'].strftime('%d.%m.%Y %H:%M')}**.",
+             button_text="📥 Взять книгу", button_callback=f"borrow_book_{row['book_id']}")
+        for row in result['passed']
+    )
+    return notifications
+
+async def _async_expire_reservation_holds() -> tuple[int, int]:
+    """
+    Expires overdue holds batch by batch. Each batch and its notifications are committed
+    together, so a crash never loses a hand-over message or sends one twice.
+    """
+    expired = passed = 0
+    conn = await get_connection()
+    try:
+        while True:
+            async with conn.transaction():
+                result = await db_data.expire_reservation_holds(conn, limit=config.RESERVATION_SWEEP_BATCH)
+                await db_data.enqueue_user_notifications(conn, _reservation_hold_notifications(result))
+            expired += len(result['expired'])
+            passed += len(result['passed'])
+            if len(result['expired']) < config.RESERVATION_SWEEP_BATCH:
+                return expired, passed
+    finally:
+        await conn.close()
+
+@celery_app.task
+def expire_reservation_holds():
+    """
+    Periodic sweep: passes copies held for users who did not pick them up to the next waiter.
+    """
+    try:
+        expired, passed = asyncio.run(_async_expire_reservation_holds())
+        if expired:
+            logger.info(f"Reservation sweep: {expired} holds expired, {passed} copies passed on.")
+    except Exception as e:
+        error_message = f"❗️ Critical error in periodic task `expire_reservation_holds`: {e}"
+        logger.error(error_message, exc_info=True)
+        notify_admin.delay(text=error_message, category='error')
+
+# --- Denormalized Counters ---
+
+async def _async_reconcile_user_counters() -> int:
+    conn = await get_connection()
+    try:
+        return await db_data.reconcile_user_counters(conn)
+    finally:
+        await conn.close()
+
+@celery_app.task
+def reconcile_user_counters():
+    """
+    Periodic repair of users.active_loans/unread_notifications. The counters are kept by
+    triggers, so any drift points at a write path that bypassed them and is reported.
+    """
+    try:
+        repaired = asyncio.run(_async_reconcile_user_counters())
+        if repaired:
+            message = f"⚠️ User counters drifted and were repaired for {repaired} users."
+            logger.warning(message)
+            notify_admin.delay(text=message, category='audit')
+    except Exception as e:
+        error_message = f"❗️ Critical error in periodic task `reconcile_user_counters`: {e}"
+        logger.error(error_message, exc_info=True)
+        notify_admin.delay(text=error_message, category='error')
+
+# --- Inline Catalog Index ---
+
+async def _async_rebuild_catalog_index() -> int:
+    conn = await get_connection()
+    try:
+        rows = [(row['id'], row['name'], row['author'], row['is_available'])
+                async for row in db_data.iter_catalog_for_index(conn)]
+    finally:
+        await conn.close()
+    return build_index(rows, config.CATALOG_INDEX_PATH)
+
+@celery_app.task
+def rebuild_catalog_index():
+    """
+    Rebuilds the memory-mapped index behind the library bot's inline mode. Runs periodically
+    (to pick up availability changes) and right after the admin bot changes the catalog.
+    """
+    try:
+        count = asyncio.run(_async_rebuild_catalog_index())
+        logger.info(f"Catalog index rebuilt: {count} books.")
+        return count
+    except Exception as e:
+        error_message = f"❗️ Critical error in task `rebuild_catalog_index`: {e}"
+        logger.error(error_message, exc_info=True)
+        notify_admin.delay(text=error_message, category='error')
+
 # --- Database Backup and Health Check Tasks ---
 
 def cleanup_old_backups(backup_dir, days=30):
@@ -344,6 +627,18 @@ celery_app.conf.beat_schedule = {
         'task': 'src.core.tasks.backup_database_task',
         'schedule': crontab(hour=3, minute=0),
     },
+    'expire-reservation-holds': {
+        'task': 'src.core.tasks.expire_reservation_holds',
+        'schedule': crontab(minute='*/15'),
+    },
+    'reconcile-user-counters-every-day': {
+        'task': 'src.core.tasks.reconcile_user_counters',
+        'schedule': crontab(hour=4, minute=0),
+    },
+    'rebuild-catalog-index': {
+        'task': 'src.core.tasks.rebuild_catalog_index',
+        'schedule': crontab(minute='*/10'),
+    },
     'health-check-every-hour': {
         'task': 'src.core.tasks.health_check_task',
         'schedule': crontab(minute=0),
@@ -1,13 +1,15 @@
+import asyncio
 import logging
 from functools import wraps
-from time import time
+from time import time, monotonic
 from collections import defaultdict
 import threading
 
 from telegram import Update
+from telegram.error import TelegramError
 from telegram.ext import ContextTypes
 
-from src.core import tasks
+from src.core import config, tasks
 
 logger = logging.getLogger(__name__)
 
@@ -33,7 +35,10 @@ def cleanup_rate_limit_data():
         user_last_request.pop(user_id, None)
     if expired_users:
         logger.info(f"Очищено {len(expired_users)} записей rate limit")
-    threading.Timer(CLEANUP_INTERVAL, cleanup_rate_limit_data).start()
+    # Демон: таймер не должен задерживать завершение процесса
+    timer = threading.Timer(CLEANUP_INTERVAL, cleanup_rate_limit_data)
+    timer.daemon = True
+    timer.start()
 
 def rate_limit(seconds=2, alert_admins=False):
     """Декоратор для ограничения скорости запросов."""
@@ -82,5 +87,72 @@ def rate_limit(seconds=2, alert_admins=False):
         return wrapper
     return decorator
 
+# --- Дедупликация повторных нажатий (single-flight) ---
+# Ключ — пользователь, callback_data и сообщение в том виде, в котором по нему нажали (id и время
+# правки): после того как сообщение перерисовано, та же кнопка на нем снова обрабатывается.
+# Пока обработчик выполняется, повторные нажатия ждут его результат; еще CALLBACK_DEDUP_WINDOW
+# секунд после завершения получают его сразу.
+_in_flight: dict[tuple, asyncio.Future] = {}
+_recent_results: dict[tuple, tuple[float, object]] = {}
+
+def _callback_key(update: Update) -> tuple:
+    query = update.callback_query
+    message = query.message
+    return (
+        update.effective_user.id, query.data,
+        message.message_id if message else query.inline_message_id,
+        getattr(message, 'edit_date', None),
+    )
+
+def _forget_expired_results(now: float) -> None:
+    for key in [key for key, (expires_at, _) in _recent_results.items() if expires_at < now]:
+        del _recent_results[key]
+
+async def _answer_duplicate(update: Update) -> None:
+    # Повтор только снимает «часики» с кнопки: сообщение уже обновил первый обработчик
+    try:
+        await update.callback_query.answer()
+    except TelegramError as e:
+        logger.debug(f"Не удалось ответить на повторный callback: {e}")
+
+def single_flight(window: float | None = None):
+    """
+    Декоратор для обработчиков кнопок: повторное нажатие той же кнопки тем же пользователем
+    не запускает обработчик второй раз, а возвращает состояние первого вызова.
+    Если первый вызов упал, повторы возвращают None (состояние диалога не меняется).
+    Ставится над rate_limit, чтобы двойное нажатие не считалось нарушением.
+    """
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            query = update.callback_query
+            if query is None or query.data is None:
+                return await func(update, context)
+
+            key = _callback_key(update)
+            now = monotonic()
+            recent = _recent_results.get(key)
+            if recent is not None and recent[0] >= now:
+                await _answer_duplicate(update)
+                return recent[1]
+            pending = _in_flight.get(key)
+            if pending is not None:
+                await _answer_duplicate(update)
+                return await asyncio.shield(pending)
+
+            future = asyncio.get_running_loop().create_future()
+            _in_flight[key] = future
+            result = None
+            try:
+                result = await func(update, context)
+                _forget_expired_results(now)
+                _recent_results[key] = (monotonic() + (config.CALLBACK_DEDUP_WINDOW if window is None else window), result)
+                return result
+            finally:
+                del _in_flight[key]
+                future.set_result(result)
+        return wrapper
+    return decorator
+
 # Запуск фоновой задачи очистки
-cleanup_rate_limit_data()
\ No newline at end of file
+cleanup_rate_limit_data()
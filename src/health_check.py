@@ -1,9 +1,10 @@
 # src/health_check.py
 """
 Модуль health check для мониторинга состояния всех компонентов системы.
-Проверяет: PostgreSQL, Redis, Telegram API, Celery workers.
+Проверяет: PostgreSQL, Redis, Telegram API, Celery workers, задержку циклов событий.
 """
 import os
+import json
 import logging
 import asyncio
 from typing import Tuple, Dict, Any
@@ -89,9 +90,12 @@ def check_redis() -> Tuple[bool, str, Dict[str, Any]]:
         metrics['used_memory_human'] = info.get('used_memory_human', 'N/A')
         metrics['uptime_days'] = info.get('uptime_in_days', 0)
         
-        # Проверка очереди Celery
-        queue_length = r.llen('celery')
-        metrics['celery_queue_length'] = queue_length
+        # Проверка очередей Celery
+        from src.core.tasks import CELERY_QUEUES
+        metrics['celery_queues'] = {queue: r.llen(queue) for queue in CELERY_QUEUES}
+        metrics['celery_queue_length'] = sum(metrics['celery_queues'].values())
+        from src.core.notification_streams import DELIVERY_STREAMS
+        metrics['delivery_backlog'] = sum(r.xlen(stream) for stream in DELIVERY_STREAMS)
         
         return True, "Redis: OK", metrics
         
@@ -192,6 +196,34 @@ def check_celery_workers() -> Tuple[bool, str, Dict[str, Any]]:
         return False, f"Celery: {str(e)[:100]}", {}
 
 
+def check_event_loops() -> Tuple[bool, str, Dict[str, Any]]:
+    """
+    Читает из Redis последние окна задержки цикла событий, которые публикуют боты
+    и воркер доставки (src/core/loop_monitor.py). Проверка информационная: отсутствие
+    данных (монитор выключен, процесс только запущен) не считается сбоем.
+
+    Returns:
+        Tuple[bool, str, Dict]: (успех, сообщение, статистика по процессам)
+    """
+    try:
+        from src.core.loop_monitor import LOOP_STATS_KEY_PREFIX
+        r = Redis.from_url(config.REDIS_URL, socket_connect_timeout=5)
+        loops = {}
+        for key in r.scan_iter(match=f"{LOOP_STATS_KEY_PREFIX}*"):
+            raw = r.get(key)
+            if raw:
+                stats = json.loads(raw)
+                loops[stats['name']] = stats
+        if not loops:
+            return True, "Event loops: NO DATA", {}
+        blocked = [name for name, stats in loops.items() if stats.get('stalls')]
+        message = f"Event loops: STALLS in {', '.join(sorted(blocked))}" if blocked else "Event loops: OK"
+        return True, message, loops
+    except Exception as e:
+        logger.error(f"Event loop stats check failed: {e}")
+        return True, f"Event loops: {str(e)[:100]}", {}
+
+
 async def check_disk_space() -> Tuple[bool, str, Dict[str, Any]]:
     """
     Проверяет доступное место на диске.
@@ -264,6 +296,9 @@ async def run_health_check() -> Tuple[bool, str]:
         report_lines.append(f"   Connected clients: {redis_metrics.get('connected_clients', 0)}")
         report_lines.append(f"   Memory: {redis_metrics.get('used_memory_human', 'N/A')}")
         report_lines.append(f"   Queue length: {redis_metrics.get('celery_queue_length', 0)}")
+        for queue, length in redis_metrics.get('celery_queues', {}).items():
+            report_lines.append(f"     {queue}: {length}")
+        report_lines.append(f"   Delivery backlog: {redis_metrics.get('delivery_backlog', 0)}")
     report_lines.append("")
     all_checks_passed &= redis_ok
     
@@ -294,6 +329,19 @@ async def run_health_check() -> Tuple[bool, str]:
         report_lines.append(f"   Free: {disk_metrics.get('free_gb', 0)} GB ({100 - disk_metrics.get('used_percent', 0):.1f}%)")
     report_lines.append("")
     all_checks_passed &= disk_ok
+
+    # 6. Задержка циклов событий (за последнее окно отчета каждого процесса)
+    loops_ok, loops_msg, loops_stats = check_event_loops()
+    report_lines.append(f"⏱  {loops_msg}")
+    for name, stats in sorted(loops_stats.items()):
+        status_symbol = "⚠️" if stats.get('stalls') else "✅"
+        report_lines.append(
+            f"   {status_symbol} {name}: avg {stats.get('avg_lag_ms', 0)} ms, "
+            f"max {stats.get('max_lag_ms', 0)} ms, stalls {stats.get('stalls', 0)} "
+            f"(total {stats.get('stalls_total', 0)})"
+        )
+    report_lines.append("")
+    all_checks_passed &= loops_ok
     
     # Итог
     report_lines.append("=" * 60)
@@ -110,11 +110,13 @@ async def check_login_password(update: Update, context: ContextTypes.DEFAULT_TYP
             lockout_duration = 300  # 5 минут
             login_lockouts[user_id] = (time() + lockout_duration, attempts)
 
-            tasks.notify_admin.delay(
-                text=f"🔒 **[АУДИТ БЕЗОПАСНОСТИ]**\n\nЗамечено {attempts} неудачных попытки входа для пользователя @{user.get('username', user.get('contact_info'))}. Вход заблокирован на 5 минут.",
-                category='security_alert',
-                user_id=user_id
-            )
+            async with get_db_connection() as conn:
+                await db_data.enqueue_admin_notification(
+                    conn,
+                    text=f"🔒 **[АУДИТ БЕЗОПАСНОСТИ]**\n\nЗамечено {attempts} неудачных попытки входа для пользователя @{user.get('username', user.get('contact_info'))}. Вход заблокирован на 5 минут.",
+                    category='security_alert',
+                    user_id=user_id
+                )
 
             context.user_data.pop('login_attempts', None)
             await context.bot.send_message(
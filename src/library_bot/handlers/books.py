@@ -6,16 +6,19 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 
 from src.core.db import data_access as db_data
-from src.core.db.utils import get_db_connection
-from src.core import tasks
+from src.core.db.utils import get_db_connection, DbSession
+from src.core import config, tasks
+from src.core.search_cache import search_cache
+from src.core.message_renderer import render_screen
 from src.library_bot.states import State
-from src.core.utils import rate_limit
+from src.core.utils import rate_limit, single_flight
 from src.library_bot import keyboards
 
 logger = logging.getLogger(__name__)
 
 # --- Обработчики взятия, возврата и резервирования ---
 
+@single_flight()
 @rate_limit(seconds=3, alert_admins=True)
 async def process_borrow_selection(update: Update, context: ContextTypes.DEFAULT_TYPE) -> State:
     """Обрабатывает выбор книги для взятия или резервирования."""
@@ -25,48 +28,49 @@ async def process_borrow_selection(update: Update, context: ContextTypes.DEFAULT
     user = context.user_data['current_user']
 
     try:
-        async with get_db_connection() as conn:
-            selected_book = await db_data.get_book_by_id(conn, book_id)
-
-            if selected_book['available_quantity'] > 0:
-                borrowed_books = await db_data.get_borrowed_books(conn, user['id'])
-                from src.library_bot.utils import get_user_borrow_limit
-                borrow_limit = get_user_borrow_limit(user['status'])
-
-                if len(borrowed_books) >= borrow_limit:
-                    await query.answer(f"⚠️ Вы достигли лимита ({borrow_limit}) на заимствование.", show_alert=True)
-                    return State.USER_MENU
-
-                due_date = await db_data.borrow_book(conn, user['id'], selected_book['id'])
-                await db_data.log_activity(conn, user_id=user['id'], action="borrow_book", details=f"Book ID: {selected_book['id']}")
-
-                due_date_str = due_date.strftime('%d.%m.%Y')
-                notification_text = f"✅ Вы успешно взяли книгу «{selected_book['name']}».\n\nПожалуйста, верните ее до **{due_date_str}**."
-                tasks.notify_user.delay(user_id=user['id'], text=notification_text, category='confirmation')
-
-                await query.edit_message_text("👍 Отлично! Подтверждение отправлено вам в бот-уведомитель.")
-                from src.library_bot.handlers.user_menu import user_menu
-                await user_menu(update, context)
-                return State.USER_MENU
-
-            else:
-                context.user_data['book_to_reserve'] = selected_book
-                keyboard = [
-                    [InlineKeyboardButton("✅ Да, уведомить", callback_data="reserve_yes")],
-                    [InlineKeyboardButton("❌ Нет, спасибо", callback_data="reserve_no")]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                await query.edit_message_text(f"⏳ Книга «{selected_book['name']}» временно отсутствует. Хотите зарезервировать?", reply_markup=reply_markup)
-                return State.USER_RESERVE_BOOK_CONFIRM
+        from src.library_bot.utils import get_user_borrow_limit
+        borrow_limit = get_user_borrow_limit(user['status'])
+
+        async with DbSession() as session:
+            conn = await session.connection()
+            # Проверка наличия и лимита, выдача и запись в журнал — одним запросом
+            result = await db_data.checkout_book(conn, user['id'], book_id, borrow_limit)
+            if result['status'] == 'borrowed':
+                due_date_str = result['due_date'].strftime('%d.%m.%Y')
+                notification_text = f"✅ Вы успешно взяли книгу «{result['book_name']}».\n\nПожалуйста, верните ее до **{due_date_str}**."
+                await db_data.enqueue_user_notification(conn, user['id'], notification_text, category='confirmation')
+
+        search_cache.invalidate_book(book_id)
+        if result['status'] == 'limit_reached':
+            await query.answer(f"⚠️ Вы достигли лимита ({borrow_limit}) на заимствование.", show_alert=True)
+            return State.USER_MENU
+
+        if result['status'] == 'borrowed':
+            await render_screen(update, context, "👍 Отлично! Подтверждение отправлено вам в бот-уведомитель.")
+            from src.library_bot.handlers.user_menu import user_menu
+            await user_menu(update, context)
+            return State.USER_MENU
+
+        else:
+            selected_book = {'id': result['book_id'], 'name': result['book_name']}
+            context.user_data['book_to_reserve'] = selected_book
+            keyboard = [
+                [InlineKeyboardButton("✅ Да, уведомить", callback_data="reserve_yes")],
+                [InlineKeyboardButton("❌ Нет, спасибо", callback_data="reserve_no")]
+            ]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            await render_screen(update, context, f"⏳ Книга «{selected_book['name']}» временно отсутствует. Хотите зарезервировать?", reply_markup=reply_markup)
+            return State.USER_RESERVE_BOOK_CONFIRM
 
     except Exception as e:
         logger.error(f"Критическая ошибка в process_borrow_selection: {e}", exc_info=True)
         tasks.notify_admin.delay(text=f"❗️ **Критическая ошибка в `librarybot`**: `{e}`", category='error')
-        await query.edit_message_text("❌ Непредвиденная ошибка. Мы уже работаем над этим.")
+        await render_screen(update, context, "❌ Непредвиденная ошибка. Мы уже работаем над этим.")
         from src.library_bot.handlers.user_menu import user_menu
         await user_menu(update, context)
         return State.USER_MENU
 
+@single_flight()
 async def process_reservation_decision(update: Update, context: ContextTypes.DEFAULT_TYPE) -> State:
     """Обрабатывает решение о резервации."""
     query = update.callback_query
@@ -80,7 +84,8 @@ async def process_reservation_decision(update: Update, context: ContextTypes.DEF
 
     if query.data == 'reserve_yes':
         user_id = context.user_data['current_user']['id']
-        async with get_db_connection() as conn:
+        async with DbSession() as session:
+            conn = await session.connection()
             result = await db_data.add_reservation(conn, user_id, book_to_reserve['id'])
             await db_data.log_activity(conn, user_id=user_id, action="reserve_book", details=f"Book ID: {book_to_reserve['id']}")
         await query.edit_message_text(f"👍 {result}")
@@ -103,11 +108,12 @@ async def start_return_book(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await query.answer("✅ У вас нет книг на руках.", show_alert=True)
         return State.USER_MENU
 
-    context.user_data['borrowed_map'] = {f"return_{i}": {'borrow_id': b['borrow_id'], 'book_id': b['book_id'], 'book_name': b['book_name']} for i, b in enumerate(borrowed_books)}
+    context.user_data['borrowed_map'] = {f"return_{i}": b for i, b in enumerate(borrowed_books)}
     reply_markup = keyboards.get_return_book_keyboard(borrowed_books)
     await query.edit_message_text("📤 Выберите книгу для возврата:", reply_markup=reply_markup)
     return State.USER_RETURN_BOOK
 
+@single_flight()
 @rate_limit(seconds=3, alert_admins=True)
 async def process_return_book(update: Update, context: ContextTypes.DEFAULT_TYPE) -> State:
     """Обрабатывает возврат книги и инициирует уведомления."""
@@ -122,33 +128,39 @@ async def process_return_book(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     user_id = context.user_data['current_user']['id']
     try:
-        async with get_db_connection() as conn:
-            await db_data.return_book(conn, borrowed_info['borrow_id'], borrowed_info['book_id'])
-            await db_data.log_activity(conn, user_id=user_id, action="return_book", details=f"Book ID: {borrowed_info['book_id']}")
-
-            # Уведомляем пользователя и предлагаем оценить
-            tasks.notify_user.delay(
-                user_id=user_id,
-                text=f"✅ Книга «{borrowed_info['book_name']}» успешно возвращена. Не хотите ли поставить ей оценку?",
-                category='confirmation',
-                button_text="⭐ Поставить оценку",
-                button_callback=f"rate_book_{borrowed_info['book_id']}"
-            )
+        async with DbSession() as session:
+            conn = await session.connection()
+            # Закрытие выдачи, возврат на полку, журнал и выбор брони — одним запросом
+            returned = await db_data.checkin_book(conn, borrowed_info['borrow_id'], user_id)
+            if returned:
+                # Уведомляем пользователя и предлагаем оценить
+                await db_data.enqueue_user_notification(
+                    conn,
+                    user_id=user_id,
+                    text=f"✅ Книга «{returned['book_name']}» успешно возвращена. Не хотите ли поставить ей оценку?",
+                    category='confirmation',
+                    button_text="⭐ Поставить оценку",
+                    button_callback=f"rate_book_{returned['book_id']}"
+                )
 
-            # Проверяем резервации
-            reservations = await db_data.get_reservations_for_book(conn, borrowed_info['book_id'])
-            if reservations:
-                next_user_id = reservations[0]
-                tasks.notify_user.delay(
-                    user_id=next_user_id,
-                    text=f"🎉 Книга «{borrowed_info['book_name']}», которую вы ждали, снова в наличии!",
+            # Экземпляр уже отложен для первого в очереди в checkin_book
+            if returned and returned['next_user_id']:
+                hold_str = returned['hold_expires_at'].strftime('%d.%m.%Y %H:%M')
+                await db_data.enqueue_user_notification(
+                    conn,
+                    user_id=returned['next_user_id'],
+                    text=f"🎉 Книга «{returned['book_name']}», которую вы ждали, снова в наличии!\n\n"
+                         f"Экземпляр отложен для вас до **{hold_str}**.",
                     category='reservation',
                     button_text="📥 Взять книгу",
-                    button_callback=f"borrow_book_{borrowed_info['book_id']}"
+                    button_callback=f"borrow_book_{returned['book_id']}"
                 )
-                await db_data.update_reservation_status(conn, next_user_id, borrowed_info['book_id'], notified=True)
 
-        await query.edit_message_text(f"✅ Книга «{borrowed_info['book_name']}» возвращена. Подтверждение отправлено в бот-уведомитель.")
+        if returned:
+            search_cache.invalidate_book(returned['book_id'])
+            await query.edit_message_text(f"✅ Книга «{borrowed_info['book_name']}» возвращена. Подтверждение отправлено в бот-уведомитель.")
+        else:
+            await query.edit_message_text(f"ℹ️ Книга «{borrowed_info['book_name']}» уже возвращена.")
     except Exception as e:
         logger.error(f"Ошибка при возврате книги: {e}", exc_info=True)
         tasks.notify_admin.delay(text=f"❗️ **Критическая ошибка при возврате книги**: `{e}`")
@@ -232,33 +244,27 @@ async def handle_rate_from_notification(update: Update, context: ContextTypes.DE
     user_id = context.user_data['current_user']['id']
     
     try:
-        async with get_db_connection() as conn:
+        # Все данные читаются за одну сессию, соединение освобождается до ответа в Telegram
+        async with DbSession() as session:
+            conn = await session.connection()
             # Проверяем, что пользователь действительно брал эту книгу
-            history = await db_data.get_user_borrow_history(conn, user_id)
-            book_found = any(item['book_id'] == book_id for item in history)
-            
-            if not book_found:
-                await query.edit_message_text(
-                    "❌ Вы можете оценить только те книги, которые брали в библиотеке.",
-                    parse_mode='Markdown'
-                )
-                return ConversationHandler.END
-            
-            # Получаем информацию о книге
-            book_info = await db_data.get_book_card_details(conn, book_id)
-            
+            book_found = await db_data.has_borrowed_book(conn, user_id, book_id)
+            if book_found:
+                book_info = await db_data.get_book_card_details(conn, book_id)
+                existing_rating = await db_data.get_user_rating(conn, user_id, book_id)
+
+        if not book_found:
+            await query.edit_message_text(
+                "❌ Вы можете оценить только те книги, которые брали в библиотеке.",
+                parse_mode='Markdown'
+            )
+            return ConversationHandler.END
+
         context.user_data['book_to_rate'] = {
             'book_id': book_id,
             'book_name': book_info['name']
         }
         
-        # Проверяем, есть ли уже оценка
-        async with get_db_connection() as conn:
-            existing_rating = await conn.fetchval(
-                "SELECT rating FROM ratings WHERE user_id = $1 AND book_id = $2",
-                user_id, book_id
-            )
-        
         action_text = "изменить оценку" if existing_rating else "поставить оценку"
         stars_text = f" (текущая: {'⭐' * existing_rating})" if existing_rating else ""
         
@@ -283,6 +289,7 @@ async def handle_rate_from_notification(update: Update, context: ContextTypes.DE
         )
         return ConversationHandler.END
 
+@single_flight()
 async def process_rating(update: Update, context: ContextTypes.DEFAULT_TYPE) -> State:
     """Сохраняет оценку в БД с поддержкой обновления существующих оценок."""
     query = update.callback_query
@@ -291,36 +298,19 @@ async def process_rating(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     user_id = context.user_data['current_user']['id']
     book_info = context.user_data.pop('book_to_rate')
 
-    async with get_db_connection() as conn:
-        # Проверяем существующую оценку
-        existing_rating = await conn.fetchval(
-            "SELECT rating FROM ratings WHERE user_id = $1 AND book_id = $2",
-            user_id, book_info['book_id']
-        )
-        
-        # Добавляем или обновляем оценку
-        await db_data.add_rating(conn, user_id, book_info['book_id'], rating)
-        
+    async with DbSession() as session:
+        conn = await session.connection()
+        # Оценка и запись в журнал — одним запросом, возвращается предыдущая оценка
+        existing_rating = await db_data.rate_book(conn, user_id, book_info['book_id'], rating)
         action = "изменена" if existing_rating else "добавлена"
-        await db_data.log_activity(
-            conn, 
-            user_id=user_id, 
-            action=f"{'update' if existing_rating else 'add'}_rating",
-            details=f"Book ID: {book_info['book_id']}, Rating: {rating}"
-        )
 
-    stars = '⭐' * rating
-    notification_text = (
-        f"✅ Ваша оценка **{action}**!\n\n"
-        f"📖 Книга: «{book_info['book_name']}»\n"
-        f"⭐ Оценка: {stars} ({rating}/5)"
-    )
-    
-    tasks.notify_user.delay(
-        user_id=user_id,
-        text=notification_text,
-        category='confirmation'
-    )
+        stars = '⭐' * rating
+        notification_text = (
+            f"✅ Ваша оценка **{action}**!\n\n"
+            f"📖 Книга: «{book_info['book_name']}»\n"
+            f"⭐ Оценка: {stars} ({rating}/5)"
+        )
+        await db_data.enqueue_user_notification(conn, user_id, notification_text, category='confirmation')
     
     await query.edit_message_text(
         f"✅ Спасибо! Ваша оценка {stars} для книги «{book_info['book_name']}» {action}."
@@ -331,14 +321,16 @@ async def process_rating(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     await user_menu(update, context)
     return State.USER_MENU
 
+@single_flight()
 async def process_book_extension(update: Update, context: ContextTypes.DEFAULT_TYPE) -> State:
     """Обрабатывает продление срока возврата книги."""
     query = update.callback_query
     await query.answer()
     borrow_id = int(query.data.split('_')[2])
+    user_id = context.user_data['current_user']['id']
 
     async with get_db_connection() as conn:
-        result = await db_data.extend_due_date(conn, borrow_id)
+        result = await db_data.extend_due_date(conn, borrow_id, user_id)
 
     if isinstance(result, datetime):
         await query.edit_message_text(f"✅ Срок возврата продлен до **{result.strftime('%d.%m.%Y')}**.", parse_mode='Markdown')
@@ -364,25 +356,37 @@ async def start_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> St
     # Очищаем предыдущие данные поиска
     context.user_data.pop('last_search_term', None)
     context.user_data.pop('current_search_page', None)
-    
-    search_message = (
-        "🔎 **Поиск книг**\n\n"
-        "Введите название книги или фамилию автора.\n"
-        "Например:\n"
-        "• `Булгаков`\n"
-        "• `Мастер и Маргарита`\n"
-        "• `1984`"
-    )
-    
-    keyboard = [[InlineKeyboardButton("⬅️ Назад в меню", callback_data="user_menu")]]
+    fulltext = bool(query) and query.data == 'search_fulltext'
+    context.user_data['search_mode'] = 'fulltext' if fulltext else 'simple'
+
+    if fulltext:
+        search_message = (
+            "📝 **Поиск по описанию**\n\n"
+            "Опишите, что хотите почитать: слова ищутся в названии, авторе, жанре и описании "
+            "в любой форме (`путешествие` найдет «путешествия»).\n"
+            "Например:\n"
+            "• `путешествие во времени`\n"
+            "• `\"мастер и маргарита\"`\n"
+            "• `дракон -сказка`"
+        )
+        switch_button = InlineKeyboardButton("🔎 Искать по названию и автору", callback_data="search_book")
+    else:
+        search_message = (
+            "🔎 **Поиск книг**\n\n"
+            "Введите название книги или фамилию автора.\n"
+            "Например:\n"
+            "• `Булгаков`\n"
+            "• `Мастер и Маргарита`\n"
+            "• `1984`"
+        )
+        switch_button = InlineKeyboardButton("📝 Искать по описанию", callback_data="search_fulltext")
+
+    keyboard = [[switch_button], [InlineKeyboardButton("⬅️ Назад в меню", callback_data="user_menu")]]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     if query:
-        await query.edit_message_text(
-            text=search_message,
-            reply_markup=reply_markup,
-            parse_mode='Markdown'
-        )
+        # Кнопка «Новый поиск» есть и на карточке с обложкой
+        await render_screen(update, context, search_message, reply_markup=reply_markup, parse_mode='Markdown')
     else:
         await update.message.reply_text(
             text=search_message,
@@ -433,9 +437,19 @@ async def navigate_search_results(update: Update, context: ContextTypes.DEFAULT_
         from src.library_bot.handlers.user_menu import user_menu
         return await user_menu(update, context)
 
-    # ШАГ 2: Загружаем данные из БД (эта логика не меняется).
-    async with get_db_connection() as conn:
-        books, total = await db_data.search_available_books(conn, search_term, limit=5, offset=page * 5)
+    # ШАГ 2: Берем результаты из кэша; в БД идем один раз на запрос — сразу за всеми
+    # результатами вместе с полями карточек, дальше страницы нарезаются из кэша.
+    mode = context.user_data.get('search_mode', 'simple')
+    fulltext = mode == 'fulltext'
+    cached = search_cache.get(mode, search_term)
+    if cached is None:
+        search = db_data.search_books_fulltext if fulltext else db_data.search_available_books
+        async with get_db_connection() as conn:
+            results, total = await search(conn, search_term, limit=config.SEARCH_CACHE_MAX_RESULTS, offset=0)
+        search_cache.put(mode, search_term, results, total)
+    else:
+        results, total = cached
+    books = results[page * 5:(page + 1) * 5]
 
     # Обработка случая, когда ничего не найдено
     if total == 0:
@@ -448,14 +462,23 @@ async def navigate_search_results(update: Update, context: ContextTypes.DEFAULT_
         from src.library_bot.handlers.user_menu import user_menu
         return await user_menu(update, context)
 
-    # ШАГ 3: Готовим сообщение и клавиатуру (эта логика не меняется).
+    # ШАГ 3: Готовим сообщение и клавиатуру.
     message_text = f"🔎 Результаты по запросу «{search_term}» (Стр. {page + 1}):"
-    keyboard_buttons = [[InlineKeyboardButton(f"📖 {b['name']} ({b['author']})", callback_data=f"view_book_{b['id']}")] for b in books]
+    if total > len(results):
+        message_text += f"\nПоказаны первые {len(results)} из {total} — уточните запрос."
+    # Полнотекстовый поиск показывает и выданные книги (их можно забронировать из карточки)
+    keyboard_buttons = [
+        [InlineKeyboardButton(
+            f"{('✅' if b['is_available'] else '❌') if fulltext else '📖'} {b['name']} ({b['author']})",
+            callback_data=f"view_book_{b['id']}"
+        )]
+        for b in books
+    ]
 
     nav_buttons = []
     if page > 0:
         nav_buttons.append(InlineKeyboardButton("⬅️", callback_data=f"search_page_{page - 1}"))
-    if (page + 1) * 5 < total:
+    if (page + 1) * 5 < len(results):
         nav_buttons.append(InlineKeyboardButton("➡️", callback_data=f"search_page_{page + 1}"))
     if nav_buttons:
         keyboard_buttons.append(nav_buttons)
@@ -475,14 +498,18 @@ async def navigate_search_results(update: Update, context: ContextTypes.DEFAULT_
 
     return State.SHOWING_SEARCH_RESULTS
 
+@single_flight()
 async def show_book_card_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> State:
     """Показывает детальную карточку книги."""
     query = update.callback_query
     await query.answer()
     book_id = int(query.data.split('_')[2])
 
-    async with get_db_connection() as conn:
-        book = await db_data.get_book_card_details(conn, book_id)
+    # Карточки из результатов поиска уже в кэше
+    book = search_cache.get_card(book_id)
+    if book is None:
+        async with get_db_connection() as conn:
+            book = await db_data.get_book_card_details(conn, book_id)
 
     message_parts = [
         f"**📖 {book['name']}**", f"**Автор:** {book['author']}", f"**Жанр:** {book['genre']}",
@@ -492,17 +519,11 @@ async def show_book_card_user(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     reply_markup = keyboards.get_book_card_keyboard(book['id'], book['is_available'])
 
-    await query.message.delete()
-    if book.get('cover_image_id'):
-        await context.bot.send_photo(
-            chat_id=query.message.chat_id, photo=book['cover_image_id'],
-            caption="\n".join(message_parts), reply_markup=reply_markup, parse_mode='Markdown'
-        )
-    else:
-        await context.bot.send_message(
-            chat_id=query.message.chat_id, text="\n".join(message_parts),
-            reply_markup=reply_markup, parse_mode='Markdown'
-        )
+    # Правка на месте, если вид сообщения (текст или фото) не меняется, иначе — замена сообщения
+    await render_screen(
+        update, context, "\n".join(message_parts), reply_markup=reply_markup,
+        photo=book.get('cover_image_id'), parse_mode='Markdown'
+    )
     return State.SHOWING_SEARCH_RESULTS
 
 async def show_top_books(update: Update, context: ContextTypes.DEFAULT_TYPE) -> State:
@@ -564,7 +585,10 @@ async def show_genres(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Sta
         await query.edit_message_text("😔 В каталоге пока нет книг с указанием жанра.", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Назад в меню", callback_data="user_menu")]]))
         return State.USER_MENU
 
-    keyboard = [[InlineKeyboardButton(f"🎭 {genre}", callback_data=f"genre_{genre}")] for genre in genres]
+    keyboard = [
+        [InlineKeyboardButton(f"🎭 {genre['name']} ({genre['available_books']})", callback_data=f"genre_{genre['id']}_0")]
+        for genre in genres
+    ]
     keyboard.append([InlineKeyboardButton("⬅️ Назад в меню", callback_data="user_menu")])
     await query.edit_message_text("📚 Выберите интересующий вас жанр:", reply_markup=InlineKeyboardMarkup(keyboard))
     return State.SHOWING_GENRES
@@ -575,13 +599,21 @@ async def show_books_in_genre(update: Update, context: ContextTypes.DEFAULT_TYPE
     await query.answer()
 
     parts = query.data.split('_')
-    genre = parts[1]
+    genre_id = int(parts[1])
     page = int(parts[2]) if len(parts) > 2 else 0
     books_per_page = 5
     offset = page * books_per_page
 
-    async with get_db_connection() as conn:
-        books, total_books = await db_data.get_available_books_by_genre(conn, genre, limit=books_per_page, offset=offset)
+    try:
+        async with get_db_connection() as conn:
+            genre = (await db_data.get_genre(conn, genre_id))['name']
+            books, total_books = await db_data.get_available_books_by_genre(conn, genre_id, limit=books_per_page, offset=offset)
+    except db_data.NotFoundError:
+        await query.edit_message_text(
+            "😔 Этот жанр больше не найден.",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ К выбору жанра", callback_data="find_by_genre")]])
+        )
+        return State.SHOWING_GENRES
 
     keyboard = []
 
@@ -598,9 +630,9 @@ async def show_books_in_genre(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     nav_buttons = []
     if page > 0:
-        nav_buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"genre_{genre}_{page - 1}"))
+        nav_buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"genre_{genre_id}_{page - 1}"))
     if (page + 1) * books_per_page < total_books:
-        nav_buttons.append(InlineKeyboardButton("Вперед ➡️", callback_data=f"genre_{genre}_{page + 1}"))
+        nav_buttons.append(InlineKeyboardButton("Вперед ➡️", callback_data=f"genre_{genre_id}_{page + 1}"))
 
     if nav_buttons:
         keyboard.append(nav_buttons)
@@ -628,7 +660,14 @@ async def show_authors_list(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return State.USER_MENU
 
     message_text = f"👥 **Авторы в библиотеке** (Всего: {total})\nСтраница {page + 1}:"
-    keyboard = [[InlineKeyboardButton(f"✍️ {a['name']} ({a['books_count']} книг)", callback_data=f"view_author_{a['id']}")] for a in authors]
+    keyboard = [
+        [InlineKeyboardButton(
+            f"✍️ {a['name']} ({a['available_books_count']}/{a['books_count']} книг"
+            + (f", ⭐ {a['avg_rating']}" if a['avg_rating'] is not None else "") + ")",
+            callback_data=f"view_author_{a['id']}"
+        )]
+        for a in authors
+    ]
 
     nav = []
     if page > 0: nav.append(InlineKeyboardButton("⬅️", callback_data=f"authors_page_{page - 1}"))
@@ -657,8 +696,11 @@ async def show_author_card(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 
     message_parts = [
         f"👤 **{author['name']}**",
-        f"📚 Всего книг: {total_books} | ✅ Доступно: {author['available_books_count']}\n"
+        f"📚 Всего книг: {author['total_books']} | ✅ Доступно: {author['available_books_count']}",
     ]
+    if author['avg_rating'] is not None:
+        message_parts.append(f"⭐ Средняя оценка: {author['avg_rating']} ({author['ratings_count']} оценок)")
+    message_parts.append("")
     if books:
         message_parts.append(f"**📖 Книги автора (стр. {books_page + 1}/{(total_books + 4) // 5}):**")
         for i, book in enumerate(books, 1):
@@ -738,26 +780,27 @@ async def confirm_book_request(update: Update, context: ContextTypes.DEFAULT_TYP
     user_id = context.user_data['current_user']['id']
     
     try:
-        async with get_db_connection() as conn:
+        async with get_db_connection() as conn, conn.transaction():
             request_id = await db_data.create_book_request(conn, user_id, request_data)
             await db_data.log_activity(
                 conn, user_id=user_id, action="book_request",
                 details=f"Requested: {request_data['name']}"
             )
         
-        # Уведомляем админа
-        tasks.notify_admin.delay(
-            text=(
-                f"📚 **Новый запрос на книгу**\n\n"
-                f"**ID запроса:** `{request_id}`\n"
-                f"**Книга:** {request_data['name']}\n"
-                f"**Автор:** {request_data['author']}\n"
-                f"**Жанр:** {request_data.get('genre', 'Не указан')}\n"
-                f"**Описание:** {request_data.get('description', 'Нет')}\n\n"
-                f"Используйте /requests для просмотра всех запросов."
-            ),
-            category='book_request'
-        )
+            # Уведомляем админа
+            await db_data.enqueue_admin_notification(
+                conn,
+                text=(
+                    f"📚 **Новый запрос на книгу**\n\n"
+                    f"**ID запроса:** `{request_id}`\n"
+                    f"**Книга:** {request_data['name']}\n"
+                    f"**Автор:** {request_data['author']}\n"
+                    f"**Жанр:** {request_data.get('genre', 'Не указан')}\n"
+                    f"**Описание:** {request_data.get('description', 'Нет')}\n\n"
+                    f"Используйте /requests для просмотра всех запросов."
+                ),
+                category='book_request'
+            )
         
         await update.message.reply_text(
             "✅ **Запрос отправлен!**\n\n"
@@ -0,0 +1,41 @@
+# src/library_bot/handlers/inline.py
+
+import logging
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle, InputTextMessageContent
+from telegram.ext import ContextTypes
+
+from src.core import config
+from src.core.catalog_index import catalog_index
+
+logger = logging.getLogger(__name__)
+
+# Одна буква совпадает с началом слишком многих слов, такая подсказка бесполезна.
+MIN_QUERY_LENGTH = 2
+
+
+async def inline_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Отвечает на inline-запрос (@bot <запрос>) подсказками из индекса каталога.
+    База данных не используется: индекс строит фоновая задача, бот читает его из отображенного в память файла.
+    """
+    inline_query = update.inline_query
+    text = inline_query.query.strip()
+
+    index = catalog_index.get()
+    if index is None or len(text) < MIN_QUERY_LENGTH:
+        await inline_query.answer([], cache_time=config.INLINE_CACHE_TIME)
+        return
+
+    books = index.search(text, limit=config.INLINE_RESULTS_LIMIT)
+    open_bot = InlineKeyboardMarkup([[InlineKeyboardButton("📚 Открыть библиотеку", url=f"https://t.me/{context.bot.username}")]])
+    results = [
+        InlineQueryResultArticle(
+            id=str(book['id']),
+            title=book['name'],
+            description=f"{book['author']} · {'✅ В наличии' if book['is_available'] else '❌ Нет в наличии'}",
+            input_message_content=InputTextMessageContent(f"📖 {book['name']}\n✍️ {book['author']}"),
+            reply_markup=open_bot,
+        )
+        for book in books
+    ]
+    await inline_query.answer(results, cache_time=config.INLINE_CACHE_TIME)
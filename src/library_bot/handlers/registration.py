@@ -1,5 +1,6 @@
 # src/library_bot/handlers/registration.py
 
+import asyncio
 import logging
 import random
 import re
@@ -30,7 +31,9 @@ async def send_verification_message(contact_info: str, code: str, context: Conte
                 html_content=f'<strong>Ваш код для библиотеки: {code}</strong>'
             )
             sg = SendGridAPIClient(config.SENDGRID_API_KEY)
-            sg.send(message)
+            # Клиент SendGrid синхронный — выполняем его в отдельном потоке,
+            # чтобы не блокировать цикл событий бота.
+            await asyncio.to_thread(sg.send, message)
             context.user_data['verification_method'] = 'email'
             return True
         except Exception as e:
@@ -184,7 +187,21 @@ async def get_username(update: Update, context: ContextTypes.DEFAULT_TYPE) -> St
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
         return State.REGISTER_USERNAME
-    
+
+    # Логин сравнивается в нормализованном виде: «Ivan» и «ivan» — один и тот же логин
+    try:
+        async with get_db_connection() as conn:
+            await db_data.get_user_by_login(conn, username)
+
+        keyboard = [[InlineKeyboardButton("❌ Отменить", callback_data="cancel")]]
+        await update.message.reply_text(
+            "🤔 Этот юзернейм уже занят. Придумайте другой:",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+        return State.REGISTER_USERNAME
+    except db_data.NotFoundError:
+        pass
+
     context.user_data['registration']['username'] = username
     
     keyboard = [[InlineKeyboardButton("❌ Отменить", callback_data="cancel")]]
@@ -257,7 +274,7 @@ async def get_password_confirmation(update: Update, context: ContextTypes.DEFAUL
     user_data = context.user_data['registration']
     
     try:
-        async with get_db_connection() as conn:
+        async with get_db_connection() as conn, conn.transaction():
             user_id = await db_data.add_user(conn, user_data)
             await db_data.log_activity(conn, user_id=user_id, action="registration_start")
             reg_code = await db_data.set_registration_code(conn, user_id)
@@ -265,20 +282,21 @@ async def get_password_confirmation(update: Update, context: ContextTypes.DEFAUL
             
             telegram_id = update.effective_user.id
 
-        # Уведомление админу
-        tasks.notify_admin.delay(
-            text=(
-                f"✅ **Новая регистрация**\n\n"
-                f"👤 **Имя:** `{user_data['full_name']}`\n"
-                f"🔹 **Username:** `{user_data['username']}`\n"
-                f"🔹 **Статус:** `{user_data['status']}`\n"
-                f"🔹 **Контакт:** `{user_data['contact_info']}`\n"
-                f"🆔 **Telegram ID:** `{telegram_id}`\n"
-                f"🆔 **User DB ID:** `{user_id}`\n"
-                f"📅 **Дата рождения:** `{user_data.get('dob', 'Не указано')}`"
-            ),
-            category='new_user'
-        )
+            # Уведомление админу
+            await db_data.enqueue_admin_notification(
+                conn,
+                text=(
+                    f"✅ **Новая регистрация**\n\n"
+                    f"👤 **Имя:** `{user_data['full_name']}`\n"
+                    f"🔹 **Username:** `{user_data['username']}`\n"
+                    f"🔹 **Статус:** `{user_data['status']}`\n"
+                    f"🔹 **Контакт:** `{user_data['contact_info']}`\n"
+                    f"🆔 **Telegram ID:** `{telegram_id}`\n"
+                    f"🆔 **User DB ID:** `{user_id}`\n"
+                    f"📅 **Дата рождения:** `{user_data.get('dob', 'Не указано')}`"
+                ),
+                category='new_user'
+            )
 
         reply_markup = keyboards.get_notification_subscription_keyboard(
             config.NOTIFICATION_BOT_USERNAME, reg_code
@@ -334,20 +352,20 @@ async def check_notification_subscription(update: Update, context: ContextTypes.
         return ConversationHandler.END
 
     try:
-        async with get_db_connection() as conn:
+        async with get_db_connection() as conn, conn.transaction():
             user = await db_data.get_user_by_id(conn, user_id)
             if user.get('telegram_id'):
                 await db_data.log_activity(conn, user_id=user_id, action="registration_finish")
+                await db_data.enqueue_admin_notification(
+                    conn,
+                    text=f"✅ **Регистрация завершена**\n\n**Пользователь:** @{user.get('telegram_username', user.get('username'))}\n**ID:** {user_id}",
+                    category='new_user'
+                )
                 is_subscribed = True
             else:
                 is_subscribed = False
 
         if is_subscribed:
-            tasks.notify_admin.delay(
-                text=f"✅ **Регистрация завершена**\n\n**Пользователь:** @{user.get('telegram_username', user.get('username'))}\n**ID:** {user_id}",
-                category='new_user'
-            )
-            
             # АВТОМАТИЧЕСКИЙ ВХОД
             context.user_data['current_user'] = user
             context.user_data.pop('user_id_for_activation', None)
@@ -13,7 +13,7 @@ from telegram.ext import (
 
 from src.core.db import data_access as db_data
 from src.core.db.utils import get_db_connection, hash_password
-from src.core import tasks
+from src.core.message_renderer import render_screen
 from src.library_bot.states import State
 from src.library_bot.utils import get_user_borrow_limit, normalize_phone_number
 from src.library_bot import keyboards
@@ -41,24 +41,23 @@ async def user_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> State
                 context.user_data.clear()
                 from src.library_bot.handlers.start import start
                 return await start(update, context)
-
-            borrowed_books = await db_data.get_borrowed_books(conn, user['id'])
     except Exception as e:
         logger.error(f"Ошибка при загрузке данных для меню пользователя {user['id']}: {e}")
-        borrowed_books = []
 
+    # Счетчики приходят вместе со строкой пользователя, отдельные запросы не нужны
     borrow_limit = get_user_borrow_limit(user['status'])
     message_text = (
         f"**🏠 Главное меню**\n"
         f"Добро пожаловать, {user['full_name']}!\n\n"
-        f"📖 У вас на руках: **{len(borrowed_books)}/{borrow_limit}** книг."
+        f"📖 У вас на руках: **{user.get('active_loans', 0)}/{borrow_limit}** книг."
     )
+    if user.get('unread_notifications'):
+        message_text += f"\n🔔 Непрочитанных уведомлений: **{user['unread_notifications']}**"
     reply_markup = keyboards.get_user_menu_keyboard()
 
     if update.callback_query:
-        await update.callback_query.edit_message_text(
-            message_text, reply_markup=reply_markup, parse_mode='Markdown'
-        )
+        # В меню возвращаются и из карточки книги с обложкой
+        await render_screen(update, context, message_text, reply_markup=reply_markup, parse_mode='Markdown')
     else:
         await update.message.reply_text(
             message_text, reply_markup=reply_markup, parse_mode='Markdown'
@@ -73,8 +72,8 @@ async def logout(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     if user:
         async with get_db_connection() as conn:
             await db_data.log_activity(conn, user_id=user['id'], action="logout")
-            borrowed_books = await db_data.get_borrowed_books(conn, user['id'])
-            if borrowed_books:
+            counters = await db_data.get_user_counters(conn, user['id'])
+            if counters['active_loans']:
                 await query.answer("❌ Вы не можете выйти, пока у вас есть книги на руках!", show_alert=True)
                 return State.USER_MENU
 
@@ -92,6 +91,7 @@ async def view_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> St
         async with get_db_connection() as conn:
             user_profile = await db_data.get_user_profile(conn, user_id)
             borrowed_books = await db_data.get_borrowed_books(conn, user_id)
+            reservations = await db_data.get_user_reservations(conn, user_id)
 
         borrow_limit = get_user_borrow_limit(user_profile['status'])
         reg_date_str = user_profile['registration_date'].strftime('%d.%m.%Y')
@@ -121,6 +121,15 @@ async def view_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> St
         else:
             message_parts.append("  _У вас нет активных займов._")
 
+        if reservations:
+            message_parts.append(f"⏳ **Брони ({len(reservations)})**")
+            for reservation in reservations:
+                if reservation['position'] is None:
+                    hold_str = reservation['hold_expires_at'].strftime('%d.%m.%Y %H:%M')
+                    message_parts.append(f"  • `{reservation['book_name']}` — _отложена для вас до_ `{hold_str}`")
+                else:
+                    message_parts.append(f"  • `{reservation['book_name']}` — _место в очереди:_ `{reservation['position']}`")
+
         reply_markup = keyboards.get_profile_keyboard()
         await query.edit_message_text(
             "\n".join(message_parts),
@@ -166,6 +175,7 @@ async def show_notifications(update: Update, context: ContextTypes.DEFAULT_TYPE)
     try:
         async with get_db_connection() as conn:
             notifications = await db_data.get_notifications_for_user(conn, user_id)
+            await db_data.mark_notifications_read(conn, user_id)
         message_parts = ["📬 **Ваши последние уведомления:**\n"]
         for notif in notifications:
             date_str = notif['created_at'].strftime('%d.%m.%Y %H:%M')
@@ -186,8 +196,8 @@ async def ask_delete_self_confirmation(update: Update, context: ContextTypes.DEF
     await query.answer()
     user_id = context.user_data['current_user']['id']
     async with get_db_connection() as conn:
-        borrowed_books = await db_data.get_borrowed_books(conn, user_id)
-        if borrowed_books:
+        counters = await db_data.get_user_counters(conn, user_id)
+        if counters['active_loans']:
             await query.answer("❌ Вы не можете удалить аккаунт, пока у вас есть книги на руках.", show_alert=True)
             return State.USER_MENU
 
@@ -202,11 +212,10 @@ async def process_delete_self_confirmation(update: Update, context: ContextTypes
     user_id = context.user_data['current_user']['id']
     username = context.user_data['current_user'].get('username', f'ID: {user_id}')
 
-    async with get_db_connection() as conn:
+    async with get_db_connection() as conn, conn.transaction():
         await db_data.delete_user_by_self(conn, user_id)
         await db_data.log_activity(conn, user_id=user_id, action="self_delete_account", details=f"Username: {username}")
-
-    tasks.notify_admin.delay(text=f"🗑️ Пользователь @{username} самостоятельно удалил свой аккаунт.", category='user_self_deleted')
+        await db_data.enqueue_admin_notification(conn, text=f"🗑️ Пользователь @{username} самостоятельно удалил свой аккаунт.", category='user_self_deleted')
 
     await query.edit_message_text("✅ Ваш аккаунт был удален. Прощайте!")
     context.user_data.clear()
@@ -11,6 +11,7 @@ from telegram.ext import (
     CommandHandler,
     CallbackQueryHandler,
     ConversationHandler,
+    InlineQueryHandler,
     MessageHandler,
     filters,
     ContextTypes
@@ -18,6 +19,7 @@ from telegram.ext import (
 
 # --- Локальные импорты из новой структуры ---
 from src.core import config
+from src.core.loop_monitor import start_loop_monitor
 from src.library_bot.states import State
 from src.library_bot.handlers import (
     start,
@@ -25,6 +27,7 @@ from src.library_bot.handlers import (
     registration,
     user_menu,
     books,
+    inline,
     help as help_handler,
 )
 from telegram.request import HTTPXRequest
@@ -162,22 +165,23 @@ async def main() -> None:
                 CallbackQueryHandler(books.show_book_card_user, pattern="^view_book_"),
                 CallbackQueryHandler(books.process_borrow_selection, pattern=r"^borrow_book_"),
                 CallbackQueryHandler(books.navigate_search_results, pattern="^search_page_"),
-                CallbackQueryHandler(books.start_search, pattern="^search_book$"),
+                CallbackQueryHandler(books.start_search, pattern="^search_(book|fulltext)$"),
                 CallbackQueryHandler(user_menu.user_menu, pattern="^user_menu$"),
             ],
             
             State.GETTING_SEARCH_QUERY: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, books.process_search_query),
+                CallbackQueryHandler(books.start_search, pattern="^search_(book|fulltext)$"),
                 CallbackQueryHandler(user_menu.user_menu, pattern="^user_menu$"),
             ],
             
             State.SHOWING_GENRES: [
-                CallbackQueryHandler(books.show_books_in_genre, pattern=r"^genre_"),
+                CallbackQueryHandler(books.show_books_in_genre, pattern=r"^genre_\d+"),
                 CallbackQueryHandler(user_menu.user_menu, pattern="^user_menu$"),
             ],
             
             State.SHOWING_GENRE_BOOKS: [
-                CallbackQueryHandler(books.show_books_in_genre, pattern=r"^genre_"),
+                CallbackQueryHandler(books.show_books_in_genre, pattern=r"^genre_\d+"),
                 CallbackQueryHandler(books.show_book_card_user, pattern="^view_book_"),
                 CallbackQueryHandler(books.show_genres, pattern="^find_by_genre$"),
                 CallbackQueryHandler(books.start_search, pattern="^search_book$"),
@@ -215,10 +219,13 @@ async def main() -> None:
 
     application.add_handler(CommandHandler("help", help_handler.show_help))
     application.add_handler(conv_handler)
+    # Inline-режим (@bot <запрос>) отвечает из индекса каталога; включается в @BotFather (/setinline)
+    application.add_handler(InlineQueryHandler(inline.inline_search))
     logger.info("Основной бот инициализирован и готов к запуску...")
     
     await application.initialize()
     await application.start()
+    start_loop_monitor("library_bot")
     await application.updater.start_polling()
     await asyncio.Future()
 
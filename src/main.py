@@ -13,6 +13,7 @@ from src.library_bot.main import main as library_main
 from src.admin_bot.main import main as admin_main
 from src.notification_bot import main as notification_main
 from src.audit_bot import main as audit_main
+from src.core.outbox import main as outbox_relay_main
 
 # Configure basic logging
 logging.basicConfig(
@@ -43,6 +44,7 @@ if __name__ == "__main__":
         "Admin Bot": admin_main,
         "Notification Bot": notification_main,
         "Audit Bot": audit_main,
+        "Outbox Relay": outbox_relay_main,
     }
 
     # Create a process for each bot defined in the bots dictionary.
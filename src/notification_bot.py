@@ -13,6 +13,7 @@ from telegram.ext import (
 )
 
 from src.core import config
+from src.core.loop_monitor import start_loop_monitor
 from src.core.db import data_access as db_data
 from src.core.db.utils import get_db_connection
 from src.core import tasks
@@ -58,7 +59,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     )
                     
                     # Уведомляем админа о подозрительной активности
-                    tasks.notify_admin.delay(
+                    await db_data.enqueue_admin_notification(
+                        conn,
                         text=(
                             f"⚠️ **Попытка повторной привязки Telegram**\n\n"
                             f"**Telegram ID:** `{user.id}`\n"
@@ -133,6 +135,14 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 category='error'
             )
     else:
+        # Пользователь снова написал боту — значит, уведомления ему можно доставлять
+        try:
+            async with get_db_connection() as conn:
+                if await db_data.clear_bot_blocked_by_telegram_id(conn, user.id):
+                    logger.info(f"✅ Пользователь telegram_id={user.id} разблокировал бота-уведомителя.")
+        except Exception as e:
+            logger.error(f"❌ Не удалось снять флаг блокировки для telegram_id={user.id}: {e}")
+
         # Приветственное сообщение без кода
         await update.message.reply_text(
             "👋 **Добро пожаловать!**\n\n"
@@ -193,6 +203,7 @@ async def main() -> None:
     
     await application.initialize()
     await application.start()
+    start_loop_monitor("notification_bot")
     await application.updater.start_polling()
     await asyncio.Future()
 
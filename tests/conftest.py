@@ -9,6 +9,7 @@ load_dotenv(dotenv_path='.env.test')
 
 # Импортируем схему из ее нового местоположения в src
 from src.init_db import SCHEMA_COMMANDS
+from src.core.db.utils import Row
 
 @pytest_asyncio.fixture(scope="function")
 async def db_session():
@@ -27,7 +28,8 @@ async def db_session():
             user=os.getenv("DB_USER"),
             password=os.getenv("DB_PASSWORD"),
             host=os.getenv("DB_HOST"),
-            port=os.getenv("DB_PORT")
+            port=os.getenv("DB_PORT"),
+            record_class=Row
         )
         # Полная очистка и создание схемы для каждого теста
         await conn.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public;")
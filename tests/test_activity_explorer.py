@@ -0,0 +1,81 @@
+# tests/test_activity_explorer.py
+from datetime import datetime
+
+import pytest
+
+from src.core.db import data_access as db_data
+from src.admin_bot.handlers.activity import parse_activity_filters
+
+USER_DATA = {
+    'username': 'audit_user',
+    'telegram_id': 88800,
+    'telegram_username': 'audit_user',
+    'full_name': 'Audit User',
+    'dob': '01.01.1999',
+    'contact_info': 'audit@test.com',
+    'status': 'студент',
+    'password': 'password123'
+}
+
+
+def test_parse_activity_filters():
+    """Тестирует разбор фильтров команды /activity и сообщения об ошибках."""
+    now = datetime(2026, 10, 19, 12, 0)
+    filters = parse_activity_filters(['action=login', 'user=42', 'book=5', 'days=7'], now=now)
+    assert filters == {'action': 'login', 'user_id': 42, 'book_id': 5, 'since': datetime(2026, 10, 12, 12, 0)}
+
+    period = parse_activity_filters(['from=01.10.2026', 'to=15.10.2026', 'user=@audit'])
+    assert period['since'] == datetime(2026, 10, 1)
+    assert period['until'] == datetime(2026, 10, 16)  # конец периода включительно
+    assert period['user_login'] == '@audit'
+
+    for bad in (['book=abc'], ['days=0'], ['colour=red'], ['action'], ['from=2026-10-01'], ['from=10.10.2026', 'to=01.10.2026']):
+        with pytest.raises(ValueError):
+            parse_activity_filters(bad)
+
+
+@pytest.mark.asyncio
+async def test_keyset_pages_cover_log_without_gaps(db_session):
+    """Тестирует, что листание по ключу проходит журнал без пропусков и повторов, в т.ч. при равном времени."""
+    user_id = await db_data.add_user(db_session, USER_DATA)
+    # Одна транзакция — одинаковый timestamp, порядок решает id
+    async with db_session.transaction():
+        for i in range(7):
+            await db_data.log_activity(db_session, user_id, 'login' if i % 2 else 'logout')
+
+    seen, cursor = [], None
+    while True:
+        page = await db_data.get_activity_page(db_session, {'user_id': user_id}, before=cursor, limit=3)
+        seen.extend(row['id'] for row in page)
+        if len(page) < 3:
+            break
+        cursor = (page[-1]['timestamp'], page[-1]['id'])
+
+    all_ids = [r['id'] for r in await db_session.fetch("SELECT id FROM activity_log WHERE user_id = $1", user_id)]
+    assert seen == sorted(all_ids, reverse=True)
+
+    logins = await db_data.get_activity_page(db_session, {'user_id': user_id, 'action': 'login'}, limit=10)
+    assert len(logins) == 3
+    assert logins[0]['username'] == USER_DATA['username']
+
+
+@pytest.mark.asyncio
+async def test_book_filter_time_window_and_export(db_session):
+    """Тестирует фильтр по книге (из details), окно времени, список действий и выгрузку."""
+    user_id = await db_data.add_user(db_session, USER_DATA)
+    book_id = await db_data.add_new_book(db_session, {
+        'name': 'Audited Book', 'author': 'Audit Author', 'genre': 'Test', 'description': 'Logged', 'total_quantity': 1
+    })
+    loan = await db_data.checkout_book(db_session, user_id, book_id)
+    await db_data.checkin_book(db_session, loan['borrow_id'])
+    await db_data.log_activity(db_session, user_id, 'login')
+
+    by_book = await db_data.get_activity_page(db_session, {'book_id': book_id})
+    assert [row['action'] for row in by_book] == ['return_book', 'borrow_book']
+    assert all(row['book_id'] == book_id for row in by_book)
+
+    assert await db_data.get_activity_page(db_session, {'since': datetime(2999, 1, 1)}) == []
+    assert {'borrow_book', 'return_book', 'login'} <= set(await db_data.get_activity_actions(db_session))
+
+    exported = [row['action'] async for row in db_data.iter_activity(db_session, {'user_id': user_id}, prefetch=1)]
+    assert exported == ['login', 'return_book', 'borrow_book']
@@ -82,4 +82,48 @@ async def test_get_books_by_author(db_session):
     
     assert len(books) == 5
     assert total == 5
-    assert all('Asimov' in book['name'] for book in books)
\ No newline at end of file
+    assert all('Asimov' in book['name'] for book in books)
+
+
+async def test_author_stats_follow_catalog_circulation_and_ratings(db_session):
+    """Тестирует счетчики автора: итог по авторам, выдачи, средняя оценка, смена автора и удаление книги."""
+    user_id = await db_data.add_user(db_session, {
+        'username': 'author_fan', 'telegram_id': 12300, 'telegram_username': 'author_fan',
+        'full_name': 'Author Fan', 'dob': '01.01.2000', 'contact_info': 'fan@test.com',
+        'status': 'студент', 'password': 'password123'
+    })
+    first_id = await db_data.add_new_book(db_session, {
+        'name': 'Counted 1', 'author': 'Stats Author', 'genre': 'Test', 'description': 'Test', 'total_quantity': 1
+    })
+    second_id = await db_data.add_new_book(db_session, {
+        'name': 'Counted 2', 'author': 'Stats Author', 'genre': 'Test', 'description': 'Test', 'total_quantity': 1
+    })
+    author_id = await db_session.fetchval("SELECT id FROM authors WHERE name = $1", 'Stats Author')
+
+    # Итог — число авторов, а не книг
+    authors, total = await db_data.get_all_authors_paginated(db_session, limit=10, offset=0)
+    assert total == 1
+    assert (authors[0]['books_count'], authors[0]['available_books_count']) == (2, 2)
+
+    await db_data.checkout_book(db_session, user_id, first_id)
+    await db_data.rate_book(db_session, user_id, first_id, 5)
+    await db_data.rate_book(db_session, user_id, second_id, 2)
+    await db_data.rate_book(db_session, user_id, second_id, 4)
+    details = await db_data.get_author_details(db_session, author_id)
+    assert (details['total_books'], details['available_books_count']) == (2, 1)
+    assert (float(details['avg_rating']), details['ratings_count']) == (4.5, 2)
+
+    # Книга с оценками переходит к другому автору
+    await db_data.update_book_field(db_session, second_id, 'author', 'Other Author')
+    details = await db_data.get_author_details(db_session, author_id)
+    assert (details['total_books'], float(details['avg_rating']), details['ratings_count']) == (1, 5.0, 1)
+    other_id = await db_session.fetchval("SELECT id FROM authors WHERE name = $1", 'Other Author')
+    assert (await db_data.get_author_details(db_session, other_id))['ratings_count'] == 1
+
+    await db_data.delete_book(db_session, second_id)
+    other = await db_data.get_author_details(db_session, other_id)
+    assert (other['total_books'], other['ratings_count'], other['avg_rating']) == (0, 0, None)
+    assert (await db_data.get_all_authors_paginated(db_session, limit=10, offset=0))[1] == 1
+
+    # Полный пересчет совпадает со счетчиками
+    assert await db_session.fetchval("SELECT refresh_author_stats()") == 0
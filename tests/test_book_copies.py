@@ -0,0 +1,86 @@
+# tests/test_book_copies.py
+import pytest
+
+from src.core.db import data_access as db_data
+
+pytestmark = pytest.mark.asyncio
+
+USER_DATA = {
+    'username': 'copies_user',
+    'telegram_id': 88888,
+    'telegram_username': 'copies_user',
+    'full_name': 'Copies User',
+    'dob': '01.01.1999',
+    'contact_info': 'copies@test.com',
+    'status': 'студент',
+    'password': 'password123'
+}
+
+BOOK_DATA = {
+    'name': 'Popular New Arrival',
+    'author': 'Copies Author',
+    'genre': 'Test',
+    'description': 'Several physical copies',
+    'total_quantity': 2
+}
+
+
+async def _quantities(conn, book_id):
+    return await conn.fetchrow("SELECT total_quantity, available_quantity FROM books WHERE id = $1", book_id)
+
+
+async def test_new_book_gets_copies(db_session):
+    """Тестирует, что при добавлении книги заводятся экземпляры, а счетчики выводятся из них."""
+    book_id = await db_data.add_new_book(db_session, BOOK_DATA)
+
+    copies = await db_session.fetch("SELECT serial_number, is_available FROM book_copies WHERE book_id = $1 ORDER BY id", book_id)
+    assert [c['serial_number'] for c in copies] == [f"B{book_id}-1", f"B{book_id}-2"]
+    assert all(c['is_available'] for c in copies)
+
+    quantities = await _quantities(db_session, book_id)
+    assert (quantities['total_quantity'], quantities['available_quantity']) == (2, 2)
+
+
+async def test_loans_take_distinct_copies(db_session):
+    """Тестирует, что каждая выдача получает свой экземпляр, а возврат его освобождает."""
+    user1_id = await db_data.add_user(db_session, USER_DATA)
+    user2_id = await db_data.add_user(db_session, {**USER_DATA, 'username': 'copies_user2', 'contact_info': 'copies2@test.com', 'telegram_id': 88889})
+    book_id = await db_data.add_new_book(db_session, BOOK_DATA)
+
+    first = await db_data.checkout_book(db_session, user1_id, book_id)
+    second = await db_data.checkout_book(db_session, user2_id, book_id)
+    assert first['copy_id'] and second['copy_id']
+    assert first['copy_id'] != second['copy_id']
+    assert (await _quantities(db_session, book_id))['available_quantity'] == 0
+
+    third = await db_data.checkout_book(db_session, user1_id, book_id)
+    assert third['status'] == 'unavailable'
+
+    await db_data.checkin_book(db_session, first['borrow_id'])
+    freed = await db_session.fetchval("SELECT is_available FROM book_copies WHERE id = $1", first['copy_id'])
+    assert freed is True
+    assert (await _quantities(db_session, book_id))['available_quantity'] == 1
+
+
+async def test_backfill_creates_copies_for_legacy_books(db_session):
+    """Тестирует миграцию: книги без экземпляров получают их, открытые выдачи — свой экземпляр."""
+    user_id = await db_data.add_user(db_session, USER_DATA)
+    author_id = await db_data.get_or_create_author(db_session, "Legacy Author")
+    book_id = await db_session.fetchval(
+        "INSERT INTO books (name, author_id, genre, description, total_quantity, available_quantity) "
+        "VALUES ('Legacy Book', $1, 'Test', '', 3, 2) RETURNING id",
+        author_id
+    )
+    borrow_id = await db_session.fetchval(
+        "INSERT INTO borrowed_books (user_id, book_id, due_date) VALUES ($1, $2, CURRENT_DATE + 14) RETURNING borrow_id",
+        user_id, book_id
+    )
+
+    assert await db_session.fetchval("SELECT backfill_book_copies()") == 1
+    # Повторный запуск ничего не делает
+    assert await db_session.fetchval("SELECT backfill_book_copies()") == 0
+
+    copy_id = await db_session.fetchval("SELECT copy_id FROM borrowed_books WHERE borrow_id = $1", borrow_id)
+    assert copy_id is not None
+    quantities = await _quantities(db_session, book_id)
+    assert (quantities['total_quantity'], quantities['available_quantity']) == (3, 2)
@@ -0,0 +1,95 @@
+# tests/test_bulk_circulation.py
+import json
+
+import pytest
+
+from src.core.db import data_access as db_data
+from src.admin_bot.handlers.circulation import parse_batch, _checkin_notifications
+
+USER_DATA = {
+    'username': 'desk_user',
+    'telegram_id': 77777,
+    'telegram_username': 'desk_user',
+    'full_name': 'Desk User',
+    'dob': '01.01.2001',
+    'contact_info': 'desk@test.com',
+    'status': 'студент',
+    'password': 'password123'
+}
+
+BOOK_DATA = {
+    'name': 'Class Set Book',
+    'author': 'Desk Author',
+    'genre': 'Test',
+    'description': 'Copies for a whole class',
+    'total_quantity': 3
+}
+
+
+def test_parse_batch_splits_ids_and_serials():
+    """Тестирует разбор списка: числа — номера выдач, остальное — серийные номера, без повторов."""
+    borrow_ids, serials = parse_batch("serial_number\n12, B5-1;B5-2\n12 \"B5-1\"\n7")
+    assert borrow_ids == [12, 7]
+    assert serials == ["B5-1", "B5-2"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_checkout_and_checkin(db_session):
+    """Тестирует пакетную выдачу и пакетный возврат по серийным номерам и номерам выдач."""
+    user_id = await db_data.add_user(db_session, USER_DATA)
+    book_id = await db_data.add_new_book(db_session, BOOK_DATA)
+    serials = [f"B{book_id}-1", f"B{book_id}-2", f"B{book_id}-3"]
+
+    loans = await db_data.bulk_checkout(db_session, user_id, serials[:2] + ["NO-SUCH-COPY"])
+    assert [loan['serial_number'] for loan in loans] == serials[:2]
+    assert all(loan['book_name'] == BOOK_DATA['name'] for loan in loans)
+
+    # Уже выданный экземпляр повторно не выдается
+    assert await db_data.bulk_checkout(db_session, user_id, serials[:1]) == []
+
+    result = await db_data.bulk_checkin(db_session, borrow_ids=[loans[0]['borrow_id']], serials=[serials[1], serials[2]])
+    assert sorted(row['serial_number'] for row in result['returned']) == serials[:2]
+    assert result['reservations'] == []
+
+    available = await db_session.fetchval(
+        "SELECT COUNT(*) FROM book_copies WHERE book_id = $1 AND is_available", book_id
+    )
+    assert available == 3
+    open_loans = await db_session.fetchval(
+        "SELECT COUNT(*) FROM borrowed_books WHERE user_id = $1 AND return_date IS NULL", user_id
+    )
+    assert open_loans == 0
+
+    # Повторный возврат ничего не делает
+    again = await db_data.bulk_checkin(db_session, borrow_ids=[loans[0]['borrow_id']])
+    assert again['returned'] == []
+
+
+@pytest.mark.asyncio
+async def test_bulk_checkin_notifies_reservations_per_returned_copy(db_session):
+    """Тестирует, что по броням уведомляется столько читателей, сколько экземпляров вернулось."""
+    reader_id = await db_data.add_user(db_session, USER_DATA)
+    waiting_ids = [
+        await db_data.add_user(db_session, {
+            **USER_DATA, 'username': f'desk_wait{i}', 'contact_info': f'wait{i}@test.com', 'telegram_id': 77780 + i
+        })
+        for i in range(3)
+    ]
+    book_id = await db_data.add_new_book(db_session, BOOK_DATA)
+    loans = await db_data.bulk_checkout(db_session, reader_id, [f"B{book_id}-1", f"B{book_id}-2", f"B{book_id}-3"])
+    for waiting_id in waiting_ids:
+        await db_data.add_reservation(db_session, waiting_id, book_id)
+
+    result = await db_data.bulk_checkin(db_session, borrow_ids=[loan['borrow_id'] for loan in loans[:2]])
+    assert sorted(row['user_id'] for row in result['reservations']) == sorted(waiting_ids[:2])
+
+    notifications = _checkin_notifications(result)
+    assert len(notifications) == 3  # одна сводка читателю и две брони
+    assert await db_data.enqueue_user_notifications(db_session, notifications) == 3
+
+    payloads = [json.loads(r['payload']) for r in await db_session.fetch("SELECT payload FROM notification_outbox ORDER BY id")]
+    summary = payloads[0]
+    assert summary['user_id'] == reader_id
+    assert summary['category'] == 'batch_confirmation'
+    assert summary['chat_id'] == USER_DATA['telegram_id']
+    assert all(p['button_callback'] == f"borrow_book_{book_id}" for p in payloads[1:])
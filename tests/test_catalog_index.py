@@ -0,0 +1,83 @@
+# tests/test_catalog_index.py
+import os
+
+import pytest
+
+from src.core.catalog_index import CatalogIndex, CatalogIndexLoader, build_index
+
+BOOKS = [
+    (1, 'Мастер и Маргарита', 'Михаил Булгаков', True),
+    (2, 'Собачье сердце', 'Михаил Булгаков', False),
+    (3, 'Солярис', 'Станислав Лем', True),
+    (4, 'Мастерство рассказчика', 'Ёжиков Пётр', True),
+]
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    return str(tmp_path / 'catalog_index.bin')
+
+
+def test_prefix_search_over_titles_and_authors(index_path):
+    """Тестирует поиск по началу слова в названии и авторе, без учета регистра и «ё»."""
+    assert build_index(BOOKS, index_path) == 4
+    index = CatalogIndex(index_path)
+    try:
+        assert [book['id'] for book in index.search('маст', limit=10)] == [1, 4]
+        assert {book['id'] for book in index.search('булгак', limit=10)} == {1, 2}
+        assert [book['id'] for book in index.search('ежиков', limit=10)] == [4]
+        # Законченное слово не совпадает с более длинным («мастер » ≠ «мастерство»)
+        assert [book['id'] for book in index.search('мастер маргарита', limit=10)][0] == 1
+
+        book = index.search('солярис', limit=10)[0]
+        assert (book['id'], book['name'], book['author'], book['is_available']) == (3, 'Солярис', 'Станислав Лем', True)
+        assert index.search('  ', limit=10) == []
+        assert len(index.search('михаил', limit=1)) == 1
+    finally:
+        index.close()
+
+
+def test_typo_tolerance_and_availability_ranking(index_path):
+    """Тестирует, что опечатка не мешает поиску, а при равном совпадении выше книги в наличии."""
+    build_index([(10, 'Сердце', 'Автор', False), (11, 'Сердце', 'Автор', True)], index_path)
+    index = CatalogIndex(index_path)
+    try:
+        assert [book['id'] for book in index.search('серддце', limit=10)] == [11, 10]
+        assert index.search('холодильник', limit=10) == []
+    finally:
+        index.close()
+
+
+def test_loader_swaps_replaced_index(index_path):
+    """Тестирует, что загрузчик подхватывает новый файл после атомарной замены."""
+    loader = CatalogIndexLoader(path=index_path, check_interval=0)
+    try:
+        assert loader.get() is None
+
+        build_index(BOOKS[:1], index_path)
+        first = loader.get()
+        assert first.book_count == 1
+        assert loader.get() is first
+
+        build_index(BOOKS, index_path)
+        second = loader.get()
+        assert second is not first and second.book_count == 4
+        assert [book['id'] for book in second.search('солярис', limit=10)] == [3]
+    finally:
+        loader.close()
+
+
+def test_broken_file_keeps_previous_index(index_path):
+    """Тестирует, что поврежденный файл не заменяет уже загруженный индекс."""
+    loader = CatalogIndexLoader(path=index_path, check_interval=0)
+    try:
+        build_index(BOOKS, index_path)
+        loaded = loader.get()
+
+        with open(index_path + '.new', 'wb') as f:
+            f.write(b'garbage' * 10)
+        os.replace(index_path + '.new', index_path)
+        assert loader.get() is loaded
+        assert not [name for name in os.listdir(os.path.dirname(index_path)) if name.endswith('.tmp')]
+    finally:
+        loader.close()
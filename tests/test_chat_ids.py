@@ -0,0 +1,39 @@
+import pytest
+from unittest.mock import AsyncMock
+
+from src.core import chat_ids
+from src.core.chat_ids import ChatIdCache
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_resolve_many_queries_only_missing_users(monkeypatch):
+    """Тестирует, что массовое разрешение идет одним запросом и только для отсутствующих в кэше."""
+    lookup = AsyncMock(return_value={2: {'telegram_id': 200, 'bot_blocked': False}})
+    monkeypatch.setattr(chat_ids.db_data, 'get_delivery_targets', lookup)
+    cache = ChatIdCache(ttl=60, max_size=10)
+    cache.put(1, {'telegram_id': 100, 'bot_blocked': False})
+
+    targets = await cache.resolve_many(conn=None, user_ids=[1, 2, 3, 2])
+
+    assert targets == {1: {'telegram_id': 100, 'bot_blocked': False}, 2: {'telegram_id': 200, 'bot_blocked': False}}
+    lookup.assert_awaited_once_with(None, [2, 3])
+    assert cache.get(2) == {'telegram_id': 200, 'bot_blocked': False}
+    assert cache.get(3) is None
+
+
+async def test_invalidation_and_expiry(monkeypatch):
+    """Тестирует сброс записи по событию из БД, истечение TTL и вытеснение старых записей."""
+    cache = ChatIdCache(ttl=60, max_size=2)
+    cache.put(1, {'telegram_id': 100, 'bot_blocked': False})
+    cache._on_user_chat_changed(None, 0, chat_ids.USER_CHAT_CHANGED_CHANNEL, '1')
+    assert cache.get(1) is None
+
+    cache.put(1, {'telegram_id': 100, 'bot_blocked': False})
+    cache.put(2, {'telegram_id': 200, 'bot_blocked': False})
+    cache.put(3, {'telegram_id': 300, 'bot_blocked': False})
+    assert cache.get(1) is None
+    assert cache.get(3) is not None
+
+    monkeypatch.setattr(chat_ids.time, 'monotonic', lambda: 10 ** 9)
+    assert cache.get(3) is None
@@ -4,6 +4,7 @@ import datetime
 
 from src.core.db import data_access as db_data
 from src.core.db.data_access import UserExistsError, NotFoundError
+from src.core.db.utils import Row
 
 pytestmark = pytest.mark.asyncio
 
@@ -53,6 +54,17 @@ async def test_get_user_by_login_found(db_session):
     assert found_user['id'] == user_id
     assert found_user['full_name'] == USER_DATA['full_name']
 
+async def test_user_row_is_returned_without_copy(db_session):
+    """Тестирует, что строка пользователя отдается как Row с явным набором колонок."""
+    user_id = await db_data.add_user(db_session, USER_DATA)
+    user = await db_data.get_user_by_id(db_session, user_id)
+    assert isinstance(user, Row)
+    assert user.id == user['id'] == user_id
+    assert user.get('full_name') == USER_DATA['full_name']
+    assert 'registration_code' not in user
+    with pytest.raises(AttributeError):
+        user.registration_code
+
 async def test_get_user_by_login_not_found(db_session):
     """Тестирует выброс исключения, если пользователь не найден."""
     with pytest.raises(NotFoundError):
@@ -0,0 +1,91 @@
+import pytest
+
+from src.core.db import utils as db_utils
+from src.core.db.utils import DbSession
+
+pytestmark = pytest.mark.asyncio
+
+
+class FakeTransaction:
+    def __init__(self, log):
+        self.log = log
+
+    async def start(self):
+        self.log.append('begin')
+
+    async def commit(self):
+        self.log.append('commit')
+
+    async def rollback(self):
+        self.log.append('rollback')
+
+
+class FakeConnection:
+    def __init__(self, log):
+        self.log = log
+
+    def transaction(self):
+        return FakeTransaction(self.log)
+
+
+class FakePool:
+    """Считает выдачи соединений и записывает порядок begin/commit/release."""
+
+    def __init__(self):
+        self.log = []
+        self.acquired = 0
+
+    async def acquire(self):
+        self.acquired += 1
+        self.log.append('acquire')
+        return FakeConnection(self.log)
+
+    async def release(self, conn):
+        self.log.append('release')
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    fake = FakePool()
+    monkeypatch.setattr(db_utils, 'db_pool', fake)
+    return fake
+
+
+async def test_session_acquires_lazily_and_once(pool):
+    """Тестирует, что соединение берется только при первом обращении и один раз на сессию."""
+    async with DbSession() as session:
+        assert pool.acquired == 0
+        first = await session.connection()
+        second = await session.connection()
+        assert first is second
+        assert session.active
+
+    assert not session.active
+    assert pool.acquired == 1
+    assert pool.log == ['acquire', 'begin', 'commit', 'release']
+
+
+async def test_session_without_queries_does_not_touch_pool(pool):
+    """Тестирует, что сессия без запросов не берет соединение из пула."""
+    async with DbSession():
+        pass
+    assert pool.log == []
+
+
+async def test_session_rolls_back_on_error(pool):
+    """Тестирует откат транзакции и возврат соединения при исключении."""
+    with pytest.raises(ValueError):
+        async with DbSession() as session:
+            await session.connection()
+            raise ValueError("boom")
+
+    assert pool.log == ['acquire', 'begin', 'rollback', 'release']
+
+
+async def test_explicit_release_before_telegram_call(pool):
+    """Тестирует, что release() возвращает соединение сразу, а выход из блока уже ничего не делает."""
+    async with DbSession() as session:
+        await session.connection()
+        await session.release()
+        assert pool.log[-1] == 'release'
+    assert pool.log.count('release') == 1
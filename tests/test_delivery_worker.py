@@ -0,0 +1,70 @@
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from src.core import delivery_worker
+from src.core.delivery_worker import DeliveryWorker, _flatten
+from src.core.notification_streams import STREAM_BULK, STREAM_INTERACTIVE, stream_for_category
+
+pytestmark = pytest.mark.asyncio
+
+
+class FakeRedis:
+    """Запоминает подтверждения и отдает заданное число доставок из XPENDING."""
+
+    def __init__(self, times_delivered=1):
+        self.times_delivered = times_delivered
+        self.acked = []
+
+    async def xpending_range(self, stream, group, min, max, count):
+        return [{'message_id': min, 'times_delivered': self.times_delivered}]
+
+    def pipeline(self, transaction=False):
+        pipe = MagicMock()
+        pipe.xack.side_effect = lambda stream, group, entry_id: self.acked.append((stream, entry_id))
+        pipe.execute = AsyncMock()
+        return pipe
+
+
+def _entry(**payload):
+    return {'payload': json.dumps(payload)}
+
+
+async def test_entry_is_acknowledged_after_delivery(monkeypatch):
+    """Тестирует, что запись подтверждается после доставки, а ключ берется из id записи."""
+    deliver = AsyncMock()
+    monkeypatch.setattr(delivery_worker, 'deliver_user_notification', deliver)
+    redis = FakeRedis()
+    worker = DeliveryWorker(redis, bot=object(), scheduler=object(), consumer='test', concurrency=10)
+
+    await worker.process(STREAM_INTERACTIVE, '1-0', _entry(user_id=7, text="Книга выдана", category='confirmation'))
+
+    assert redis.acked == [(STREAM_INTERACTIVE, '1-0')]
+    assert deliver.await_args.kwargs['idempotency_key'] == "stream:1-0"
+    assert deliver.await_args.kwargs['user_id'] == 7
+
+
+async def test_failed_entry_stays_pending_until_attempts_run_out(monkeypatch):
+    """Тестирует, что при временной ошибке запись не подтверждается до исчерпания попыток."""
+    monkeypatch.setattr(delivery_worker, 'deliver_user_notification', AsyncMock(side_effect=TimeoutError()))
+    monkeypatch.setattr(delivery_worker.config, 'DELIVERY_MAX_ATTEMPTS', 3)
+
+    redis = FakeRedis(times_delivered=1)
+    worker = DeliveryWorker(redis, bot=object(), scheduler=object(), consumer='test', concurrency=10)
+    await worker.process(STREAM_BULK, '2-0', _entry(user_id=7, text="Новинка", category='new_arrival'))
+    assert redis.acked == []
+
+    redis.times_delivered = 3
+    await worker.process(STREAM_BULK, '2-0', _entry(user_id=7, text="Новинка", category='new_arrival'))
+    assert redis.acked == [(STREAM_BULK, '2-0')]
+
+
+async def test_streams_by_category_and_reply_shapes():
+    """Тестирует выбор потока по категории и разбор ответов XREADGROUP (RESP2 и RESP3)."""
+    assert stream_for_category('broadcast') == STREAM_BULK
+    assert stream_for_category('confirmation') == STREAM_INTERACTIVE
+
+    resp2 = [[STREAM_BULK, [('1-0', {'payload': '{}'})]]]
+    resp3 = {STREAM_BULK: [[('1-0', {'payload': '{}'})]]}
+    assert _flatten(resp2) == _flatten(resp3) == [(STREAM_BULK, '1-0', {'payload': '{}'})]
+    assert _flatten(None) == _flatten({}) == []
@@ -132,4 +132,64 @@ async def test_books_due_soon(db_session):
     due_soon = await db_data.get_users_with_books_due_soon(db_session, days_ahead=2)
     
     assert len(due_soon) == 1
-    assert due_soon[0]['user_id'] == user_id
\ No newline at end of file
+    assert due_soon[0]['user_id'] == user_id
+
+async def test_checkout_enforces_limit_and_availability(db_session):
+    """Тестирует выдачу одним запросом: лимит, отсутствие экземпляров и запись в журнал."""
+    user_id = await db_data.add_user(db_session, USER_DATA)
+    book_id = await db_data.add_new_book(db_session, BOOK_DATA)
+    second_book_id = await db_data.add_new_book(db_session, {**BOOK_DATA, 'name': 'Second Book'})
+
+    result = await db_data.checkout_book(db_session, user_id, book_id, borrow_limit=1)
+    assert result['status'] == 'borrowed'
+    assert result['book_name'] == BOOK_DATA['name']
+    assert isinstance(result['due_date'], datetime)
+
+    # Лимит исчерпан: вторая книга в наличии, но не выдается
+    limited = await db_data.checkout_book(db_session, user_id, second_book_id, borrow_limit=1)
+    assert limited['status'] == 'limit_reached'
+    assert limited['borrow_id'] is None
+
+    # Единственный экземпляр первой книги уже выдан
+    unavailable = await db_data.checkout_book(db_session, user_id, book_id, borrow_limit=5)
+    assert unavailable['status'] == 'unavailable'
+
+    actions = await db_session.fetchval("SELECT COUNT(*) FROM activity_log WHERE user_id = $1 AND action = 'borrow_book'", user_id)
+    assert actions == 1
+    available = await db_session.fetchval("SELECT available_quantity FROM books WHERE id = $1", second_book_id)
+    assert available == 1
+
+
+async def test_checkin_closes_loan_once_and_picks_reservation(db_session):
+    """Тестирует возврат одним запросом: повторный возврат не увеличивает остаток, бронь помечается."""
+    user1_id = await db_data.add_user(db_session, USER_DATA)
+    user2_id = await db_data.add_user(db_session, {**USER_DATA, 'username': 'user2', 'contact_info': 'user2@test.com', 'telegram_id': 66666})
+    book_id = await db_data.add_new_book(db_session, BOOK_DATA)
+
+    loan = await db_data.checkout_book(db_session, user1_id, book_id)
+    await db_data.add_reservation(db_session, user2_id, book_id)
+
+    # Чужую выдачу вернуть нельзя
+    assert await db_data.checkin_book(db_session, loan['borrow_id'], user2_id) is None
+
+    returned = await db_data.checkin_book(db_session, loan['borrow_id'], user1_id)
+    assert returned['book_id'] == book_id
+    assert returned['next_user_id'] == user2_id
+    assert await db_data.get_reservations_for_book(db_session, book_id) == []
+
+    assert await db_data.checkin_book(db_session, loan['borrow_id'], user1_id) is None
+    # Экземпляр отложен для дождавшегося брони и на полку не возвращается
+    available = await db_session.fetchval("SELECT available_quantity FROM books WHERE id = $1", book_id)
+    assert available == 0
+
+
+async def test_rate_book_returns_previous_rating(db_session):
+    """Тестирует оценку одним запросом: возвращается предыдущая оценка и пишется журнал."""
+    user_id = await db_data.add_user(db_session, USER_DATA)
+    book_id = await db_data.add_new_book(db_session, BOOK_DATA)
+
+    assert await db_data.rate_book(db_session, user_id, book_id, 3) is None
+    assert await db_data.rate_book(db_session, user_id, book_id, 5) == 3
+
+    actions = await db_session.fetch("SELECT action FROM activity_log WHERE user_id = $1 ORDER BY id", user_id)
+    assert [a['action'] for a in actions] == ['add_rating', 'update_rating']
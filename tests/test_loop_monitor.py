@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+import pytest
+from src.core.loop_monitor import LoopLagMonitor
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_blocking_call_is_detected_with_stack():
+    """Тестирует, что блокирующий вызов фиксируется вместе со стеком потока цикла."""
+    monitor = LoopLagMonitor("test", interval=0.02, threshold=0.1, report_every=60)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.05)
+        time.sleep(0.4)  # намеренно блокируем цикл событий
+        await asyncio.sleep(0.05)
+    finally:
+        monitor.stop()
+
+    stats = monitor.get_stats()
+    assert stats['stalls'] == 1
+    assert stats['max_lag_ms'] >= 300
+    assert 'test_blocking_call_is_detected_with_stack' in stats['last_stall_stack']
+
+
+async def test_idle_loop_has_no_stalls():
+    """Тестирует, что на свободном цикле событий зависания не фиксируются."""
+    monitor = LoopLagMonitor("test", interval=0.02, threshold=0.2, report_every=60)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.2)
+    finally:
+        monitor.stop()
+
+    stats = monitor.get_stats()
+    assert stats['stalls'] == 0
+    assert stats['samples'] > 0
+
+
+async def test_window_summary_is_published():
+    """Тестирует, что итог окна отчета (задержка и зависания за окно) передается для health check."""
+    published = []
+
+    async def publish(snapshot):
+        published.append(snapshot)
+
+    monitor = LoopLagMonitor("test", interval=0.02, threshold=0.1, report_every=0.1, publish=publish)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.05)
+        time.sleep(0.3)  # намеренно блокируем цикл событий
+        await asyncio.sleep(0.3)
+    finally:
+        monitor.stop()
+
+    assert published
+    assert all(snapshot['name'] == 'test' for snapshot in published)
+    assert sum(snapshot['stalls'] for snapshot in published) == 1
+    assert max(snapshot['max_lag_ms'] for snapshot in published) >= 200
+    assert published[-1]['stalls_total'] == 1
@@ -0,0 +1,69 @@
+# tests/test_message_renderer.py
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from telegram import CallbackQuery, InputMediaPhoto, Message
+from telegram.error import BadRequest
+
+from src.core.message_renderer import render_screen
+
+pytestmark = pytest.mark.asyncio
+
+
+def _callback_update(text="Список книг", photo=None):
+    update = MagicMock()
+    update.callback_query = AsyncMock(spec=CallbackQuery)
+    message = AsyncMock(spec=Message)
+    message.text = None if photo else text
+    message.photo = [MagicMock(file_id=photo)] if photo else ()
+    message.message_id = 10
+    message.chat = MagicMock(id=100)
+    update.callback_query.message = message
+    context = MagicMock()
+    context.bot = AsyncMock()
+    return update, context
+
+
+async def test_same_kind_is_edited_in_place():
+    """Тестирует, что текст меняется на текст, а фото на фото одним вызовом без удаления."""
+    update, context = _callback_update()
+    await render_screen(update, context, "Карточка", reply_markup="kb", parse_mode='Markdown')
+    update.callback_query.edit_message_text.assert_awaited_once_with("Карточка", reply_markup="kb", parse_mode='Markdown')
+    update.callback_query.message.delete.assert_not_awaited()
+    context.bot.send_message.assert_not_awaited()
+
+    update, context = _callback_update(photo="old_cover")
+    await render_screen(update, context, "Другая книга", reply_markup="kb", photo="new_cover", parse_mode='Markdown')
+    media = update.callback_query.edit_message_media.await_args.args[0]
+    assert isinstance(media, InputMediaPhoto)
+    assert (media.media, media.caption, media.parse_mode) == ("new_cover", "Другая книга", 'Markdown')
+    update.callback_query.message.delete.assert_not_awaited()
+    context.bot.send_photo.assert_not_awaited()
+
+
+async def test_kind_change_falls_back_to_resend():
+    """Тестирует замену сообщения, когда текст нужно превратить в фото и наоборот."""
+    update, context = _callback_update()
+    await render_screen(update, context, "Карточка", photo="cover")
+    update.callback_query.edit_message_text.assert_not_awaited()
+    update.callback_query.message.delete.assert_awaited_once()
+    context.bot.send_photo.assert_awaited_once_with(chat_id=100, photo="cover", caption="Карточка", reply_markup=None, parse_mode=None)
+
+    update, context = _callback_update(photo="cover")
+    await render_screen(update, context, "Главное меню")
+    update.callback_query.edit_message_media.assert_not_awaited()
+    context.bot.send_message.assert_awaited_once_with(chat_id=100, text="Главное меню", reply_markup=None, parse_mode=None)
+
+
+async def test_edit_errors():
+    """Тестирует, что «не изменено» не вызывает пересылку, а прочие ошибки правки — вызывают."""
+    update, context = _callback_update()
+    update.callback_query.edit_message_text.side_effect = BadRequest("Message is not modified")
+    assert await render_screen(update, context, "Список книг") is update.callback_query.message
+    context.bot.send_message.assert_not_awaited()
+
+    update, context = _callback_update()
+    update.callback_query.edit_message_text.side_effect = BadRequest("Message can't be edited")
+    await render_screen(update, context, "Список книг")
+    update.callback_query.message.delete.assert_awaited_once()
+    context.bot.send_message.assert_awaited_once()
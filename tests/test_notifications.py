@@ -0,0 +1,105 @@
+import pytest
+from src.core import config
+from src.core.db import data_access as db_data
+
+pytestmark = pytest.mark.asyncio
+
+USER_DATA = {
+    'username': 'ledger_user',
+    'telegram_id': 515151,
+    'telegram_username': 'ledger_user',
+    'full_name': 'Ledger User',
+    'dob': '01.01.2000',
+    'contact_info': 'ledger@test.com',
+    'status': 'студент',
+    'password': 'password123'
+}
+
+
+async def test_retry_resumes_same_ledger_row(db_session):
+    """Тестирует, что повтор с тем же ключом не создает новую запись уведомления."""
+    user_id = await db_data.add_user(db_session, USER_DATA)
+
+    first = await db_data.begin_notification_delivery(db_session, user_id, "Текст", 'system', idempotency_key="task:1")
+    assert first['claimed'] is True
+    await db_data.mark_notification_failed(db_session, first['id'], 'timed_out', "TimedOut")
+    second = await db_data.begin_notification_delivery(db_session, user_id, "Текст", 'system', idempotency_key="task:1")
+
+    assert second['id'] == first['id']
+    assert second['attempts'] == 2
+    # Повтор после ошибки снова захватывает запись
+    assert second['status'] == 'pending'
+    assert second['claimed'] is True
+
+    await db_data.mark_notification_sent(db_session, first['id'], telegram_message_id=777)
+    third = await db_data.begin_notification_delivery(db_session, user_id, "Текст", 'system', idempotency_key="task:1")
+
+    assert third['status'] == 'sent'
+    assert third['claimed'] is False
+    assert third['attempts'] == 2
+    assert third['telegram_message_id'] == 777
+
+    count = await db_session.fetchval("SELECT COUNT(*) FROM notifications WHERE user_id = $1", user_id)
+    assert count == 1
+
+
+async def test_pending_delivery_is_claimed_once_per_lease(db_session):
+    """Тестирует, что незавершенную доставку не захватывает второй обработчик, пока не истекла аренда."""
+    user_id = await db_data.add_user(db_session, USER_DATA)
+
+    first = await db_data.begin_notification_delivery(db_session, user_id, "Текст", 'system', idempotency_key="task:2")
+    duplicate = await db_data.begin_notification_delivery(db_session, user_id, "Текст", 'system', idempotency_key="task:2")
+
+    assert first['claimed'] is True
+    assert duplicate['id'] == first['id']
+    assert duplicate['claimed'] is False
+    assert duplicate['attempts'] == 1
+
+    # Обработчик, захвативший запись, упал, не отметив результат: после аренды запись захватывается снова
+    await db_session.execute(
+        "UPDATE notifications SET claimed_at = claimed_at - make_interval(secs => $2) WHERE id = $1",
+        first['id'], config.NOTIFICATION_CLAIM_LEASE + 1
+    )
+    reclaimed = await db_data.begin_notification_delivery(db_session, user_id, "Текст", 'system', idempotency_key="task:2")
+
+    assert reclaimed['id'] == first['id']
+    assert reclaimed['claimed'] is True
+    assert reclaimed['attempts'] == 2
+
+
+async def test_blocked_users_are_skipped_by_broadcasts(db_session):
+    """Тестирует, что заблокировавшие бота пользователи исключаются из рассылок до повторной привязки."""
+    user_id = await db_data.add_user(db_session, USER_DATA)
+    assert user_id in await db_data.get_all_user_ids(db_session)
+
+    await db_data.mark_user_bot_blocked(db_session, user_id)
+    assert user_id not in await db_data.get_all_user_ids(db_session)
+    target = await db_data.get_user_delivery_target(db_session, user_id)
+    assert target == {'telegram_id': USER_DATA['telegram_id'], 'bot_blocked': True}
+
+    assert await db_data.clear_bot_blocked_by_telegram_id(db_session, USER_DATA['telegram_id']) is True
+    assert await db_data.clear_bot_blocked_by_telegram_id(db_session, USER_DATA['telegram_id']) is False
+    assert user_id in await db_data.get_all_user_ids(db_session)
+
+
+async def test_unknown_user_raises_not_found(db_session):
+    """Тестирует, что уведомление для несуществующего пользователя не попадает в журнал."""
+    with pytest.raises(db_data.NotFoundError):
+        await db_data.begin_notification_delivery(db_session, 999999, "Текст", 'system', idempotency_key="task:x")
+
+
+async def test_bulk_resolution_of_chat_ids(db_session):
+    """Тестирует массовое разрешение chat_id и его передачу в payload рассылки."""
+    user_id = await db_data.add_user(db_session, USER_DATA)
+    unlinked_id = await db_data.add_user(db_session, {**USER_DATA, 'username': 'no_tg', 'telegram_id': None,
+                                                     'telegram_username': None, 'contact_info': 'no_tg@test.com'})
+
+    targets = await db_data.get_delivery_targets(db_session, [user_id, unlinked_id])
+    assert targets == {user_id: {'telegram_id': USER_DATA['telegram_id'], 'bot_blocked': False}}
+
+    await db_data.enqueue_bulk_user_notifications(db_session, [user_id, unlinked_id], "Рассылка", category='broadcast')
+    async with db_session.transaction():
+        entries = await db_data.claim_outbox_batch(db_session, limit=10)
+
+    assert entries[0]['payload']['chat_id'] == USER_DATA['telegram_id']
+    assert 'chat_id' not in entries[1]['payload']
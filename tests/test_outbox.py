@@ -0,0 +1,79 @@
+import pytest
+from src.core.db import data_access as db_data
+
+pytestmark = pytest.mark.asyncio
+
+USER_DATA = {
+    'username': 'outbox_user',
+    'telegram_id': 424242,
+    'telegram_username': 'outbox_user',
+    'full_name': 'Outbox User',
+    'dob': '01.01.2000',
+    'contact_info': 'outbox@test.com',
+    'status': 'студент',
+    'password': 'password123'
+}
+
+
+async def test_outbox_is_written_only_on_commit(db_session):
+    """Тестирует, что запись в outbox откатывается вместе с бизнес-изменением."""
+    user_id = await db_data.add_user(db_session, USER_DATA)
+
+    with pytest.raises(RuntimeError):
+        async with db_session.transaction():
+            await db_data.enqueue_user_notification(db_session, user_id, "Фантом", category='confirmation')
+            raise RuntimeError("откат бизнес-транзакции")
+
+    count = await db_session.fetchval("SELECT COUNT(*) FROM notification_outbox")
+    assert count == 0
+
+    async with db_session.transaction():
+        await db_data.enqueue_user_notification(
+            db_session, user_id, "Книга возвращена", category='confirmation',
+            button_text="⭐ Оценить", button_callback="rate_book_1"
+        )
+
+    async with db_session.transaction():
+        entries = await db_data.claim_outbox_batch(db_session, limit=10)
+
+    assert len(entries) == 1
+    assert entries[0]['task_name'] == db_data.OUTBOX_NOTIFY_USER
+    assert entries[0]['payload'] == {
+        'user_id': user_id, 'text': "Книга возвращена", 'category': 'confirmation',
+        'button_text': "⭐ Оценить", 'button_callback': "rate_book_1"
+    }
+
+
+async def test_claim_outbox_batch_keeps_order(db_session):
+    """Тестирует пакетную выборку из outbox в порядке создания записей."""
+    user_id = await db_data.add_user(db_session, USER_DATA)
+    await db_data.enqueue_admin_notification(db_session, "Первое", category='admin_action')
+    inserted = await db_data.enqueue_bulk_user_notifications(db_session, [user_id] * 3, "Рассылка", category='broadcast')
+    assert inserted == 3
+
+    async with db_session.transaction():
+        first_batch = await db_data.claim_outbox_batch(db_session, limit=2)
+    async with db_session.transaction():
+        second_batch = await db_data.claim_outbox_batch(db_session, limit=10)
+
+    ids = [e['id'] for e in first_batch + second_batch]
+    assert ids == sorted(ids)
+    assert len(ids) == 4
+    assert first_batch[0]['task_name'] == db_data.OUTBOX_NOTIFY_ADMIN
+    assert all(e['payload']['text'] == "Рассылка" for e in second_batch)
+    assert 'button_text' not in second_batch[0]['payload']
+
+    remaining = await db_session.fetchval("SELECT COUNT(*) FROM notification_outbox")
+    assert remaining == 0
+
+
+async def test_relayed_user_notifications_are_keyed_by_outbox_id():
+    """Тестирует, что повторная публикация записи outbox не приводит к повторной доставке."""
+    from src.core.outbox import _task_kwargs
+
+    user_entry = {'id': 17, 'task_name': db_data.OUTBOX_NOTIFY_USER, 'payload': {'user_id': 1, 'text': "Привет"}}
+    admin_entry = {'id': 18, 'task_name': db_data.OUTBOX_NOTIFY_ADMIN, 'payload': {'text': "Админ"}}
+
+    assert _task_kwargs(user_entry) == {'user_id': 1, 'text': "Привет", 'idempotency_key': "outbox:17"}
+    assert _task_kwargs(admin_entry) == {'text': "Админ"}
+    assert 'idempotency_key' not in user_entry['payload']
@@ -0,0 +1,130 @@
+# tests/test_reservation_queue.py
+import pytest
+
+from src.core.db import data_access as db_data
+
+pytestmark = pytest.mark.asyncio
+
+USER_DATA = {
+    'username': 'queue_user',
+    'telegram_id': 55500,
+    'telegram_username': 'queue_user',
+    'full_name': 'Queue User',
+    'dob': '01.01.2002',
+    'contact_info': 'queue@test.com',
+    'status': 'студент',
+    'password': 'password123'
+}
+
+BOOK_DATA = {
+    'name': 'Hot Title',
+    'author': 'Queue Author',
+    'genre': 'Test',
+    'description': 'Everybody wants it',
+    'total_quantity': 1
+}
+
+
+async def _add_users(conn, count):
+    return [
+        await db_data.add_user(conn, {
+            **USER_DATA, 'username': f'queue_user{i}', 'contact_info': f'queue{i}@test.com', 'telegram_id': 55500 + i
+        })
+        for i in range(count)
+    ]
+
+
+async def _expire_holds(conn, book_id):
+    await conn.execute(
+        "UPDATE reservations SET hold_expires_at = now() - interval '1 minute' WHERE book_id = $1 AND notified", book_id
+    )
+
+
+async def test_queue_positions_are_fifo(db_session):
+    """Тестирует порядок очереди и место в ней каждого читателя."""
+    reader_id, first_id, second_id = await _add_users(db_session, 3)
+    book_id = await db_data.add_new_book(db_session, BOOK_DATA)
+    await db_data.checkout_book(db_session, reader_id, book_id)
+
+    assert "место в очереди: 1" in await db_data.add_reservation(db_session, first_id, book_id)
+    assert "место в очереди: 2" in await db_data.add_reservation(db_session, second_id, book_id)
+    assert "уже" in await db_data.add_reservation(db_session, second_id, book_id)
+
+    assert await db_data.get_reservations_for_book(db_session, book_id) == [first_id, second_id]
+    assert await db_data.get_reservation_position(db_session, second_id, book_id) == 2
+    assert await db_data.get_reservation_position(db_session, reader_id, book_id) is None
+
+
+async def test_returned_copy_is_held_for_first_waiter(db_session):
+    """Тестирует, что вернувшийся экземпляр отложен для первого в очереди и недоступен остальным."""
+    reader_id, waiter_id, other_id = await _add_users(db_session, 3)
+    book_id = await db_data.add_new_book(db_session, BOOK_DATA)
+    loan = await db_data.checkout_book(db_session, reader_id, book_id)
+    await db_data.add_reservation(db_session, waiter_id, book_id)
+
+    returned = await db_data.checkin_book(db_session, loan['borrow_id'])
+    assert returned['next_user_id'] == waiter_id
+    assert returned['hold_expires_at'] is not None
+
+    assert (await db_data.checkout_book(db_session, other_id, book_id))['status'] == 'unavailable'
+
+    reservations = await db_data.get_user_reservations(db_session, waiter_id)
+    assert reservations[0]['position'] is None
+
+    taken = await db_data.checkout_book(db_session, waiter_id, book_id)
+    assert taken['status'] == 'borrowed'
+    assert taken['copy_id'] == loan['copy_id']
+    # Бронь закрыта выдачей
+    assert await db_data.get_user_reservations(db_session, waiter_id) == []
+
+
+async def test_expired_hold_is_released_when_another_copy_is_taken(db_session):
+    """Тестирует, что просроченно отложенный экземпляр не зависает, если читатель взял другой свободный."""
+    first_reader, second_reader, waiter_id = await _add_users(db_session, 3)
+    book_id = await db_data.add_new_book(db_session, {**BOOK_DATA, 'total_quantity': 2})
+    first_loan = await db_data.checkout_book(db_session, first_reader, book_id)
+    second_loan = await db_data.checkout_book(db_session, second_reader, book_id)
+    await db_data.add_reservation(db_session, waiter_id, book_id)
+
+    await db_data.checkin_book(db_session, first_loan['borrow_id'])
+    await _expire_holds(db_session, book_id)
+    # Отложение истекло, но уборка еще не прошла; второй экземпляр возвращается на полку
+    await db_data.checkin_book(db_session, second_loan['borrow_id'])
+
+    taken = await db_data.checkout_book(db_session, waiter_id, book_id)
+    assert taken['status'] == 'borrowed'
+    assert taken['copy_id'] == second_loan['copy_id']
+
+    result = await db_data.expire_reservation_holds(db_session)
+    assert [row['user_id'] for row in result['expired']] == [waiter_id]
+    assert await db_data.get_user_reservations(db_session, waiter_id) == []
+    assert await db_session.fetchval("SELECT available_quantity FROM books WHERE id = $1", book_id) == 1
+    assert await db_session.fetchval("SELECT is_available FROM book_copies WHERE id = $1", first_loan['copy_id'])
+
+
+async def test_expired_hold_passes_to_next_waiter_then_shelf(db_session):
+    """Тестирует передачу просроченного отложения следующему и возврат на полку в конце очереди."""
+    reader_id, first_id, second_id = await _add_users(db_session, 3)
+    book_id = await db_data.add_new_book(db_session, BOOK_DATA)
+    loan = await db_data.checkout_book(db_session, reader_id, book_id)
+    await db_data.add_reservation(db_session, first_id, book_id)
+    await db_data.add_reservation(db_session, second_id, book_id)
+    await db_data.checkin_book(db_session, loan['borrow_id'])
+
+    # Срок еще не вышел — ничего не меняется
+    assert await db_data.expire_reservation_holds(db_session) == {'expired': [], 'passed': []}
+
+    await _expire_holds(db_session, book_id)
+    result = await db_data.expire_reservation_holds(db_session)
+    assert [row['user_id'] for row in result['expired']] == [first_id]
+    assert [row['user_id'] for row in result['passed']] == [second_id]
+    held_copy = await db_session.fetchval("SELECT copy_id FROM reservations WHERE user_id = $1", second_id)
+    assert held_copy == loan['copy_id']
+
+    await _expire_holds(db_session, book_id)
+    result = await db_data.expire_reservation_holds(db_session)
+    assert [row['user_id'] for row in result['expired']] == [second_id]
+    assert result['passed'] == []
+
+    available = await db_session.fetchval("SELECT available_quantity FROM books WHERE id = $1", book_id)
+    assert available == 1
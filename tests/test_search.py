@@ -53,7 +53,8 @@ async def test_get_unique_genres(db_session):
     unique_genres = await db_data.get_unique_genres(db_session)
     
     assert len(unique_genres) == 4
-    assert set(unique_genres) == {'Фэнтези', 'Фантастика', 'Детектив', 'Триллер'}
+    assert [genre['name'] for genre in unique_genres] == ['Детектив', 'Триллер', 'Фантастика', 'Фэнтези']
+    assert {genre['name']: genre['available_books'] for genre in unique_genres}['Фэнтези'] == 2
 
 
 async def test_get_available_books_by_genre(db_session):
@@ -78,10 +79,109 @@ async def test_get_available_books_by_genre(db_session):
         })
     
     # Получаем книги по жанру
+    genre_ids = {genre['name']: genre['id'] for genre in await db_data.get_unique_genres(db_session)}
     fantasy_books, total_fantasy = await db_data.get_available_books_by_genre(
-        db_session, 'Фэнтези', limit=10, offset=0
+        db_session, genre_ids['Фэнтези'], limit=10, offset=0
     )
     
     assert len(fantasy_books) == 3
     assert total_fantasy == 3
-    assert all('Fantasy' in book['name'] for book in fantasy_books)
\ No newline at end of file
+    assert all('Fantasy' in book['name'] for book in fantasy_books)
+
+
+async def test_genre_names_are_canonical(db_session):
+    """Тестирует, что жанр с другим регистром и лишними пробелами попадает в тот же справочник."""
+    for i, genre in enumerate(['Фэнтези', '  фэнтези ', 'ФЭНТЕЗИ']):
+        await db_data.add_new_book(db_session, {
+            'name': f'Canonical Book {i}', 'author': 'Author', 'genre': genre, 'description': 'Test', 'total_quantity': 1
+        })
+
+    genres = await db_data.get_unique_genres(db_session)
+    assert [(genre['name'], genre['available_books']) for genre in genres] == [('Фэнтези', 3)]
+    stored = await db_session.fetch("SELECT DISTINCT genre FROM books")
+    assert [row['genre'] for row in stored] == ['Фэнтези']
+
+
+async def test_genre_counts_follow_availability(db_session):
+    """Тестирует, что число свободных книг жанра меняется при выдаче последнего экземпляра, смене жанра и удалении."""
+    user_id = await db_data.add_user(db_session, {
+        'username': 'genre_reader', 'telegram_id': 99900, 'telegram_username': 'genre_reader',
+        'full_name': 'Genre Reader', 'dob': '01.01.2000', 'contact_info': 'genre@test.com',
+        'status': 'студент', 'password': 'password123'
+    })
+    book_id = await db_data.add_new_book(db_session, {
+        'name': 'Only Copy', 'author': 'Author', 'genre': 'Детектив', 'description': 'Test', 'total_quantity': 1
+    })
+    genre_id = (await db_data.get_unique_genres(db_session))[0]['id']
+
+    loan = await db_data.checkout_book(db_session, user_id, book_id)
+    genre = await db_data.get_genre(db_session, genre_id)
+    assert (genre['book_count'], genre['available_books']) == (1, 0)
+    assert await db_data.get_available_books_by_genre(db_session, genre_id, limit=10, offset=0) == ([], 0)
+
+    await db_data.checkin_book(db_session, loan['borrow_id'])
+    assert (await db_data.get_genre(db_session, genre_id))['available_books'] == 1
+
+    await db_data.update_book_field(db_session, book_id, 'genre', 'Триллер')
+    assert [genre['name'] for genre in await db_data.get_unique_genres(db_session)] == ['Триллер']
+
+    await db_data.delete_book(db_session, book_id)
+    assert await db_data.get_unique_genres(db_session) == []
+
+
+async def test_refresh_genre_counts_repairs_counters(db_session):
+    """Тестирует, что миграционный пересчет восстанавливает счетчики жанров по книгам."""
+    await db_data.add_new_book(db_session, {
+        'name': 'Counted', 'author': 'Author', 'genre': 'Поэзия', 'description': 'Test', 'total_quantity': 2
+    })
+    await db_session.execute("UPDATE genres SET book_count = 0, available_books = 0")
+
+    assert await db_session.fetchval("SELECT refresh_genre_counts()") == 1
+    genre = (await db_data.get_unique_genres(db_session))[0]
+    assert (genre['name'], genre['available_books']) == ('Поэзия', 1)
+    assert (await db_data.get_genre(db_session, genre['id']))['book_count'] == 1
+
+
+async def test_fulltext_search_morphology_and_ranking(db_session):
+    """Тестирует полнотекстовый поиск: словоформы, описание, ранжирование и выданные книги."""
+    await db_data.add_new_book(db_session, {
+        'name': 'Машина времени', 'author': 'Герберт Уэллс', 'genre': 'Фантастика',
+        'description': 'Путешественник отправляется в далекое будущее.', 'total_quantity': 1
+    })
+    await db_data.add_new_book(db_session, {
+        'name': 'Путешествия Гулливера', 'author': 'Джонатан Свифт', 'genre': 'Сатира',
+        'description': 'Странствия корабельного врача по необычным странам.', 'total_quantity': 1
+    })
+    await db_data.add_new_book(db_session, {
+        'name': 'Пикник на обочине', 'author': 'Стругацкие', 'genre': 'Фантастика',
+        'description': 'Сталкеры проникают в Зону ради находок.', 'total_quantity': 1
+    })
+
+    # Слово в другой форме находится в описании
+    results, total = await db_data.search_books_fulltext(db_session, 'зона', limit=5, offset=0)
+    assert (total, results[0]['name']) == (1, 'Пикник на обочине')
+
+    # Совпадение в названии ранжируется выше совпадения в описании
+    results, total = await db_data.search_books_fulltext(db_session, 'путешествие', limit=5, offset=0)
+    assert results[0]['name'] == 'Путешествия Гулливера'
+
+    results, total = await db_data.search_books_fulltext(db_session, 'фантастика -зона', limit=5, offset=0)
+    assert [book['name'] for book in results] == ['Машина времени']
+
+    results, total = await db_data.search_books_fulltext(db_session, 'фантастика', limit=1, offset=1)
+    assert (len(results), total) == (1, 2)
+    assert await db_data.search_books_fulltext(db_session, 'подводная лодка', limit=5, offset=0) == ([], 0)
+
+
+async def test_fulltext_vector_follows_edits(db_session):
+    """Тестирует, что поисковый вектор обновляется при правке описания и переименовании автора."""
+    book_id = await db_data.add_new_book(db_session, {
+        'name': 'Без описания', 'author': 'Старое Имя', 'genre': 'Тест', 'description': '', 'total_quantity': 1
+    })
+    await db_data.update_book_field(db_session, book_id, 'description', 'История о маяках и смотрителях.')
+    results, _ = await db_data.search_books_fulltext(db_session, 'маяк', limit=5, offset=0)
+    assert [book['id'] for book in results] == [book_id]
+
+    await db_session.execute("UPDATE authors SET name = 'Новое Имя' WHERE name = 'Старое Имя'")
+    results, _ = await db_data.search_books_fulltext(db_session, 'новое имя', limit=5, offset=0)
+    assert [book['id'] for book in results] == [book_id]
@@ -0,0 +1,38 @@
+# tests/test_search_cache.py
+from src.core import search_cache as search_cache_module
+from src.core.search_cache import SearchResultCache
+
+ROWS = [
+    {'id': 1, 'name': 'Солярис', 'author': 'Станислав Лем', 'is_available': True},
+    {'id': 2, 'name': 'Непобедимый', 'author': 'Станислав Лем', 'is_available': False},
+]
+
+
+def test_results_are_shared_per_normalized_term():
+    """Тестирует, что результаты кэшируются по режиму и запросу без учета регистра и пробелов."""
+    cache = SearchResultCache(ttl=60, max_size=10)
+    cache.put('simple', '  Лем ', ROWS, 2)
+
+    assert cache.get('simple', 'лем') == (ROWS, 2)
+    assert cache.get('fulltext', 'лем') is None
+    # Карточки из результатов доступны без запроса к БД
+    assert cache.get_card(2)['name'] == 'Непобедимый'
+
+    cache.invalidate_book(2)
+    assert cache.get_card(2) is None
+    assert cache.get('simple', 'Лем') == (ROWS, 2)
+
+
+def test_expiry_and_eviction(monkeypatch):
+    """Тестирует вытеснение самых старых запросов и истечение TTL для результатов и карточек."""
+    cache = SearchResultCache(ttl=60, max_size=2)
+    cache.put('simple', 'a', ROWS[:1], 1)
+    cache.put('simple', 'b', ROWS[1:], 1)
+    cache.get('simple', 'a')
+    cache.put('simple', 'c', [], 0)
+    assert cache.get('simple', 'b') is None
+    assert cache.get('simple', 'a') is not None
+
+    monkeypatch.setattr(search_cache_module.time, 'monotonic', lambda: 10 ** 9)
+    assert cache.get('simple', 'a') is None
+    assert cache.get_card(1) is None
@@ -0,0 +1,81 @@
+import pytest
+import telegram
+from unittest.mock import AsyncMock
+
+from src.core import send_scheduler
+from src.core.send_scheduler import TelegramSendScheduler, SendDeferred, backoff_delay
+
+pytestmark = pytest.mark.asyncio
+
+
+class FakeRedis:
+    """Эмулирует Lua-скрипты планировщика: слот всегда свободен, паузы запоминаются."""
+
+    def __init__(self):
+        self.pauses_ms = []
+        self.reserved_keys = []
+
+    def register_script(self, script):
+        async def run(keys, args):
+            if 'resume_at' in script:
+                self.pauses_ms.append(args[0])
+                return 0
+            self.reserved_keys.append(keys[1])
+            return [1, 0]
+        return run
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    monkeypatch.setattr(send_scheduler, 'backoff_delay', lambda attempt: 0)
+    redis = FakeRedis()
+    return TelegramSendScheduler(redis, "123456:TEST", max_attempts=3, max_inline_wait=20), redis
+
+
+async def test_retry_after_is_honoured(scheduler):
+    """Тестирует, что RetryAfter приостанавливает бота ровно на указанное время."""
+    sched, redis = scheduler
+    request = AsyncMock(side_effect=[telegram.error.RetryAfter(3), "sent"])
+
+    result = await sched.send(42, request)
+
+    assert result == "sent"
+    assert redis.pauses_ms == [3000]
+    assert redis.reserved_keys == ["tg:rl:123456:chat:42"] * 2
+
+
+async def test_long_retry_after_is_deferred(scheduler):
+    """Тестирует, что слишком долгий RetryAfter возвращается вызывающему коду."""
+    sched, redis = scheduler
+    request = AsyncMock(side_effect=telegram.error.RetryAfter(120))
+
+    with pytest.raises(SendDeferred) as exc_info:
+        await sched.send(42, request)
+
+    assert exc_info.value.retry_after == 120
+    assert request.await_count == 1
+
+
+async def test_transient_errors_are_retried_and_permanent_are_not(scheduler):
+    """Тестирует повтор при сетевых ошибках и отсутствие повтора при BadRequest."""
+    sched, _ = scheduler
+
+    flaky = AsyncMock(side_effect=[telegram.error.TimedOut(), "sent"])
+    assert await sched.send(1, flaky) == "sent"
+
+    always_down = AsyncMock(side_effect=telegram.error.TimedOut())
+    with pytest.raises(telegram.error.TimedOut):
+        await sched.send(1, always_down)
+    assert always_down.await_count == 3
+
+    bad = AsyncMock(side_effect=telegram.error.BadRequest("chat not found"))
+    with pytest.raises(telegram.error.BadRequest):
+        await sched.send(1, bad)
+    assert bad.await_count == 1
+
+
+async def test_backoff_delay_is_bounded():
+    """Тестирует границы экспоненциальной задержки с джиттером."""
+    for attempt in range(10):
+        delay = backoff_delay(attempt, base=1, cap=30)
+        assert 0 <= delay <= min(30, 2 ** attempt)
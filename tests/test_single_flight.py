@@ -0,0 +1,82 @@
+# tests/test_single_flight.py
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.core import utils
+from src.core.utils import single_flight
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    utils._in_flight.clear()
+    utils._recent_results.clear()
+    yield
+    utils._in_flight.clear()
+    utils._recent_results.clear()
+
+
+def _callback_update(data, user_id=1, message_id=10, edit_date=None):
+    update = MagicMock()
+    update.effective_user.id = user_id
+    update.callback_query.data = data
+    update.callback_query.answer = AsyncMock()
+    update.callback_query.message.message_id = message_id
+    update.callback_query.message.edit_date = edit_date
+    return update
+
+
+async def test_concurrent_duplicates_share_first_result():
+    """Тестирует, что повторные нажатия во время обработки ждут результат первого вызова."""
+    release = asyncio.Event()
+    calls = []
+
+    @single_flight(window=5)
+    async def handler(update, context):
+        calls.append(update)
+        await release.wait()
+        return 'NEXT_STATE'
+
+    first = asyncio.create_task(handler(_callback_update('borrow_book_1'), None))
+    await asyncio.sleep(0)
+    duplicate_update = _callback_update('borrow_book_1')
+    duplicate = asyncio.create_task(handler(duplicate_update, None))
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await first == 'NEXT_STATE'
+    assert await duplicate == 'NEXT_STATE'
+    assert len(calls) == 1
+    duplicate_update.callback_query.answer.assert_awaited_once_with()
+    # Сразу после завершения повтор тоже получает готовый результат
+    assert await handler(_callback_update('borrow_book_1'), None) == 'NEXT_STATE'
+    assert len(calls) == 1
+
+
+async def test_different_buttons_users_and_redrawn_messages_run_separately():
+    """Тестирует, что другая кнопка, другой пользователь и перерисованное сообщение обрабатываются заново."""
+    handler_body = AsyncMock(return_value='STATE')
+    handler = single_flight(window=5)(handler_body)
+
+    await handler(_callback_update('view_book_1'), None)
+    await handler(_callback_update('view_book_2'), None)
+    await handler(_callback_update('view_book_1', user_id=2), None)
+    await handler(_callback_update('view_book_1', edit_date=123), None)
+    assert handler_body.await_count == 4
+
+
+async def test_window_expiry_and_failures_are_not_cached():
+    """Тестирует, что после окна и после ошибки кнопка обрабатывается снова."""
+    handler_body = AsyncMock(side_effect=[RuntimeError('db down'), 'STATE', 'STATE'])
+    handler = single_flight(window=0)(handler_body)
+
+    with pytest.raises(RuntimeError):
+        await handler(_callback_update('return_0'), None)
+    assert await handler(_callback_update('return_0'), None) == 'STATE'
+    await asyncio.sleep(0.01)
+    assert await handler(_callback_update('return_0'), None) == 'STATE'
+    assert handler_body.await_count == 3
+    assert not utils._in_flight
@@ -0,0 +1,88 @@
+import pytest
+from contextlib import aclosing
+from src.core.db import data_access as db_data
+
+pytestmark = pytest.mark.asyncio
+
+
+def _user(n: int, telegram_id=None) -> dict:
+    return {
+        'username': f'stream_user_{n}',
+        'telegram_id': telegram_id,
+        'telegram_username': f'stream_user_{n}',
+        'full_name': f'Stream User {n}',
+        'dob': '01.01.2000',
+        'contact_info': f'stream{n}@test.com',
+        'status': 'студент',
+        'password': 'password123'
+    }
+
+
+async def test_iter_notifiable_users_yields_batches(db_session):
+    """Тестирует порционную выдачу получателей рассылки через курсор."""
+    ids = [await db_data.add_user(db_session, _user(n, telegram_id=1000 + n)) for n in range(5)]
+    await db_data.add_user(db_session, _user(99))  # без Telegram
+    await db_data.mark_user_bot_blocked(db_session, ids[0])
+
+    batches = []
+    async for batch in db_data.iter_notifiable_users(db_session, batch_size=2):
+        # Пока потребитель обрабатывает порцию, транзакция не открыта
+        assert not db_session.is_in_transaction()
+        batches.append(batch)
+
+    assert [len(b) for b in batches] == [2, 2]
+    assert [u['id'] for b in batches for u in b] == ids[1:]
+    assert batches[0][0]['telegram_id'] == 1001
+
+
+async def test_due_date_iterators_match_lists_without_transaction(db_session):
+    """Тестирует, что порционная выборка выдач для напоминаний совпадает со списочной и не держит транзакцию."""
+    user_id = await db_data.add_user(db_session, _user(1, telegram_id=3001))
+    book_id = await db_data.add_new_book(db_session, {
+        'name': 'Streamed Book', 'author': 'Stream Author', 'genre': 'Test',
+        'description': 'Overdue and due soon', 'total_quantity': 5
+    })
+    for _ in range(5):
+        await db_data.checkout_book(db_session, user_id, book_id)
+    borrows = await db_session.fetch("SELECT borrow_id FROM borrowed_books ORDER BY borrow_id")
+    await db_session.execute(
+        "UPDATE borrowed_books SET due_date = CURRENT_DATE - 1 WHERE borrow_id = ANY($1::int[])",
+        [b['borrow_id'] for b in borrows[:3]]
+    )
+    await db_session.execute(
+        "UPDATE borrowed_books SET due_date = CURRENT_DATE + 2 WHERE borrow_id = ANY($1::int[])",
+        [b['borrow_id'] for b in borrows[3:]]
+    )
+
+    overdue = []
+    async for entry in db_data.iter_users_with_overdue_books(db_session, batch_size=2):
+        assert not db_session.is_in_transaction()
+        overdue.append(entry)
+    due_soon = [entry async for entry in db_data.iter_users_with_books_due_soon(db_session, days_ahead=2, batch_size=1)]
+
+    assert [e['borrow_id'] for e in overdue] == [b['borrow_id'] for b in borrows[:3]]
+    assert sorted(overdue, key=lambda e: e['borrow_id']) == sorted(
+        await db_data.get_users_with_overdue_books(db_session), key=lambda e: e['borrow_id'])
+    assert [e['borrow_id'] for e in due_soon] == [b['borrow_id'] for b in borrows[3:]]
+
+
+async def test_iter_pending_book_requests_matches_list_and_can_stop_early(db_session):
+    """Тестирует, что потоковая выборка совпадает со списочной и корректно прерывается."""
+    user_id = await db_data.add_user(db_session, _user(1, telegram_id=2001))
+    for n in range(4):
+        await db_data.create_book_request(db_session, user_id, {'name': f'Книга {n}', 'author': f'Автор {n}'})
+
+    streamed = [req async for req in db_data.iter_pending_book_requests(db_session, prefetch=2)]
+    assert streamed == await db_data.get_pending_book_requests(db_session)
+    assert await db_data.count_pending_book_requests(db_session) == 4
+
+    seen = []
+    async with db_session.transaction():
+        async with aclosing(db_data.iter_pending_book_requests(db_session, prefetch=1)) as requests:
+            async for req in requests:
+                seen.append(req['id'])
+                if len(seen) == 2:
+                    break
+        # Соединение остается пригодным для дальнейших запросов в той же транзакции
+        assert await db_session.fetchval("SELECT 1") == 1
+    assert len(seen) == 2
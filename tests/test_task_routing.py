@@ -0,0 +1,40 @@
+# tests/test_task_routing.py
+import importlib
+import sys
+
+import pytest
+
+import src.core
+
+
+@pytest.fixture
+def tasks(monkeypatch):
+    """
+    Настоящий модуль tasks: test_admin_bot_integration подменяет его в sys.modules на MagicMock
+    при сборе тестов, поэтому модуль импортируется заново, а подмена восстанавливается после теста.
+    """
+    monkeypatch.delitem(sys.modules, 'src.core.tasks', raising=False)
+    monkeypatch.setattr(src.core, 'tasks', None, raising=False)
+    return importlib.import_module('src.core.tasks')
+
+
+def _queue_for(tasks, name, **kwargs):
+    return tasks.celery_app.amqp.router.route({}, name, args=(), kwargs=kwargs)['queue'].name
+
+
+def test_user_notifications_are_routed_by_category(tasks):
+    """Тестирует, что рассылки уходят в bulk, а подтверждения — в interactive."""
+    assert _queue_for(tasks, 'src.core.tasks.notify_user', user_id=1, text="Книга выдана", category='confirmation') == tasks.QUEUE_INTERACTIVE
+    assert _queue_for(tasks, 'src.core.tasks.notify_user', user_id=1, text="Новинка", category='new_arrival') == tasks.QUEUE_BULK
+    assert _queue_for(tasks, 'src.core.tasks.notify_user', user_id=1, text="Рассылка", category='broadcast') == tasks.QUEUE_BULK
+
+
+def test_admin_and_maintenance_tasks_have_own_queues(tasks):
+    """Тестирует маршрутизацию уведомлений администратора и служебных задач."""
+    assert _queue_for(tasks, 'src.core.tasks.notify_admin', text="Алерт") == tasks.QUEUE_ADMIN
+    assert _queue_for(tasks, 'src.core.tasks.backup_database_task') == tasks.QUEUE_MAINTENANCE
+    assert _queue_for(tasks, 'src.core.tasks.health_check_task') == tasks.QUEUE_MAINTENANCE
+    assert _queue_for(tasks, 'src.core.tasks.expire_reservation_holds') == tasks.QUEUE_MAINTENANCE
+    assert _queue_for(tasks, 'src.core.tasks.reconcile_user_counters') == tasks.QUEUE_MAINTENANCE
+    assert _queue_for(tasks, 'src.core.tasks.rebuild_catalog_index') == tasks.QUEUE_MAINTENANCE
+    assert _queue_for(tasks, 'src.core.tasks.broadcast_new_book', book_id=1) == tasks.QUEUE_BULK
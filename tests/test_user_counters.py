@@ -0,0 +1,72 @@
+# tests/test_user_counters.py
+import pytest
+
+from src.core.db import data_access as db_data
+
+pytestmark = pytest.mark.asyncio
+
+USER_DATA = {
+    'username': 'counter_user',
+    'telegram_id': 44400,
+    'telegram_username': 'counter_user',
+    'full_name': 'Counter User',
+    'dob': '01.01.2003',
+    'contact_info': 'counter@test.com',
+    'status': 'студент',
+    'password': 'password123'
+}
+
+BOOK_DATA = {
+    'name': 'Counted Book',
+    'author': 'Counter Author',
+    'genre': 'Test',
+    'description': 'Borrowed and returned',
+    'total_quantity': 3
+}
+
+
+async def test_active_loans_follow_checkout_and_checkin(db_session):
+    """Тестирует, что счетчик выдач меняется вместе с выдачей и возвратом."""
+    user_id = await db_data.add_user(db_session, USER_DATA)
+    book_id = await db_data.add_new_book(db_session, BOOK_DATA)
+
+    first = await db_data.checkout_book(db_session, user_id, book_id)
+    await db_data.checkout_book(db_session, user_id, book_id)
+    assert (await db_data.get_user_counters(db_session, user_id))['active_loans'] == 2
+    assert (await db_data.get_user_by_id(db_session, user_id))['active_loans'] == 2
+
+    # Лимит проверяется по счетчику
+    limited = await db_data.checkout_book(db_session, user_id, book_id, borrow_limit=2)
+    assert limited['status'] == 'limit_reached'
+    assert limited['active_loans'] == 2
+
+    await db_data.checkin_book(db_session, first['borrow_id'])
+    await db_data.checkin_book(db_session, first['borrow_id'])
+    assert (await db_data.get_user_counters(db_session, user_id))['active_loans'] == 1
+
+
+async def test_unread_notifications_counter(db_session):
+    """Тестирует счетчик непрочитанных уведомлений и его сброс при просмотре."""
+    user_id = await db_data.add_user(db_session, USER_DATA)
+    await db_data.create_notification(db_session, user_id, "Первое", 'system')
+    await db_data.begin_notification_delivery(db_session, user_id, "Второе", 'system', idempotency_key='counter:1')
+    # Повтор доставки с тем же ключом не создает новое уведомление
+    await db_data.begin_notification_delivery(db_session, user_id, "Второе", 'system', idempotency_key='counter:1')
+    assert (await db_data.get_user_counters(db_session, user_id))['unread_notifications'] == 2
+
+    assert await db_data.mark_notifications_read(db_session, user_id) == 2
+    assert (await db_data.get_user_counters(db_session, user_id))['unread_notifications'] == 0
+
+
+async def test_reconcile_repairs_drift(db_session):
+    """Тестирует, что сверка исправляет только разошедшиеся счетчики."""
+    user_id = await db_data.add_user(db_session, USER_DATA)
+    book_id = await db_data.add_new_book(db_session, BOOK_DATA)
+    await db_data.checkout_book(db_session, user_id, book_id)
+
+    assert await db_data.reconcile_user_counters(db_session) == 0
+
+    await db_session.execute("UPDATE users SET active_loans = 7, unread_notifications = 3 WHERE id = $1", user_id)
+    assert await db_data.reconcile_user_counters(db_session) == 1
+    counters = await db_data.get_user_counters(db_session, user_id)
+    assert (counters['active_loans'], counters['unread_notifications']) == (1, 0)
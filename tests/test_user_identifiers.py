@@ -0,0 +1,75 @@
+# tests/test_user_identifiers.py
+import pytest
+
+from src.core.db import data_access as db_data
+from src.core.db.utils import hash_password
+
+pytestmark = pytest.mark.asyncio
+
+USER_DATA = {
+    'username': 'Ident_User',
+    'telegram_id': 33300,
+    'telegram_username': 'ident_tg',
+    'full_name': 'Ident User',
+    'dob': '01.01.2004',
+    'contact_info': 'Ident.User@Mail.com',
+    'status': 'студент',
+    'password': 'password123'
+}
+
+
+async def test_login_by_any_identifier_form(db_session):
+    """Тестирует вход по логину, email в другом регистре и Telegram username с '@'."""
+    user_id = await db_data.add_user(db_session, USER_DATA)
+
+    for login in ('Ident_User', 'ident_user', 'ident.user@mail.com', ' IDENT.USER@MAIL.COM ', '@ident_tg', 'ident_tg'):
+        assert (await db_data.get_user_by_login(db_session, login))['id'] == user_id
+
+    with pytest.raises(db_data.NotFoundError):
+        await db_data.get_user_by_login(db_session, 'nobody@mail.com')
+
+
+async def test_phone_formats_resolve_to_same_user(db_session):
+    """Тестирует, что разные записи одного номера телефона находят одного пользователя."""
+    user_id = await db_data.add_user(db_session, {**USER_DATA, 'contact_info': '+79991234567'})
+
+    for phone in ('+79991234567', '89991234567', '8 (999) 123-45-67', '+7 999 123 45 67'):
+        assert (await db_data.get_user_by_login(db_session, phone))['id'] == user_id
+
+
+async def test_identifiers_follow_contact_change(db_session):
+    """Тестирует, что после смены контакта старый перестает находиться, а сброс пароля идет по новому."""
+    user_id = await db_data.add_user(db_session, USER_DATA)
+    await db_data.update_user_contact(db_session, user_id, 'new@mail.com')
+
+    with pytest.raises(db_data.NotFoundError):
+        await db_data.get_user_by_login(db_session, 'ident.user@mail.com')
+
+    await db_data.update_user_password(db_session, 'NEW@mail.com', 'new_password')
+    password_hash = await db_session.fetchval("SELECT password_hash FROM users WHERE id = $1", user_id)
+    assert password_hash == hash_password('new_password')
+
+    # Сброс пароля по Telegram username не выполняется
+    with pytest.raises(db_data.NotFoundError):
+        await db_data.update_user_password(db_session, 'ident_tg', 'other_password')
+
+
+async def test_logins_differing_only_by_case_are_rejected(db_session):
+    """Тестирует, что логин и контакт, отличающиеся только регистром, не регистрируются повторно."""
+    user_id = await db_data.add_user(db_session, {**USER_DATA, 'username': 'Ivan', 'contact_info': 'ivan@mail.com'})
+
+    with pytest.raises(db_data.UserExistsError):
+        await db_data.add_user(db_session, {**USER_DATA, 'username': 'ivan', 'telegram_id': 33301,
+                                            'contact_info': 'other@mail.com'})
+    with pytest.raises(db_data.UserExistsError):
+        await db_data.add_user(db_session, {**USER_DATA, 'username': 'Petr', 'telegram_id': 33302,
+                                            'contact_info': 'IVAN@mail.com'})
+
+    other_id = await db_data.add_user(db_session, {**USER_DATA, 'username': 'Petr', 'telegram_id': 33302,
+                                                   'contact_info': 'petr@mail.com'})
+    with pytest.raises(db_data.UserExistsError):
+        await db_data.update_user_contact(db_session, other_id, 'Ivan@Mail.com')
+
+    for login in ('Ivan', 'ivan', 'IVAN'):
+        assert (await db_data.get_user_by_login(db_session, login))['id'] == user_id
+    assert (await db_data.get_user_by_login(db_session, 'petr'))['id'] == other_id
@@ -0,0 +1,62 @@
+# tests/test_user_search.py
+import pytest
+
+from src.core.db import data_access as db_data
+
+pytestmark = pytest.mark.asyncio
+
+USER_DATA = {
+    'username': 'search_user',
+    'telegram_id': 66600,
+    'telegram_username': 'search_tg',
+    'full_name': 'Александр Пушкин',
+    'dob': '01.01.2000',
+    'contact_info': 'pushkin@test.com',
+    'status': 'студент',
+    'password': 'password123'
+}
+
+
+async def _add_users(conn):
+    first_id = await db_data.add_user(conn, USER_DATA)
+    second_id = await db_data.add_user(conn, {
+        **USER_DATA, 'username': 'other_user', 'telegram_id': 66601, 'telegram_username': 'other_tg',
+        'full_name': 'Михаил Лермонтов', 'contact_info': '+79995554433'
+    })
+    return first_id, second_id
+
+
+async def test_search_by_name_with_typo(db_session):
+    """Тестирует нечеткий поиск по имени: опечатка и регистр не мешают найти пользователя."""
+    first_id, _ = await _add_users(db_session)
+
+    results = await db_data.search_users(db_session, 'пушкен')
+    assert [row['id'] for row in results] == [first_id]
+    assert await db_data.search_users(db_session, '   ') == []
+
+
+async def test_search_by_identifiers(db_session):
+    """Тестирует поиск по логину, Telegram username, телефону в другом формате и Telegram ID."""
+    first_id, second_id = await _add_users(db_session)
+
+    assert (await db_data.search_users(db_session, 'SEARCH_USER'))[0]['id'] == first_id
+    assert (await db_data.search_users(db_session, '@other_tg'))[0]['id'] == second_id
+    assert (await db_data.search_users(db_session, '8 (999) 555-44-33'))[0]['id'] == second_id
+
+    by_telegram = await db_data.search_users(db_session, '66600')
+    assert by_telegram[0]['id'] == first_id
+    assert by_telegram[0]['score'] == 3
+
+
+async def test_exact_match_ranks_first(db_session):
+    """Тестирует, что точное совпадение идентификатора выше похожих и лимит соблюдается."""
+    first_id, second_id = await _add_users(db_session)
+    await db_data.add_user(db_session, {
+        **USER_DATA, 'username': 'search_user2', 'telegram_id': 66602, 'telegram_username': 'third_tg',
+        'full_name': 'Третий Пользователь', 'contact_info': 'third@test.com'
+    })
+
+    results = await db_data.search_users(db_session, 'search_user')
+    assert results[0]['id'] == first_id
+    assert results[0]['score'] == 2
+    assert len(await db_data.search_users(db_session, 'search_user', limit=1)) == 1